@@ -0,0 +1,28 @@
+"""
+基准测试的公共部分 - 命令行参数与计时，各基准只保留自己的准备代码与被计时的操作
+
+基准脚本先导入本模块（会把项目根目录加入 sys.path），再导入项目中的模块。
+"""
+import argparse
+import os
+import sys
+import timeit
+from typing import Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 每项计时重复的次数，取最快的一次
+REPEAT = 5
+
+
+def seconds_per_call(func: Callable[[], object], number: int) -> float:
+    """连续调用 func number 次并重复 REPEAT 次，返回最快一次中平均每次调用的耗时（秒）"""
+    return min(timeit.repeat(func, number=number, repeat=REPEAT)) / number
+
+
+def run(description: str, option: str, default: int, help: str, benchmark: Callable[[int], None]) -> None:
+    """解析一个整数参数（每次计时的调用次数）后运行基准"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(option, type=int, default=default, help=help)
+    args = parser.parse_args()
+    benchmark(getattr(args, option.lstrip('-').replace('-', '_')))
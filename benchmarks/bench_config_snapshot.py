@@ -0,0 +1,54 @@
+"""
+逐行输出的配置读取基准 - 比较每次按路径查找配置与读取配置快照的属性
+
+"按路径查找" 把 config.snapshot 换成每次访问属性都调用 config.get 的视图，
+与改用快照之前 _format_media_output 的配置读取方式相同；输出本身被替换为空函数，只计算格式化与配置读取。
+
+用法: python benchmarks/bench_config_snapshot.py [--rows N]
+"""
+from datetime import datetime
+from unittest import mock
+
+from _harness import run, seconds_per_call
+
+import core.media_monitor as media_monitor
+from config.config_manager import ConfigManager, SNAPSHOT_KEYS, config
+from core.media_info import MediaInfo
+
+
+class PathLookupView:
+    """与 ConfigSnapshot 属性相同，但每次访问都按路径调用 config.get"""
+    
+    def __init__(self, manager: ConfigManager):
+        self._manager = manager
+    
+    def __getattr__(self, name):
+        key_path, default = SNAPSHOT_KEYS[name]
+        return self._manager.get(key_path, default)
+
+
+def time_rows(monitor, media_info: MediaInfo, rows: int) -> float:
+    """格式化一行媒体信息的平均耗时（微秒）"""
+    now = datetime.now()
+    return seconds_per_call(lambda: monitor._format_media_output(media_info, now), rows) * 1e6
+
+
+def benchmark(rows: int):
+    media_info = MediaInfo('Song', 'Artist', 'Album', 'Album Artist', 3, 'Pop', 2020,
+                           'Spotify.exe', 'Spotify', 'Playing', 200, 50)
+    with mock.patch.object(media_monitor, 'safe_print', lambda *args, **kwargs: None):
+        monitor = media_monitor.MediaMonitor(use_overlay=False)
+        with mock.patch.object(ConfigManager, 'snapshot', property(PathLookupView)):
+            lookup = time_rows(monitor, media_info, rows)
+        snapshot = time_rows(monitor, media_info, rows)
+    
+    print(f"按路径查找配置  {lookup:6.2f} µs/行")
+    print(f"读取配置快照    {snapshot:6.2f} µs/行")
+    
+    get_ns = seconds_per_call(lambda: config.get("display.show_genre", True), rows) * 1e9
+    attr_ns = seconds_per_call(lambda: config.snapshot.show_genre, rows) * 1e9
+    print(f"单次读取: config.get {get_ns:.0f} ns，快照属性 {attr_ns:.0f} ns")
+
+
+if __name__ == "__main__":
+    run("逐行输出的配置读取基准", '--rows', 200000, "每次计时格式化的行数", benchmark)
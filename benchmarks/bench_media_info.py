@@ -0,0 +1,61 @@
+"""
+每轮检查的分配基准 - 比较旧版的字典 + f-string 歌曲 ID 与 MediaInfo + TrackKey
+
+旧版每轮由媒体源构造两个字典（基本信息与完整信息），用 f-string 拼出当前与上次的歌曲 ID
+比较是否切歌，并用 copy() 保存上次的完整信息；现在媒体源返回一个不可变的 MediaInfo，
+切歌比较使用其 key（TrackKey）。
+
+用法: python benchmarks/bench_media_info.py [--ticks N]
+"""
+import tracemalloc
+
+from _harness import run, seconds_per_call
+
+from core.media_info import MediaInfo
+
+
+def legacy_tick(last_info: dict):
+    """旧版一轮检查：两个字典、两个歌曲 ID 字符串与一次 copy()"""
+    basic = {'title': 'Song', 'artist': 'Artist', 'app_name': 'Spotify', 'status': 'Playing'}
+    info = {
+        'title': 'Song', 'artist': 'Artist', 'album': 'Album', 'album_artist': '',
+        'track_number': 0, 'genre': '', 'year': 0, 'app_id': 'Spotify.exe', 'app_name': 'Spotify',
+        'status': 'Playing', 'duration': 200, 'position': 50,
+    }
+    current_song_id = f"{basic.get('title')}_{basic.get('artist')}_{basic.get('app_name')}"
+    last_song_id = f"{last_info.get('title', '')}_{last_info.get('artist', '')}_{last_info.get('app_name', '')}"
+    return current_song_id != last_song_id, info.copy()
+
+
+def record_tick(last_info: MediaInfo):
+    """现在的一轮检查：一个 MediaInfo，按 TrackKey 比较"""
+    info = MediaInfo('Song', 'Artist', 'Album', '', 0, '', 0, 'Spotify.exe', 'Spotify', 'Playing', 200, 50)
+    return info.key != last_info.key, info
+
+
+def retained_bytes(tick, last_info, ticks: int) -> float:
+    """保留每轮结果时，平均每轮新增的内存（字节）"""
+    kept = []
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(ticks):
+        kept.append(tick(last_info)[1])
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, 'filename') if stat.size_diff > 0)
+    return total / ticks
+
+
+def benchmark(ticks: int):
+    cases = (
+        ("dict + f-string", legacy_tick, {'title': 'Song', 'artist': 'Artist', 'app_name': 'Spotify'}),
+        ("MediaInfo + TrackKey", record_tick, MediaInfo('Song', 'Artist', app_name='Spotify')),
+    )
+    for name, tick, last_info in cases:
+        retained = retained_bytes(tick, last_info, 1000)
+        micros = seconds_per_call(lambda: tick(last_info), ticks) * 1e6
+        print(f"{name:<22} 保留 {retained:6.0f} B/轮  {micros:6.2f} µs/轮")
+
+
+if __name__ == "__main__":
+    run("每轮检查的分配与耗时基准", '--ticks', 100000, "计时的检查轮数", benchmark)
@@ -0,0 +1,126 @@
+# app_rules.py
+"""
+应用匹配规则 - apps.name_mapping 的键与 apps.ignored_apps 的项除了完整的应用 ID 外还可以是模式：
+
+- 含 * ? [ 的通配符模式，如 "Microsoft.ZuneMusic*"（以 * 结尾即按前缀匹配）
+- 以 re: 开头的正则表达式，如 "re:^Spotify(\\.exe)?$"（需匹配整个应用 ID）
+
+完整的应用 ID 优先；否则按配置中的顺序使用第一个匹配的模式。模式在配置变化后首次使用时
+合并编译为一个正则表达式（含反向引用或内联标志的正则单独编译，按配置顺序在合并表达式之后检查），
+每个应用 ID 的匹配结果缓存下来，每轮检查的查找与规则数量无关。
+"""
+import fnmatch
+import re
+import warnings
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from utils.safe_print import safe_print
+
+
+REGEX_PREFIX = "re:"
+GLOB_CHARS = "*?["
+
+# 缓存的应用 ID 超过该数量时清空缓存
+MEMO_LIMIT = 1024
+
+# 含反向引用（\1、(?P=name)，合并后分组编号会变）或内联标志（(?i)，不能出现在表达式中间）的正则单独编译
+STANDALONE_PATTERN = re.compile(r"\\[1-9]|\(\?P=|\(\?[aiLmsux]+\)")
+
+
+def _compile_rule(rule: str) -> Optional[str]:
+    """模式规则对应的正则表达式，完整的应用 ID 返回 None"""
+    if rule.startswith(REGEX_PREFIX):
+        return rule[len(REGEX_PREFIX):]
+    if any(c in rule for c in GLOB_CHARS):
+        return fnmatch.translate(rule)
+    return None
+
+
+class RuleMatcher:
+    """一组规则（完整 ID 或模式）到值的匹配器，查找结果按应用 ID 缓存"""
+    
+    def __init__(self, rules: Iterable[Tuple[str, Any]]):
+        self.exact: Dict[str, Any] = {}
+        self.values: List[Any] = []
+        combined = []
+        # 单独匹配的模式：(规则序号, 编译后的正则)，按配置顺序
+        self._separate: List[Tuple[int, "re.Pattern"]] = []
+        for rule, value in rules:
+            if not isinstance(rule, str):
+                continue
+            pattern = _compile_rule(rule)
+            if pattern is None:
+                self.exact.setdefault(rule, value)
+                continue
+            try:
+                compiled = re.compile(pattern)
+            except re.error as e:
+                safe_print(f"⚠️ 忽略无效的应用匹配规则 {rule!r}: {e}")
+                continue
+            if rule.startswith(REGEX_PREFIX) and STANDALONE_PATTERN.search(pattern):
+                self._separate.append((len(self.values), compiled))
+            else:
+                combined.append((len(self.values), pattern, compiled))
+            self.values.append(value)
+        self._combined = None
+        self._combined_index: List[int] = []
+        if combined:
+            try:
+                # 每个模式是一个命名分组，匹配到的分组对应 _combined_index 中的规则序号
+                # （旧版本 Python 对模式中间的全局标志只给出警告并作用于整个表达式，同样视为无法合并）
+                with warnings.catch_warnings():
+                    warnings.simplefilter("error", DeprecationWarning)
+                    self._combined = re.compile("|".join(
+                        f"(?P<_r{i}>{pattern})" for i, (_, pattern, _) in enumerate(combined)))
+                self._combined_index = [index for index, _, _ in combined]
+            except (re.error, DeprecationWarning):
+                # 其他无法合并的情况（如不同规则中的同名分组）全部逐个匹配
+                self._separate = sorted(self._separate + [(index, compiled) for index, _, compiled in combined],
+                                        key=lambda item: item[0])
+        self._memo: Dict[str, Tuple[bool, Any]] = {}
+    
+    def lookup(self, app_id: str) -> Tuple[bool, Any]:
+        """返回 (是否匹配, 匹配规则的值)"""
+        result = self._memo.get(app_id)
+        if result is None:
+            result = self._match(app_id)
+            if len(self._memo) >= MEMO_LIMIT:
+                self._memo.clear()
+            self._memo[app_id] = result
+        return result
+    
+    def _match(self, app_id: str) -> Tuple[bool, Any]:
+        if app_id in self.exact:
+            return True, self.exact[app_id]
+        # 合并模式中第一个匹配的规则序号，之后只需检查配置中排在它前面的单独模式
+        first = len(self.values)
+        if self._combined is not None:
+            match = self._combined.fullmatch(app_id)
+            if match is not None:
+                # lastgroup 可能是用户正则中的命名分组，取第一个参与匹配的规则分组
+                for i, index in enumerate(self._combined_index):
+                    if match.group(f"_r{i}") is not None:
+                        first = index
+                        break
+        for index, pattern in self._separate:
+            if index >= first:
+                break
+            if pattern.fullmatch(app_id):
+                return True, self.values[index]
+        if first < len(self.values):
+            return True, self.values[first]
+        return False, None
+
+
+class AppRules:
+    """按当前配置编译的应用名称映射与忽略列表"""
+    
+    def __init__(self, name_mapping: Dict[str, str], ignored_apps: List[str]):
+        self.names = RuleMatcher(name_mapping.items() if isinstance(name_mapping, dict) else ())
+        self.ignored = RuleMatcher((app, True) for app in (ignored_apps or ()))
+    
+    def app_name(self, app_id: str) -> str:
+        matched, name = self.names.lookup(app_id)
+        return name if matched else app_id
+    
+    def is_ignored(self, app_id: str) -> bool:
+        return self.ignored.lookup(app_id)[0]
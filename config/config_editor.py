@@ -69,7 +69,7 @@ class ConfigEditor:
         
         action = input("添加(a)/删除(d)/清空(c)忽略列表: ").strip().lower()
         if action == 'a':
-            app = input("输入要忽略的应用ID: ").strip()
+            app = input("输入要忽略的应用ID（可用通配符如 Microsoft.ZuneMusic*，或 re: 开头的正则表达式）: ").strip()
             if app and app not in ignored_apps:
                 ignored_apps.append(app)
                 config.set("apps.ignored_apps", ignored_apps)
@@ -1,7 +1,9 @@
 # config_manager.py
 import json
 import os
-from typing import Dict, Any, Optional
+import threading
+from typing import Callable, Dict, Any, List, NamedTuple, Optional, Set
+from config.app_rules import AppRules
 from utils.safe_print import safe_print
 
 # 全局变量控制调试输出
@@ -51,6 +53,53 @@ class VersionInfo:
         """获取完整应用名称和版本"""
         return f"{cls.APP_NAME} v{cls.VERSION}"
 
+# 热路径使用的配置项：快照属性 -> (配置路径, 默认值)，值按默认值的类型转换
+SNAPSHOT_KEYS = {
+    'use_emoji': ("display.use_emoji", True),
+    'show_progress': ("display.show_progress", True),
+    'show_genre': ("display.show_genre", True),
+    'show_year': ("display.show_year", True),
+    'show_track_number': ("display.show_track_number", True),
+    'timestamp_format': ("display.timestamp_format", "%Y-%m-%d %H:%M:%S"),
+    'default_recent_limit': ("display.default_recent_limit", 10),
+    'show_overlay_on_repeat': ("display.show_overlay_on_repeat", True),
+    'overlay_duration_seconds': ("display.overlay_duration_seconds", 5.0),
+    'overlay_history_limit': ("display.overlay_history_limit", 5),
+    'capture_artwork': ("monitoring.capture_artwork", True),
+    'session_checkpoint_seconds': ("monitoring.session_checkpoint_seconds", 60.0),
+    'journal_compact_seconds': ("database.journal_compact_seconds", 30.0),
+}
+
+
+class ConfigSnapshot(NamedTuple):
+    """热路径使用的配置快照（不可变），监控循环与逐行输出直接读取属性，不必每次按路径查找"""
+    use_emoji: bool
+    show_progress: bool
+    show_genre: bool
+    show_year: bool
+    show_track_number: bool
+    timestamp_format: str
+    default_recent_limit: int
+    show_overlay_on_repeat: bool
+    overlay_duration_seconds: float
+    overlay_history_limit: int
+    capture_artwork: bool
+    session_checkpoint_seconds: float
+    journal_compact_seconds: float
+    
+    @classmethod
+    def build(cls, manager: "ConfigManager") -> "ConfigSnapshot":
+        """从当前配置生成快照"""
+        values = {}
+        for name, (key_path, default) in SNAPSHOT_KEYS.items():
+            value = manager.get(key_path, default)
+            try:
+                values[name] = type(default)(value)
+            except (TypeError, ValueError):
+                values[name] = default
+        return cls(**values)
+
+
 class ConfigManager:
     def __init__(self, config_file: str = None):
         # 导入放在这里避免循环导入
@@ -76,6 +125,15 @@ class ConfigManager:
         debug_print(f"🔧 调试：日志文件路径: {self.log_file_path}")
         
         self.config = self._load_default_config()
+        self._snapshot = None
+        self._app_rules = None
+        # 热重载：配置文件的 (修改时间, 大小)、运行时通过 set 修改的配置项、变化回调与监视线程
+        self._file_stat = None
+        self._overrides: Dict[str, Any] = {}
+        self._subscribers: List[Callable[[Set[str]], None]] = []
+        self._lock = threading.RLock()
+        self._watcher = None
+        self._watch_stop = None
         self.load_config()
         
     def _load_default_config(self) -> Dict[str, Any]:
@@ -84,12 +142,53 @@ class ConfigManager:
             "database": {
                 "path": self.database_path,  # 使用正确的数据库路径
                 "auto_backup": True,
-                "backup_interval_days": 7
+                "backup_interval_days": 1,
+                "full_backup_interval_days": 30,
+                "backup_keep_daily": 7,
+                "backup_keep_weekly": 4,
+                "backup_keep_monthly": 12,
+                "archive_enabled": False,
+                "archive_after_days": 365,
+                "rollup_enabled": False,
+                "rollup_after_days": 730,
+                "backup_compression": "none",
+                "backup_pages_per_step": 256,
+                "backup_step_sleep_ms": 10,
+                "journal_enabled": False,
+                "journal_fsync_seconds": 1,
+                "journal_compact_seconds": 30,
+                "journal_segment_mb": 4,
+                "artwork_cache_size": 32,
+                "history_cache_size": 256,
+                "history_preload_tracks": 50
             },
             "monitoring": {
                 "default_interval": 5,
                 "min_interval": 1,
                 "max_interval": 60,
+                "idle_interval": 30,
+                "paused_interval": 15,
+                "track_end_window": 10,
+                "track_end_interval": 1,
+                "event_driven": True,
+                "heartbeat_interval": 30,
+                "metadata_max_wait": 2,
+                "multi_session": False,
+                "session_grace_seconds": 10,
+                "progress_min_delta": 10,
+                "progress_checkpoint_seconds": 60,
+                "qualify_percentage": 50,
+                "qualify_seconds": 240,
+                "pipeline_queue_size": 100,
+                "source_call_timeout": 2,
+                "source_failure_threshold": 3,
+                "source_backoff_max": 60,
+                "session_checkpoint_seconds": 60,
+                "config_reload_seconds": 2,
+                "capture_artwork": True,
+                "source": "smtc",
+                "timeline_file": "",
+                "record_file": "",
                 "auto_start": False,
                 "duplicate_threshold_minutes": 1
             },
@@ -141,8 +240,11 @@ class ConfigManager:
         
     def load_config(self) -> None:
         """从文件加载配置"""
+        self._snapshot = None
+        self._app_rules = None
         if os.path.exists(self.config_file):
             try:
+                self._file_stat = self._stat()
                 with open(self.config_file, 'r', encoding='utf-8') as f:
                     file_config = json.load(f)
                     self._merge_config(self.config, file_config)
@@ -179,6 +281,9 @@ class ConfigManager:
                 
             with open(self.config_file, 'w', encoding='utf-8') as f:
                 json.dump(self.config, f, ensure_ascii=False, indent=2)
+            # 运行时的修改已写入文件，不再需要在重新加载时保留
+            self._file_stat = self._stat()
+            self._overrides.clear()
             safe_print(f"💾 配置已保存到: {self.config_file}")
         except Exception as e:
             safe_print(f"❌ 保存配置失败: {e}")
@@ -197,9 +302,17 @@ class ConfigManager:
         return current
         
     def set(self, key_path: str, value: Any) -> None:
-        """设置配置值，支持点号分隔的路径"""
+        """设置配置值，支持点号分隔的路径（重新加载配置文件后仍然保留）"""
+        with self._lock:
+            self._set_in(self.config, key_path, value)
+            self._overrides[key_path] = value
+            self._snapshot = None
+            self._app_rules = None
+    
+    @staticmethod
+    def _set_in(target: Dict[str, Any], key_path: str, value: Any) -> None:
         keys = key_path.split('.')
-        current = self.config
+        current = target
         
         for key in keys[:-1]:
             if key not in current:
@@ -207,24 +320,166 @@ class ConfigManager:
             current = current[key]
             
         current[keys[-1]] = value
+    
+    # ========== 热重载 ==========
+    
+    def _stat(self) -> Optional[tuple]:
+        """配置文件的 (修改时间, 大小)，文件不存在时返回 None"""
+        try:
+            st = os.stat(self.config_file)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+    
+    def _validate(self, default: Dict[str, Any], override: Dict[str, Any], prefix: str = '') -> List[str]:
+        """按默认配置的类型检查配置文件中的值，返回错误列表（未知的配置项不检查）"""
+        errors = []
+        for key, value in override.items():
+            if key not in default:
+                continue
+            expected = default[key]
+            key_path = prefix + key
+            if isinstance(expected, dict):
+                if isinstance(value, dict):
+                    errors.extend(self._validate(expected, value, key_path + '.'))
+                else:
+                    errors.append(f"{key_path} 应为对象")
+            elif isinstance(expected, bool):
+                if not isinstance(value, bool):
+                    errors.append(f"{key_path} 应为 true 或 false")
+            elif isinstance(expected, (int, float)):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    errors.append(f"{key_path} 应为数字")
+            elif isinstance(expected, str):
+                if not isinstance(value, str):
+                    errors.append(f"{key_path} 应为字符串")
+            elif isinstance(expected, list):
+                if not isinstance(value, list):
+                    errors.append(f"{key_path} 应为列表")
+        return errors
+    
+    @classmethod
+    def _changed_keys(cls, old: Dict[str, Any], new: Dict[str, Any], prefix: str = '') -> Set[str]:
+        """两份配置中值不同的配置项路径"""
+        changed = set()
+        for key in set(old) | set(new):
+            a, b = old.get(key), new.get(key)
+            if isinstance(a, dict) and isinstance(b, dict):
+                changed |= cls._changed_keys(a, b, prefix + key + '.')
+            elif a != b:
+                changed.add(prefix + key)
+        return changed
+    
+    def subscribe(self, callback: Callable[[Set[str]], None]) -> None:
+        """订阅配置变化：重新加载后以变化的配置项路径集合调用 callback（在监视线程中调用）"""
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+    
+    def unsubscribe(self, callback: Callable[[Set[str]], None]) -> None:
+        """取消订阅配置变化"""
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+    
+    def check_reload(self) -> bool:
+        """配置文件的修改时间或大小变化时重新加载，返回是否应用了新的配置"""
+        if self._stat() == self._file_stat:
+            return False
+        return self.reload()
+    
+    def reload(self) -> bool:
+        """重新读取配置文件，校验通过后整体替换当前配置并通知订阅者；文件无效时保留当前配置"""
+        stat = self._stat()
+        new_config = self._load_default_config()
+        try:
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                file_config = json.load(f)
+            errors = self._validate(new_config, file_config) if isinstance(file_config, dict) else ["配置文件应为对象"]
+        except (OSError, ValueError) as e:
+            errors = [str(e)]
+        if errors:
+            # 文件再次修改后重试
+            self._file_stat = stat
+            safe_print(f"⚠️ 配置文件无效，继续使用当前配置: {'; '.join(errors[:3])}")
+            return False
+        
+        self._merge_config(new_config, file_config)
+        with self._lock:
+            for key_path, value in self._overrides.items():
+                self._set_in(new_config, key_path, value)
+            changed = self._changed_keys(self.config, new_config)
+            self.config = new_config
+            self._snapshot = None
+            self._app_rules = None
+            self._file_stat = stat
+            subscribers = list(self._subscribers)
+        if not changed:
+            return True
+        safe_print(f"🔄 配置已重新加载: {', '.join(sorted(changed))}")
+        for callback in subscribers:
+            try:
+                callback(changed)
+            except Exception as e:
+                safe_print(f"⚠️ 应用配置变化失败: {e}")
+        return True
+    
+    def start_watching(self, interval: float = None) -> None:
+        """启动监视线程，每 interval 秒（默认 monitoring.config_reload_seconds，0 为不监视）检查一次配置文件"""
+        if interval is None:
+            interval = self.get("monitoring.config_reload_seconds", 2)
+        if interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        stop = self._watch_stop = threading.Event()
+        
+        def watch():
+            while not stop.wait(interval):
+                try:
+                    self.check_reload()
+                except Exception as e:
+                    safe_print(f"⚠️ 检查配置文件失败: {e}")
         
+        self._watcher = threading.Thread(target=watch, name="config-watcher", daemon=True)
+        self._watcher.start()
+    
+    def stop_watching(self) -> None:
+        """停止监视线程"""
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+        self._watcher = None
+        self._watch_stop = None
+    
+    @property
+    def snapshot(self) -> ConfigSnapshot:
+        """热路径使用的配置快照（配置变化后首次读取时重新生成）"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self._snapshot = ConfigSnapshot.build(self)
+        return snapshot
+        
+    @property
+    def app_rules(self) -> AppRules:
+        """编译后的应用名称映射与忽略规则（配置变化后首次读取时重新编译）"""
+        rules = self._app_rules
+        if rules is None:
+            rules = self._app_rules = AppRules(self.get("apps.name_mapping", {}), self.get("apps.ignored_apps", []))
+        return rules
+    
     def get_app_name(self, app_id: str) -> str:
-        """获取应用的显示名称"""
-        name_mapping = self.get("apps.name_mapping", {})
-        return name_mapping.get(app_id, app_id)
+        """获取应用的显示名称（支持通配符与正则表达式规则）"""
+        return self.app_rules.app_name(app_id)
         
     def is_app_ignored(self, app_id: str) -> bool:
-        """检查应用是否被忽略"""
-        ignored_apps = self.get("apps.ignored_apps", [])
-        return app_id in ignored_apps
+        """检查应用是否被忽略（支持通配符与正则表达式规则）"""
+        return self.app_rules.is_ignored(app_id)
         
     def get_timestamp_format(self) -> str:
         """获取时间戳格式"""
-        return self.get("display.timestamp_format", "%Y-%m-%d %H:%M:%S")
+        return self.snapshot.timestamp_format
         
     def should_use_emoji(self) -> bool:
         """是否使用emoji"""
-        return self.get("display.use_emoji", True)
+        return self.snapshot.use_emoji
         
     def get_monitoring_interval(self) -> int:
         """获取监控间隔"""
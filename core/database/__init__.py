@@ -2,13 +2,22 @@
 """
 数据库模块 - 统一对外接口
 """
+import os
+from datetime import datetime
+from typing import Optional
 from .connection import DatabaseConnection
 from .repository import MediaRepository, SessionRepository
 from .statistics import StatisticsService
 from .backup import BackupManager
+from .archive import ArchiveManager
+from .retention import RetentionManager
 from .exporter import DataExporter
 from .schema import DatabaseSchema
+from .journal import JournalCompactor, PlaybackJournal
+from .artwork import ArtworkStore
 from config.config_manager import config
+from core.media_info import MediaInfo
+from utils.clock import SystemClock
 from utils.logger import logger
 
 # 全局变量控制调试输出
@@ -29,23 +38,41 @@ def debug_print(message):
 class DatabaseManager:
     """数据库管理器 - 整合各个子模块"""
     
-    def __init__(self):
+    def __init__(self, db_path: str = None, maintenance: bool = True, clock: SystemClock = None):
         # 获取数据库路径
-        self.db_path = config.get_database_path()
+        self.db_path = db_path or config.get_database_path()
         debug_print(f"🔧 调试：数据库管理器使用路径: {self.db_path}")
+        # 写入播放记录、跳过计数与事件日志的时间来源（回放时传入监控循环的虚拟时钟）
+        self.clock = clock or SystemClock()
         
         # 初始化各个子模块
         self.connection = DatabaseConnection(self.db_path)
         self.schema = DatabaseSchema(self.connection)
         self.backup_manager = BackupManager(self.db_path)
-        self.media_repo = MediaRepository(self.connection)
+        self.archive_manager = ArchiveManager(self.connection, self.db_path)
+        self.archive_manager.on_rows_removed = self._rows_removed
+        self.retention_manager = RetentionManager(self.connection, self.archive_manager)
+        self.retention_manager.on_rows_removed = self._rows_removed
+        self.media_repo = MediaRepository(self.connection, self.clock)
         self.session_repo = SessionRepository(self.connection)
-        self.statistics = StatisticsService(self.connection)
-        self.exporter = DataExporter(self.connection, self.statistics)
+        self.statistics = StatisticsService(self.connection, self.archive_manager)
+        self.exporter = DataExporter(self.connection, self.statistics, self.archive_manager)
+        self.journal_dir = os.path.join(os.path.dirname(os.path.abspath(self.db_path)), "journal")
+        self.journal_compactor = JournalCompactor(self.connection, self.journal_dir, self.media_repo.history_cache)
+        self.journal = None
+        self.artwork = ArtworkStore(os.path.join(os.path.dirname(os.path.abspath(self.db_path)), "artwork"))
         
         # 初始化数据库
         self.init_database()
+        # 临时数据库（如回放测试）不需要备份、归档等后台维护
+        if maintenance:
+            self.start_maintenance()
+    
+    def start_maintenance(self) -> None:
+        """按需在后台线程中开始备份、归档与汇总"""
         self.backup_manager.check_and_backup()
+        self.archive_manager.check_and_archive()
+        self.retention_manager.check_and_rollup()
     
     def init_database(self) -> None:
         """初始化数据库"""
@@ -56,15 +83,30 @@ class DatabaseManager:
             logger.error(f"数据库初始化失败: {e}")
             raise
     
+    def _rows_removed(self) -> None:
+        """有记录被归档或汇总删除：重置增量备份链，清空歌曲历史缓存"""
+        self.backup_manager.reset_chain()
+        self.media_repo.history_cache.clear()
+    
     # ========== 媒体信息相关方法 ==========
     
-    def save_media_info(self, media_info: dict) -> bool:
-        """保存媒体信息"""
-        return self.media_repo.save(media_info)
+    def save_media_info(self, media_info: MediaInfo, timestamp: datetime = None) -> Optional[int]:
+        """保存媒体信息，返回新记录的 id"""
+        return self.media_repo.save(media_info, timestamp)
     
-    def update_media_progress(self, media_info: dict) -> bool:
+    def update_media_progress(self, media_info: MediaInfo, record_id: Optional[int] = None,
+                              timestamp: datetime = None) -> bool:
         """更新播放进度"""
-        return self.media_repo.update_progress(media_info)
+        return self.media_repo.update_progress(media_info, record_id, timestamp)
+    
+    def save_media_batch(self, new_tracks: list, progress: list, skips: list = (),
+                         timestamp: datetime = None) -> Optional[list]:
+        """在一个事务中保存新播放记录、更新播放进度并记录跳过，返回新记录的 id 列表"""
+        return self.media_repo.save_batch(new_tracks, progress, skips, timestamp)
+    
+    def record_skip(self, track, timestamp: datetime = None) -> bool:
+        """歌曲未达到计入条件就被切走，跳过计数加一"""
+        return self.media_repo.record_skip(track, timestamp)
     
     def get_recent_tracks(self, limit: int = None) -> list:
         """获取最近播放的歌曲"""
@@ -76,12 +118,91 @@ class DatabaseManager:
         """获取指定歌曲的历史记录"""
         return self.media_repo.get_track_history(title, artist, limit)
     
+    def preload_track_history(self, count: int = None) -> int:
+        """预加载播放次数最多的歌曲的最近记录（供重复播放叠加层使用），返回加载的歌曲数"""
+        if count is None:
+            count = config.get("database.history_preload_tracks", 50)
+        return self.media_repo.preload_history(count)
+    
+    # ========== 封面相关方法 ==========
+    
+    def store_artwork(self, data: bytes) -> Optional[str]:
+        """保存封面图片（同一图片只保存一次），返回内容哈希"""
+        return self.artwork.put(data)
+    
+    def get_artwork(self, artwork_hash: str) -> Optional[bytes]:
+        """按内容哈希读取封面图片"""
+        return self.artwork.get(artwork_hash)
+    
+    # ========== 事件日志相关方法 ==========
+    
+    def open_journal(self) -> PlaybackJournal:
+        """打开事件日志（监控写入播放事件，由 compact_journal 合并进数据库）"""
+        if self.journal is None:
+            self.journal = PlaybackJournal(self.journal_dir, self.clock)
+        return self.journal
+    
+    def close_journal(self) -> None:
+        """同步并关闭事件日志"""
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+    
+    def compact_journal(self) -> Optional[list]:
+        """把事件日志中尚未合并的事件写入数据库，返回新写入的播放记录，失败时返回 None"""
+        if self.journal is not None:
+            self.journal.flush()
+        return self.journal_compactor.compact()
+    
+    def rebuild_from_journal(self) -> tuple:
+        """重放全部事件日志重建播放记录与跳过计数，返回 (补写或修正的播放记录数, 跳过次数)"""
+        # 先合并尚未合并的事件，避免之后再次计入
+        self.compact_journal()
+        # 已归档或汇总的记录不在主库中，这些时间之前的播放不补写
+        boundaries = [row[0] for row in self.connection.execute_query(
+            "SELECT value FROM db_config WHERE key IN ('archive_boundary', 'rollup_boundary') AND value != ''"
+        )]
+        result = self.journal_compactor.rebuild(max(boundaries) if boundaries else None)
+        self.media_repo.history_cache.clear()
+        return result
+    
     # ========== 会话相关方法 ==========
     
     def save_session_info(self, start_time, end_time, app_name: str, tracks_count: int) -> None:
         """保存播放会话信息"""
         self.session_repo.save(start_time, end_time, app_name, tracks_count)
     
+    def start_session(self, start_time) -> Optional[int]:
+        """开始会话：写入检查点行，返回会话 id"""
+        return self.session_repo.start(start_time)
+    
+    def checkpoint_session(self, session_id: int, end_time, app_name: str, tracks_count: int) -> None:
+        """更新进行中会话的检查点"""
+        self.session_repo.checkpoint(session_id, end_time, app_name, tracks_count)
+    
+    def finish_session(self, session_id: int, end_time, app_name: str, tracks_count: int) -> None:
+        """结束会话"""
+        self.session_repo.finish(session_id, end_time, app_name, tracks_count)
+    
+    def recover_sessions(self) -> int:
+        """结束上次异常退出时遗留的会话，返回恢复的会话数"""
+        return self.session_repo.recover()
+    
+    # ========== 备份相关方法 ==========
+    
+    def restore_backup(self, target_time=None) -> bool:
+        """从备份恢复数据库（全量基准 + 增量备份）"""
+        # 启动时可能已开始后台归档与汇总，等它们写完再替换数据库文件（备份线程由 restore 等待）
+        self.archive_manager.wait_for_archive()
+        self.retention_manager.wait_for_rollup()
+        restored = self.backup_manager.restore(target_time)
+        if restored:
+            self.media_repo.history_cache.clear()
+            if target_time is not None:
+                # 恢复到指定时间点：之后的事件不再合并（仍保留在日志中）
+                self.journal_compactor.skip_to_end()
+        return restored
+    
     # ========== 统计相关方法 ==========
     
     def get_statistics(self) -> dict:
@@ -95,5 +216,5 @@ class DatabaseManager:
         return self.exporter.export_all()
 
 
-# 全局数据库实例
-db = DatabaseManager()
\ No newline at end of file
+# 全局数据库实例（导入时不启动后台维护，由启动器在确定不是恢复数据库后调用 start_maintenance）
+db = DatabaseManager(maintenance=False)
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""
+历史归档 - 将较早的播放记录按年份移入独立的归档数据库
+
+主数据库只保留最近的记录，监控写入与近期查询不受历史数据量影响；
+需要跨越归档范围的查询会按需挂载（ATTACH）归档文件，并通过 UNION 视图读取。
+"""
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from config.config_manager import config
+from utils.logger import logger
+
+
+ARCHIVE_FILE_PATTERN = re.compile(r"^media_history_(\d{4})\.db$")
+
+
+class ArchiveManager:
+    """归档数据库管理器"""
+    
+    def __init__(self, connection, db_path: str):
+        self.connection = connection
+        self.archive_dir = os.path.join(os.path.dirname(os.path.abspath(db_path)), "archives")
+        self.on_rows_removed = None  # 有记录移出主库时的回调（用于重置增量备份链）
+        self._archive_files = None
+        self._boundary = None
+        self._boundary_loaded = False
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def check_and_archive(self) -> None:
+        """检查是否需要归档，需要时在后台线程中执行"""
+        if not config.get("database.archive_enabled", False):
+            return
+        
+        row = self.connection.execute_single(
+            "SELECT value FROM db_config WHERE key = 'archive_last_run'"
+        )
+        if row and row[0]:
+            try:
+                if datetime.now() - datetime.fromisoformat(row[0]) < timedelta(days=1):
+                    return
+            except ValueError:
+                pass
+        
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self.archive_old_records, name="DatabaseArchive", daemon=True
+            )
+            self._thread.start()
+    
+    def wait_for_archive(self, timeout: float = None) -> None:
+        """等待后台归档完成"""
+        thread = self._thread
+        if thread and thread.is_alive():
+            thread.join(timeout)
+    
+    def archive_old_records(self) -> int:
+        """把超过 archive_after_days 天的播放记录移入按年份划分的归档数据库"""
+        moved = 0
+        try:
+            days = config.get("database.archive_after_days", 365)
+            now = datetime.now()
+            cutoff = (now - timedelta(days=days)).isoformat()
+            
+            years = [
+                row[0] for row in self.connection.execute_query(
+                    "SELECT DISTINCT substr(timestamp, 1, 4) FROM media_history WHERE timestamp < ?",
+                    (cutoff,)
+                )
+                if row[0] and row[0].isdigit()
+            ]
+            
+            if years and not os.path.exists(self.archive_dir):
+                os.makedirs(self.archive_dir)
+            
+            with self.connection.get_connection() as conn:
+                for year in sorted(years):
+                    moved += self._move_year(conn, int(year), cutoff)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO db_config (key, value, updated_at) VALUES (?, ?, ?)",
+                    [('archive_boundary', cutoff, now.isoformat()),
+                     ('archive_last_run', now.isoformat(), now.isoformat())]
+                )
+            
+            self._boundary = datetime.fromisoformat(cutoff)
+            self._boundary_loaded = True
+            self._archive_files = None
+            
+            if moved:
+                # 记录移动已提交：先重置备份链并清空缓存，VACUUM 失败不影响这一步
+                if self.on_rows_removed:
+                    self.on_rows_removed()
+                logger.info(f"已归档 {moved} 条播放记录（早于 {cutoff[:10]}）")
+                # 释放主库中被移走记录占用的空间（失败时下次归档再回收）
+                try:
+                    with self.connection.get_connection() as conn:
+                        conn.isolation_level = None
+                        conn.execute("VACUUM")
+                except Exception as e:
+                    logger.warning(f"归档后回收数据库空间失败: {e}")
+            return moved
+        
+        except Exception as e:
+            logger.error(f"归档播放记录失败: {e}")
+            # 每年的移动单独提交，失败前已移走的记录同样需要重置备份链
+            if moved and self.on_rows_removed:
+                self.on_rows_removed()
+            self._archive_files = None
+            return moved
+    
+    def _move_year(self, conn, year: int, cutoff: str) -> int:
+        """把某一年中早于截止时间的记录移入该年的归档文件"""
+        conn.execute("ATTACH DATABASE ? AS arc", (self._archive_path(year),))
+        try:
+            columns = [r[1] for r in conn.execute("PRAGMA main.table_info(media_history)").fetchall()]
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS arc.media_history AS SELECT * FROM main.media_history WHERE 0"
+            )
+            existing = {r[1] for r in conn.execute("PRAGMA arc.table_info(media_history)").fetchall()}
+            for column in columns:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE arc.media_history ADD COLUMN {column}")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS arc.idx_media_history_timestamp ON media_history (timestamp)"
+            )
+            
+            column_list = ", ".join(columns)
+            params = (f"{year}-", f"{year + 1}-", cutoff)
+            where = "timestamp >= ? AND timestamp < ? AND timestamp < ?"
+            try:
+                conn.execute(
+                    f"INSERT INTO arc.media_history ({column_list}) "
+                    f"SELECT {column_list} FROM main.media_history WHERE {where}",
+                    params
+                )
+                moved = conn.execute(f"DELETE FROM main.media_history WHERE {where}", params).rowcount
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            return moved
+        finally:
+            conn.execute("DETACH DATABASE arc")
+    
+    def archives_for_window(self, days: Optional[int] = None) -> List[str]:
+        """返回查询最近 days 天（None 表示全部历史）所需挂载的归档文件"""
+        files = self.archive_files()
+        if not files:
+            return []
+        if days is None:
+            return [files[year] for year in sorted(files)]
+        
+        # 多留一天余量，兼容 SQLite 'now' 使用 UTC 的时间比较
+        since = datetime.now() - timedelta(days=days + 1)
+        boundary = self._get_boundary()
+        if boundary is not None and since >= boundary:
+            return []
+        return [files[year] for year in sorted(files) if year >= since.year]
+    
+    def archive_files(self) -> Dict[int, str]:
+        """获取已有的归档文件（年份 -> 路径）"""
+        if self._archive_files is None:
+            files = {}
+            if os.path.isdir(self.archive_dir):
+                for filename in os.listdir(self.archive_dir):
+                    match = ARCHIVE_FILE_PATTERN.match(filename)
+                    if match:
+                        files[int(match.group(1))] = os.path.join(self.archive_dir, filename)
+            self._archive_files = files
+        return self._archive_files
+    
+    def _get_boundary(self) -> Optional[datetime]:
+        """获取归档边界：早于此时间的记录都已移入归档"""
+        if not self._boundary_loaded:
+            row = self.connection.execute_single(
+                "SELECT value FROM db_config WHERE key = 'archive_boundary'"
+            )
+            try:
+                self._boundary = datetime.fromisoformat(row[0]) if row and row[0] else None
+            except ValueError:
+                self._boundary = None
+            self._boundary_loaded = True
+        return self._boundary
+    
+    def _archive_path(self, year: int) -> str:
+        """某一年的归档文件路径"""
+        return os.path.join(self.archive_dir, f"media_history_{year}.db")
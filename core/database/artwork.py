@@ -0,0 +1,125 @@
+"""
+封面存储 - 按内容寻址保存专辑封面，同一张图片只保存一次
+
+封面图片按 SHA-256 哈希保存为 artwork/<哈希前两位>/<哈希>.<扩展名>，播放记录只保存哈希
+（media_history.artwork_hash）。同一专辑的每次播放读到的是同一张图片，哈希相同即不再写入。
+写入先写临时文件再原子替换，崩溃不会留下不完整的图片。
+最近读取的图片保存在内存中的 LRU 缓存里（最多 database.artwork_cache_size 张），
+叠加层等界面显示封面时不需要每次读取磁盘。
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+from config.config_manager import config
+from utils.logger import logger
+
+
+# 按文件头识别的图片格式，未知格式使用 .bin
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'GIF8', '.gif'),
+    (b'BM', '.bmp'),
+)
+IMAGE_EXTENSIONS = tuple(ext for _, ext in IMAGE_SIGNATURES) + ('.webp', '.bin')
+
+
+def artwork_hash(data: bytes) -> str:
+    """封面图片的内容哈希"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _extension(data: bytes) -> str:
+    for signature, ext in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return ext
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return '.webp'
+    return '.bin'
+
+
+class ArtworkStore:
+    """按内容寻址的封面存储（可在多个线程中使用）"""
+    
+    def __init__(self, directory: str, cache_size: int = None):
+        self.directory = directory
+        self.cache_size = config.get("database.artwork_cache_size", 32) if cache_size is None else cache_size
+        self.stored = 0  # 新写入的图片数
+        self.deduplicated = 0  # 已存在而未写入的次数
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _path(self, digest: str, ext: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest + ext)
+    
+    def _find(self, digest: str) -> Optional[str]:
+        """已保存图片的路径，不存在时返回 None"""
+        for ext in IMAGE_EXTENSIONS:
+            path = self._path(digest, ext)
+            if os.path.exists(path):
+                return path
+        return None
+    
+    def _remember(self, digest: str, data: bytes) -> None:
+        with self._lock:
+            self._cache[digest] = data
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+    
+    def put(self, data: bytes) -> Optional[str]:
+        """保存封面图片（已存在时不重复写入），返回内容哈希，失败时返回 None"""
+        if not data:
+            return None
+        digest = artwork_hash(data)
+        with self._lock:
+            cached = digest in self._cache
+        if cached or self._find(digest):
+            self.deduplicated += 1
+            return digest
+        
+        path = self._path(digest, _extension(data))
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"保存封面失败: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return None
+        self.stored += 1
+        self._remember(digest, data)
+        logger.debug(f"保存封面: {digest[:12]}（{len(data)} 字节）")
+        return digest
+    
+    def get(self, digest: str) -> Optional[bytes]:
+        """按哈希读取封面图片（优先从缓存读取），不存在时返回 None"""
+        if not digest:
+            return None
+        with self._lock:
+            data = self._cache.get(digest)
+            if data is not None:
+                self._cache.move_to_end(digest)
+                self.hits += 1
+                return data
+            self.misses += 1
+        path = self._find(digest)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            logger.warning(f"读取封面失败: {e}")
+            return None
+        self._remember(digest, data)
+        return data
@@ -1,11 +1,50 @@
 """
 数据库备份管理
+
+备份由定期的全量备份（基准）和其后的增量备份组成。增量备份只包含自上次
+备份以来新增或更新过的记录（按 id / timestamp 水位线划分）以及完整的跳过计数表
+（每首歌一行，体积很小），恢复时先还原基准，再按时间顺序叠加增量。所有备份都登记在备份目录 catalog.json 中。
+每个备份的元数据中记录复制时事件日志的合并位置，恢复后日志从该位置继续合并，
+备份中已有的播放不会被重复写入。备份不包含 archives/ 目录，恢复早于最近一次归档的备份时，
+已移入归档的时间范围内的记录不会写回主库。
 """
+import gzip
+import lzma
 import os
 import shutil
+import sqlite3
+import threading
+import time
 from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
 from config.config_manager import config
 from utils.logger import logger
+from .catalog import BackupCatalog
+from .connection import DatabaseConnection
+from .repository import SKIP_TABLE
+from .schema import DatabaseSchema
+
+
+# 备份文件后缀与对应的压缩方式
+BACKUP_SUFFIXES = {
+    "none": ".db",
+    "gzip": ".db.gz",
+    "xz": ".db.xz",
+}
+
+FULL_PREFIX = "media_history_"
+DELTA_PREFIX = "media_delta_"
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+
+# 记录在主数据库 db_config 表中的水位线
+WATERMARK_KEYS = ("backup_base", "backup_last_id", "backup_last_ts", "backup_last_session_id",
+                  "backup_last_session_end", "backup_last_skip_ts")
+
+# 事件日志已合并到的位置（与 journal.WATERMARK_KEY 相同），随备份内容一起记录在备份元数据中
+JOURNAL_POSITION_KEY = "journal_position"
+
+# 早于此时间的播放记录已移入归档数据库（与 archive.py 写入的键相同）
+ARCHIVE_BOUNDARY_KEY = "archive_boundary"
 
 
 class BackupManager:
@@ -15,80 +54,670 @@ class BackupManager:
         self.db_path = db_path
         from utils.system_utils import get_executable_dir
         self.backup_dir = os.path.join(get_executable_dir(), "backups")
+        self.catalog = BackupCatalog(self.backup_dir)
+        self._thread = None
+        self._lock = threading.Lock()
     
     def check_and_backup(self) -> None:
         """检查是否需要备份并执行"""
         if not config.get("database.auto_backup", True):
             return
         
-        backup_interval = config.get("database.backup_interval_days", 7)
-        
-        if not os.path.exists(self.backup_dir):
-            os.makedirs(self.backup_dir)
-        
-        # 查找最新的备份文件
-        backup_files = self._get_backup_files()
-        
-        if backup_files:
-            latest_backup = os.path.join(self.backup_dir, backup_files[0])
-            backup_time = datetime.fromtimestamp(os.path.getmtime(latest_backup))
-            
-            if datetime.now() - backup_time < timedelta(days=backup_interval):
-                return  # 不需要备份
+        # 只读取一次备份目录文件；目录不存在时交给后台线程从已有备份重建
+        if self.catalog.exists() and not self._is_backup_due():
+            return  # 不需要备份
         
-        # 创建备份
-        self.create_backup()
+        # 在后台线程中创建备份，不阻塞启动
+        self.start_background_backup()
+    
+    def _is_backup_due(self) -> bool:
+        """根据备份目录中最新的条目判断是否到了备份时间"""
+        latest = self.catalog.latest()
+        if not latest:
+            return True
+        backup_interval = config.get("database.backup_interval_days", 1)
+        return datetime.now() - self.catalog.created_time(latest) >= timedelta(days=backup_interval)
+    
+    def _run_scheduled_backup(self) -> None:
+        """后台备份任务：必要时重建备份目录，然后按需备份"""
+        if not self.catalog.exists():
+            self.rebuild_catalog()
+        if self._is_backup_due():
+            self.create_backup()
+    
+    def start_background_backup(self) -> bool:
+        """在后台线程中创建备份，已有备份在进行时直接返回"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return False
+            self._thread = threading.Thread(
+                target=self._run_scheduled_backup, name="DatabaseBackup", daemon=True
+            )
+            self._thread.start()
+            return True
+    
+    def wait_for_backup(self, timeout: float = None) -> None:
+        """等待后台备份完成"""
+        thread = self._thread
+        if thread and thread.is_alive():
+            thread.join(timeout)
+    
+    def reset_chain(self) -> None:
+        """记录被移出主库后，增量备份无法表达删除，下一次备份改为全量"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute("DELETE FROM db_config WHERE key = 'backup_base'")
+            conn.commit()
+        finally:
+            conn.close()
     
     def create_backup(self) -> bool:
-        """创建数据库备份"""
+        """创建备份：基准过期或不存在时做全量备份，否则做增量备份"""
+        try:
+            watermarks = self._read_watermarks()
+            if self._needs_full_backup(watermarks):
+                return self.create_full_backup()
+            return self.create_delta_backup(watermarks)
+        except Exception as e:
+            from utils.safe_print import safe_print
+            safe_print(f"❌ 创建数据库备份失败: {e}")
+            logger.error(f"创建数据库备份失败: {e}")
+            return False
+    
+    def create_full_backup(self) -> bool:
+        """创建全量备份（使用 SQLite 在线备份 API，保证一致性）"""
+        tmp_file = None
         try:
             if not os.path.exists(self.backup_dir):
                 os.makedirs(self.backup_dir)
             
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = os.path.join(self.backup_dir, f"media_history_{timestamp}.db")
+            compression = self._get_compression()
+            created_at = datetime.now()
+            timestamp = created_at.strftime(TIMESTAMP_FORMAT)
+            backup_name = f"{FULL_PREFIX}{timestamp}{BACKUP_SUFFIXES[compression]}"
+            backup_file = os.path.join(self.backup_dir, backup_name)
+            tmp_file = os.path.join(self.backup_dir, f"{FULL_PREFIX}{timestamp}.db.tmp")
+            
+            self._copy_online(tmp_file)
+            
+            # 水位线取自备份快照本身，保证与备份内容一致
+            watermarks = self._snapshot_watermarks(tmp_file)
+            watermarks["backup_base"] = backup_name
+            self._write_backup_meta(tmp_file, "full", backup_name, watermarks)
+            history_rows, session_rows = self._count_rows(tmp_file)
             
-            shutil.copy2(self.db_path, backup_file)
+            if not self._verify_integrity(tmp_file):
+                raise RuntimeError("备份文件完整性检查未通过")
+            
+            self._finalize(tmp_file, backup_file, compression)
+            tmp_file = None
+            self._record_backup(backup_name, "full", backup_name, created_at, history_rows, session_rows)
+            self._save_watermarks(watermarks)
             
             from utils.safe_print import safe_print
             safe_print(f"💾 数据库备份已创建: {backup_file}")
+            logger.info(f"数据库全量备份已创建: {backup_file}")
             
-            # 清理旧备份
-            self.cleanup_old_backups()
+            # 按保留策略清理旧备份
+            self.prune_backups()
             return True
-            
+        
         except Exception as e:
             from utils.safe_print import safe_print
             safe_print(f"❌ 创建数据库备份失败: {e}")
+            logger.error(f"创建数据库备份失败: {e}")
+            return False
+        finally:
+            self._remove_quietly(tmp_file)
+    
+    def create_delta_backup(self, watermarks: dict) -> bool:
+        """创建增量备份，只复制水位线之后新增或更新的记录"""
+        tmp_file = None
+        try:
+            compression = self._get_compression()
+            created_at = datetime.now()
+            timestamp = created_at.strftime(TIMESTAMP_FORMAT)
+            backup_name = f"{DELTA_PREFIX}{timestamp}{BACKUP_SUFFIXES[compression]}"
+            backup_file = os.path.join(self.backup_dir, backup_name)
+            tmp_file = os.path.join(self.backup_dir, f"{DELTA_PREFIX}{timestamp}.db.tmp")
+            
+            last_id = int(watermarks.get("backup_last_id") or 0)
+            last_ts = watermarks.get("backup_last_ts") or ""
+            last_session_id = int(watermarks.get("backup_last_session_id") or 0)
+            last_session_end = watermarks.get("backup_last_session_end") or ""
+            last_skip_ts = watermarks.get("backup_last_skip_ts") or ""
+            
+            conn = sqlite3.connect(self.db_path)
+            try:
+                conn.execute("ATTACH DATABASE ? AS delta", (tmp_file,))
+                # 在同一个读事务中复制记录并读取事件日志位置，两者一致
+                conn.execute("BEGIN")
+                journal_position = self._journal_position(conn)
+                conn.execute(
+                    "CREATE TABLE delta.media_history AS SELECT * FROM main.media_history "
+                    "WHERE id > ? OR timestamp > ?",
+                    (last_id, last_ts)
+                )
+                # 进行中的会话由检查点原地更新，按结束时间与未结束标记一并复制
+                conn.execute(
+                    "CREATE TABLE delta.playback_sessions AS SELECT * FROM main.playback_sessions "
+                    "WHERE id > ? OR session_end > ? OR is_open = 1",
+                    (last_session_id, last_session_end)
+                )
+                # 跳过计数是原地累加的小表，每个增量都复制整张表
+                conn.execute(f"CREATE TABLE delta.{SKIP_TABLE} AS SELECT * FROM main.{SKIP_TABLE}")
+                conn.commit()
+                history_rows, max_id, max_ts = conn.execute(
+                    "SELECT COUNT(*), MAX(id), MAX(timestamp) FROM delta.media_history"
+                ).fetchone()
+                session_rows, max_session_id, max_session_end = conn.execute(
+                    "SELECT COUNT(*), MAX(id), MAX(session_end) FROM delta.playback_sessions"
+                ).fetchone()
+                # 没有检查点更新的进行中会话不算变化
+                session_changes = conn.execute(
+                    "SELECT COUNT(*) FROM delta.playback_sessions WHERE id > ? OR session_end > ?",
+                    (last_session_id, last_session_end)
+                ).fetchone()[0]
+                skip_changes, max_skip_ts = conn.execute(
+                    f"SELECT COUNT(*), MAX(last_skipped) FROM delta.{SKIP_TABLE} WHERE last_skipped > ?",
+                    (last_skip_ts,)
+                ).fetchone()
+                conn.execute("DETACH DATABASE delta")
+            finally:
+                conn.close()
+            
+            if history_rows == 0 and session_changes == 0 and skip_changes == 0:
+                logger.debug("自上次备份以来没有新数据，跳过增量备份")
+                return True
+            
+            new_watermarks = dict(watermarks)
+            new_watermarks["backup_last_id"] = str(max(last_id, max_id or 0))
+            new_watermarks["backup_last_ts"] = max(last_ts, max_ts or "")
+            new_watermarks["backup_last_session_id"] = str(max(last_session_id, max_session_id or 0))
+            new_watermarks["backup_last_session_end"] = max(last_session_end, max_session_end or "")
+            new_watermarks["backup_last_skip_ts"] = max(last_skip_ts, max_skip_ts or "")
+            if journal_position:
+                new_watermarks[JOURNAL_POSITION_KEY] = journal_position
+            self._write_backup_meta(tmp_file, "delta", watermarks["backup_base"], new_watermarks)
+            
+            if not self._verify_integrity(tmp_file):
+                raise RuntimeError("增量备份完整性检查未通过")
+            
+            self._finalize(tmp_file, backup_file, compression)
+            tmp_file = None
+            self._record_backup(
+                backup_name, "delta", watermarks["backup_base"], created_at, history_rows, session_rows
+            )
+            self._save_watermarks(new_watermarks)
+            
+            from utils.safe_print import safe_print
+            safe_print(f"💾 增量备份已创建: {backup_file} ({history_rows} 条播放记录, {session_rows} 个会话)")
+            logger.info(f"数据库增量备份已创建: {backup_file}")
+            
+            self.prune_backups()
+            return True
+        
+        except Exception as e:
+            from utils.safe_print import safe_print
+            safe_print(f"❌ 创建增量备份失败: {e}")
+            logger.error(f"创建增量备份失败: {e}")
+            return False
+        finally:
+            self._remove_quietly(tmp_file)
+    
+    def restore(self, target_time: Optional[datetime] = None) -> bool:
+        """由全量基准加增量备份重建数据库，target_time 为空时恢复到最新备份"""
+        from utils.safe_print import safe_print
+        
+        self.wait_for_backup()
+        if target_time is None:
+            target_time = datetime.max
+        
+        chain = self._resolve_restore_chain(target_time)
+        if not chain:
+            safe_print("❌ 没有找到可用于恢复的备份")
+            return False
+        
+        restore_file = self.db_path + ".restore"
+        self._remove_quietly(restore_file)
+        try:
+            archive_boundary = self._read_config_value(self.db_path, ARCHIVE_BOUNDARY_KEY)
+            
+            for entry in chain:
+                self._verify_checksum(entry)
+            
+            base_name = chain[0]["file"]
+            self._decompress_to(os.path.join(self.backup_dir, base_name), restore_file)
+            # 较早的基准升级到当前表结构（如缺少跳过计数表），增量中的各表都能合并
+            DatabaseSchema(DatabaseConnection(restore_file)).create_tables()
+            
+            conn = sqlite3.connect(restore_file)
+            try:
+                journal_position = None
+                for entry in chain[1:]:
+                    meta = self._apply_delta(conn, entry["file"], base_name)
+                    journal_position = meta.get(JOURNAL_POSITION_KEY) or journal_position
+                if archive_boundary and archive_boundary > (self._config_value(conn, ARCHIVE_BOUNDARY_KEY) or ""):
+                    # 备份早于最近一次归档：这些记录已在归档数据库中，留在主库会被统计两次
+                    conn.execute("DELETE FROM media_history WHERE timestamp < ?", (archive_boundary,))
+                    conn.execute(
+                        "INSERT OR REPLACE INTO db_config (key, value, updated_at) VALUES (?, ?, ?)",
+                        (ARCHIVE_BOUNDARY_KEY, archive_boundary, datetime.now().isoformat())
+                    )
+                if journal_position:
+                    # 基准中的日志位置早于增量中的记录，改为最后一个增量复制时的位置
+                    conn.execute(
+                        "INSERT OR REPLACE INTO db_config (key, value, updated_at) VALUES (?, ?, ?)",
+                        (JOURNAL_POSITION_KEY, journal_position, datetime.now().isoformat())
+                    )
+                
+                # 恢复后的数据库重新开始一条新的备份链
+                conn.execute("CREATE TABLE IF NOT EXISTS db_config (key TEXT PRIMARY KEY, value TEXT, updated_at DATETIME DEFAULT CURRENT_TIMESTAMP)")
+                conn.executemany("DELETE FROM db_config WHERE key = ?", [(k,) for k in WATERMARK_KEYS])
+                conn.execute("DROP TABLE IF EXISTS backup_meta")
+                conn.commit()
+            finally:
+                conn.close()
+            
+            if not self._verify_integrity(restore_file):
+                raise RuntimeError("恢复后的数据库完整性检查未通过")
+            
+            if os.path.exists(self.db_path):
+                previous_file = self.db_path + ".before_restore"
+                shutil.copy2(self.db_path, previous_file)
+                safe_print(f"💡 恢复前的数据库已保存为: {previous_file}")
+            os.replace(restore_file, self.db_path)
+            
+            restored_to = self.catalog.created_time(chain[-1]).strftime("%Y-%m-%d %H:%M:%S")
+            safe_print(f"✅ 数据库已恢复到 {restored_to} (1 个全量备份 + {len(chain) - 1} 个增量备份)")
+            logger.info(f"数据库已从备份恢复到 {restored_to}")
+            return True
+        
+        except Exception as e:
+            safe_print(f"❌ 恢复数据库失败: {e}")
+            logger.error(f"恢复数据库失败: {e}")
             return False
+        finally:
+            self._remove_quietly(restore_file)
+    
+    def _resolve_restore_chain(self, target_time: datetime) -> List[Dict[str, Any]]:
+        """找出目标时间点之前最近的全量备份及其后的增量备份"""
+        if not self.catalog.exists():
+            self.rebuild_catalog()
+        
+        points = [e for e in self.catalog.entries() if self.catalog.created_time(e) <= target_time]
+        
+        base = None
+        for entry in points:
+            if entry["type"] == "full":
+                base = entry
+        if base is None:
+            return []
+        
+        return [base] + self._chain_deltas(points, base)
+    
+    @staticmethod
+    def _chain_deltas(entries: List[Dict[str, Any]], base: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """基准之后、属于该基准的增量备份（按时间升序）"""
+        return [
+            e for e in entries
+            if e["type"] == "delta" and e.get("base") == base["file"] and e["created_at"] > base["created_at"]
+        ]
+    
+    def _verify_checksum(self, entry: Dict[str, Any]) -> None:
+        """校验备份文件与备份目录中记录的校验和一致"""
+        file_path = os.path.join(self.backup_dir, entry["file"])
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"备份文件不存在: {entry['file']}")
+        expected = entry.get("checksum")
+        if expected and self.catalog.file_checksum(file_path) != expected:
+            raise RuntimeError(f"备份文件校验和不匹配: {entry['file']}")
+    
+    def _apply_delta(self, conn, delta_name: str, base_name: str) -> Dict[str, str]:
+        """把一个增量备份合并进正在恢复的数据库，返回增量备份的元数据（跳过时为空）"""
+        delta_file = os.path.join(self.backup_dir, delta_name)
+        tmp_file = delta_file + ".restore"
+        try:
+            self._decompress_to(delta_file, tmp_file)
+            conn.execute("ATTACH DATABASE ? AS delta", (tmp_file,))
+            try:
+                meta = dict(conn.execute("SELECT key, value FROM delta.backup_meta").fetchall())
+                if meta.get("base") != base_name:
+                    logger.warning(f"增量备份 {delta_name} 不属于基准 {base_name}，已跳过")
+                    return {}
+                for table in ("media_history", "playback_sessions", SKIP_TABLE):
+                    columns = self._common_columns(conn, table)
+                    if not columns:
+                        # 早于跳过计数的增量备份没有该表
+                        continue
+                    column_list = ", ".join(columns)
+                    conn.execute(
+                        f"INSERT OR REPLACE INTO main.{table} ({column_list}) "
+                        f"SELECT {column_list} FROM delta.{table}"
+                    )
+                conn.commit()
+                return meta
+            finally:
+                conn.execute("DETACH DATABASE delta")
+        finally:
+            self._remove_quietly(tmp_file)
+    
+    @staticmethod
+    def _config_value(conn, key: str) -> Optional[str]:
+        """读取 db_config 中的值，没有该键或该表时返回 None"""
+        try:
+            row = conn.execute("SELECT value FROM main.db_config WHERE key = ?", (key,)).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row and row[0] else None
+    
+    @classmethod
+    def _read_config_value(cls, db_file: str, key: str) -> Optional[str]:
+        """读取数据库文件 db_config 中的值，文件不存在时返回 None"""
+        if not os.path.exists(db_file):
+            return None
+        conn = sqlite3.connect(db_file)
+        try:
+            return cls._config_value(conn, key)
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def _journal_position(conn) -> Optional[str]:
+        """数据库中事件日志已合并到的位置，未启用事件日志时返回 None"""
+        return BackupManager._config_value(conn, JOURNAL_POSITION_KEY)
+    
+    @staticmethod
+    def _common_columns(conn, table: str) -> List[str]:
+        """主库与增量库中同名表共有的列（兼容不同版本的表结构）"""
+        main_cols = [r[1] for r in conn.execute(f"PRAGMA main.table_info({table})").fetchall()]
+        delta_cols = {r[1] for r in conn.execute(f"PRAGMA delta.table_info({table})").fetchall()}
+        return [c for c in main_cols if c in delta_cols]
+    
+    def _needs_full_backup(self, watermarks: dict) -> bool:
+        """判断是否需要新的全量基准"""
+        base_name = watermarks.get("backup_base")
+        base = self.catalog.find(base_name) if base_name else None
+        if not base:
+            return True
+        
+        full_interval = config.get("database.full_backup_interval_days", 30)
+        return datetime.now() - self.catalog.created_time(base) >= timedelta(days=full_interval)
+    
+    def _read_watermarks(self) -> dict:
+        """读取上次备份记录的水位线"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            placeholders = ", ".join("?" for _ in WATERMARK_KEYS)
+            rows = conn.execute(
+                f"SELECT key, value FROM db_config WHERE key IN ({placeholders})", WATERMARK_KEYS
+            ).fetchall()
+            return dict(rows)
+        except sqlite3.OperationalError:
+            return {}
+        finally:
+            conn.close()
+    
+    def _save_watermarks(self, watermarks: dict) -> None:
+        """保存本次备份的水位线"""
+        now = datetime.now().isoformat()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO db_config (key, value, updated_at) VALUES (?, ?, ?)",
+                [(key, str(watermarks.get(key, "")), now) for key in WATERMARK_KEYS]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def _snapshot_watermarks(db_file: str) -> dict:
+        """从备份快照中读取水位线"""
+        conn = sqlite3.connect(db_file)
+        try:
+            max_id, max_ts = conn.execute("SELECT MAX(id), MAX(timestamp) FROM media_history").fetchone()
+            max_session_id, max_session_end = conn.execute(
+                "SELECT MAX(id), MAX(session_end) FROM playback_sessions"
+            ).fetchone()
+            max_skip_ts = conn.execute(f"SELECT MAX(last_skipped) FROM {SKIP_TABLE}").fetchone()[0]
+            return {
+                "backup_last_id": str(max_id or 0),
+                "backup_last_ts": max_ts or "",
+                "backup_last_session_id": str(max_session_id or 0),
+                "backup_last_session_end": max_session_end or "",
+                "backup_last_skip_ts": max_skip_ts or "",
+            }
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def _count_rows(db_file: str) -> Tuple[int, int]:
+        """统计备份中的播放记录数与会话数"""
+        conn = sqlite3.connect(db_file)
+        try:
+            history_rows = conn.execute("SELECT COUNT(*) FROM media_history").fetchone()[0]
+            session_rows = conn.execute("SELECT COUNT(*) FROM playback_sessions").fetchone()[0]
+            return history_rows, session_rows
+        finally:
+            conn.close()
+    
+    def _record_backup(self, filename: str, kind: str, base_name: str, created_at: datetime,
+                       rows: Optional[int], sessions: Optional[int]) -> None:
+        """在备份目录中登记一个备份"""
+        file_path = os.path.join(self.backup_dir, filename)
+        self.catalog.add({
+            "file": filename,
+            "type": kind,
+            "base": base_name,
+            "created_at": created_at.isoformat(timespec="seconds"),
+            "size": os.path.getsize(file_path),
+            "rows": rows,
+            "sessions": sessions,
+            "checksum": self.catalog.file_checksum(file_path),
+        })
+    
+    @staticmethod
+    def _write_backup_meta(db_file: str, kind: str, base_name: str, watermarks: dict) -> None:
+        """在备份文件中写入元数据"""
+        conn = sqlite3.connect(db_file)
+        try:
+            conn.execute("DROP TABLE IF EXISTS backup_meta")
+            conn.execute("CREATE TABLE backup_meta (key TEXT PRIMARY KEY, value TEXT)")
+            meta = {"type": kind, "base": base_name, "created_at": datetime.now().isoformat()}
+            meta.update({k: str(v) for k, v in watermarks.items() if k != "backup_base"})
+            conn.executemany("INSERT INTO backup_meta (key, value) VALUES (?, ?)", meta.items())
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def _copy_online(self, target_file: str) -> None:
+        """分页复制数据库，每步之间短暂休眠以免阻塞写入方"""
+        pages = max(1, int(config.get("database.backup_pages_per_step", 256)))
+        pause = max(0, config.get("database.backup_step_sleep_ms", 10)) / 1000.0
+        
+        def progress(status, remaining, total):
+            if remaining and pause:
+                time.sleep(pause)
+        
+        src = sqlite3.connect(self.db_path)
+        dst = sqlite3.connect(target_file)
+        try:
+            src.backup(dst, pages=pages, progress=progress)
+        finally:
+            dst.close()
+            src.close()
+    
+    @staticmethod
+    def _verify_integrity(db_file: str) -> bool:
+        """对备份结果执行完整性检查"""
+        conn = sqlite3.connect(db_file)
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchone()
+            return bool(result) and result[0] == "ok"
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def _finalize(tmp_file: str, backup_file: str, compression: str) -> None:
+        """按配置压缩临时文件并原子地移动到最终位置"""
+        if compression == "none":
+            os.replace(tmp_file, backup_file)
+            return
+        
+        opener = gzip.open if compression == "gzip" else lzma.open
+        partial_file = backup_file + ".part"
+        try:
+            with open(tmp_file, "rb") as src, opener(partial_file, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(partial_file, backup_file)
+        finally:
+            if os.path.exists(partial_file):
+                os.remove(partial_file)
+        os.remove(tmp_file)
+    
+    @staticmethod
+    def _decompress_to(backup_file: str, target_file: str) -> None:
+        """把（可能压缩过的）备份文件还原为普通 SQLite 文件"""
+        if backup_file.endswith(BACKUP_SUFFIXES["gzip"]):
+            opener = gzip.open
+        elif backup_file.endswith(BACKUP_SUFFIXES["xz"]):
+            opener = lzma.open
+        else:
+            opener = open
+        with opener(backup_file, "rb") as src, open(target_file, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
     
-    def cleanup_old_backups(self, keep_count: int = 10) -> None:
-        """清理旧备份文件"""
+    @staticmethod
+    def _get_compression() -> str:
+        """获取备份压缩方式"""
+        compression = str(config.get("database.backup_compression", "none")).lower()
+        if compression not in BACKUP_SUFFIXES:
+            logger.warning(f"未知的备份压缩方式 {compression}，将不压缩")
+            return "none"
+        return compression
+    
+    @staticmethod
+    def _parse_backup_name(filename: str) -> Optional[Tuple[str, datetime, str]]:
+        """解析备份文件名，返回 (类型, 时间, 文件名)"""
+        for prefix, kind in ((DELTA_PREFIX, "delta"), (FULL_PREFIX, "full")):
+            if not filename.startswith(prefix):
+                continue
+            for suffix in BACKUP_SUFFIXES.values():
+                if filename.endswith(suffix):
+                    stamp = filename[len(prefix):-len(suffix)]
+                    try:
+                        return kind, datetime.strptime(stamp, TIMESTAMP_FORMAT), filename
+                    except ValueError:
+                        return None
+        return None
+    
+    @staticmethod
+    def _remove_quietly(path: Optional[str]) -> None:
+        """删除临时文件，忽略错误"""
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    def prune_backups(self) -> None:
+        """按祖父-父-子策略清理旧备份：保留最近若干天、周、月各自最新的备份"""
         try:
-            backup_files = self._get_backup_files()
+            entries = self.catalog.entries()
+            if not entries:
+                return
             
-            if len(backup_files) <= keep_count:
+            periods = (
+                (lambda t: t.date(), config.get("database.backup_keep_daily", 7)),
+                (lambda t: t.isocalendar()[:2], config.get("database.backup_keep_weekly", 4)),
+                (lambda t: (t.year, t.month), config.get("database.backup_keep_monthly", 12)),
+            )
+            restore_points = {entries[-1]["file"]}
+            for period_of, limit in periods:
+                restore_points.update(self._newest_per_period(entries, period_of, limit))
+            
+            # 保留恢复点所依赖的基准及其之前的增量
+            by_file = {e["file"]: e for e in entries}
+            keep = set()
+            for filename in restore_points:
+                entry = by_file[filename]
+                if entry["type"] == "full":
+                    keep.add(filename)
+                    continue
+                base = by_file.get(entry.get("base"))
+                if base is None:
+                    continue
+                keep.add(base["file"])
+                keep.update(
+                    e["file"] for e in self._chain_deltas(entries, base)
+                    if e["created_at"] <= entry["created_at"]
+                )
+            
+            removed = [e["file"] for e in entries if e["file"] not in keep]
+            if not removed:
                 return
             
-            # 删除多余的备份文件
-            for filename in backup_files[keep_count:]:
-                file_path = os.path.join(self.backup_dir, filename)
-                os.remove(file_path)
-                from utils.safe_print import safe_print
+            from utils.safe_print import safe_print
+            for filename in removed:
+                self._remove_quietly(os.path.join(self.backup_dir, filename))
                 safe_print(f"🗑️ 已删除旧备份: {filename}")
-                
+            self.catalog.remove(removed)
+        
         except Exception as e:
             from utils.safe_print import safe_print
             safe_print(f"⚠️ 清理旧备份文件失败: {e}")
     
+    def _newest_per_period(self, entries: List[Dict[str, Any]], period_of, limit: int) -> List[str]:
+        """每个时间段内最新的备份，最多取最近 limit 个时间段"""
+        selected = []
+        seen = set()
+        for entry in reversed(entries):
+            if len(seen) >= limit:
+                break
+            period = period_of(self.catalog.created_time(entry))
+            if period not in seen:
+                seen.add(period)
+                selected.append(entry["file"])
+        return selected
+    
+    def rebuild_catalog(self) -> None:
+        """扫描备份目录重建 catalog.json（仅在目录文件缺失时执行一次）"""
+        try:
+            points = sorted(
+                (p for p in (self._parse_backup_name(f) for f in self._get_backup_files()) if p),
+                key=lambda p: p[1]
+            )
+            entries = []
+            base_name = None
+            for kind, backup_time, filename in points:
+                if kind == "full":
+                    base_name = filename
+                file_path = os.path.join(self.backup_dir, filename)
+                entries.append({
+                    "file": filename,
+                    "type": kind,
+                    "base": base_name,
+                    "created_at": backup_time.isoformat(timespec="seconds"),
+                    "size": os.path.getsize(file_path),
+                    "rows": None,
+                    "sessions": None,
+                    "checksum": self.catalog.file_checksum(file_path),
+                })
+            self.catalog.replace_all(entries)
+            logger.info(f"已重建备份目录，共 {len(entries)} 个备份")
+        except Exception as e:
+            logger.error(f"重建备份目录失败: {e}")
+    
     def _get_backup_files(self) -> list:
-        """获取所有备份文件，按时间倒序排序"""
+        """扫描备份目录中的所有备份文件（全量与增量），按时间倒序排序"""
         if not os.path.exists(self.backup_dir):
             return []
         
+        suffixes = tuple(BACKUP_SUFFIXES.values())
         backup_files = [
             f for f in os.listdir(self.backup_dir)
-            if f.startswith("media_history_") and f.endswith(".db")
+            if f.startswith((FULL_PREFIX, DELTA_PREFIX)) and f.endswith(suffixes)
         ]
         
         # 按修改时间排序（最新的在前）
@@ -99,4 +728,22 @@ class BackupManager:
             backup_files_with_time.append((mtime, f))
         
         backup_files_with_time.sort(reverse=True)
-        return [f for _, f in backup_files_with_time]
\ No newline at end of file
+        return [f for _, f in backup_files_with_time]
+
+
+def parse_restore_time(value: Optional[str]) -> Optional[datetime]:
+    """解析 --restore 的时间参数，'latest' 或空值表示最新备份"""
+    if value is None or value.strip().lower() in ("", "latest"):
+        return None
+    
+    value = value.strip()
+    for fmt in (TIMESTAMP_FORMAT, "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            parsed = datetime.strptime(value, fmt)
+            # 只给出日期时表示恢复到当天结束时的状态
+            if fmt == "%Y-%m-%d":
+                parsed = parsed.replace(hour=23, minute=59, second=59)
+            return parsed
+        except ValueError:
+            continue
+    raise ValueError(f"无法识别的时间格式: {value}")
@@ -0,0 +1,101 @@
+"""
+备份目录 - 记录每个备份的时间、大小、行数与校验和
+
+启动检查、恢复与清理都只读取 catalog.json，不再扫描备份目录。
+"""
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from utils.logger import logger
+
+
+CATALOG_FILENAME = "catalog.json"
+
+
+class BackupCatalog:
+    """备份目录管理"""
+    
+    def __init__(self, backup_dir: str):
+        self.backup_dir = backup_dir
+        self.path = os.path.join(backup_dir, CATALOG_FILENAME)
+        self._entries = None
+    
+    def exists(self) -> bool:
+        """目录文件是否存在"""
+        return os.path.exists(self.path)
+    
+    def entries(self) -> List[Dict[str, Any]]:
+        """获取所有备份条目，按创建时间升序排列"""
+        if self._entries is None:
+            self._entries = self._load()
+        return list(self._entries)
+    
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """获取最新的备份条目"""
+        entries = self.entries()
+        return entries[-1] if entries else None
+    
+    def find(self, filename: str) -> Optional[Dict[str, Any]]:
+        """按文件名查找备份条目"""
+        for entry in self.entries():
+            if entry["file"] == filename:
+                return entry
+        return None
+    
+    def add(self, entry: Dict[str, Any]) -> None:
+        """添加一个备份条目并保存"""
+        entries = [e for e in self.entries() if e["file"] != entry["file"]]
+        entries.append(entry)
+        entries.sort(key=lambda e: e["created_at"])
+        self._entries = entries
+        self.save()
+    
+    def remove(self, filenames: Iterable[str]) -> None:
+        """移除备份条目并保存"""
+        filenames = set(filenames)
+        self._entries = [e for e in self.entries() if e["file"] not in filenames]
+        self.save()
+    
+    def replace_all(self, entries: List[Dict[str, Any]]) -> None:
+        """用新的条目列表替换整个目录（用于从备份目录重建）"""
+        self._entries = sorted(entries, key=lambda e: e["created_at"])
+        self.save()
+    
+    def save(self) -> None:
+        """原子地写入目录文件"""
+        if not os.path.exists(self.backup_dir):
+            os.makedirs(self.backup_dir)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": 1, "backups": self._entries or []}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+    
+    def _load(self) -> List[Dict[str, Any]]:
+        """从文件读取目录"""
+        if not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            entries = data.get("backups", [])
+            entries.sort(key=lambda e: e["created_at"])
+            return entries
+        except Exception as e:
+            logger.warning(f"读取备份目录失败: {e}")
+            return []
+    
+    @staticmethod
+    def created_time(entry: Dict[str, Any]) -> datetime:
+        """获取条目的创建时间"""
+        return datetime.fromisoformat(entry["created_at"])
+    
+    @staticmethod
+    def file_checksum(file_path: str) -> str:
+        """计算文件的 SHA-256 校验和"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
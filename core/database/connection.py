@@ -3,22 +3,37 @@
 """
 import sqlite3
 from contextlib import contextmanager
-from typing import Optional
+from typing import Callable, Optional, Sequence
 from utils.logger import logger
 
 
+# 挂载归档后，主库与归档中 media_history 的 UNION 视图名
+HISTORY_VIEW = "media_history_all"
+
+# SQLite 默认最多可同时挂载 10 个数据库
+MAX_ATTACHED = 10
+
+# 归档数超过挂载上限时，分批复制归档记录的临时表名
+ARCHIVED_TABLE = "media_history_archived"
+
+
 class DatabaseConnection:
     """数据库连接管理器"""
     
     def __init__(self, db_path: str):
         self.db_path = db_path
+        # 经 execute_* 执行的语句数与写入影响的行数（用于回放基准统计）
+        self.query_count = 0
+        self.rows_written = 0
     
     @contextmanager
-    def get_connection(self):
-        """上下文管理器 - 自动管理连接的打开和关闭"""
+    def get_connection(self, archives: Sequence[str] = ()):
+        """上下文管理器 - 自动管理连接的打开和关闭，可选挂载归档数据库"""
         conn = None
         try:
             conn = sqlite3.connect(self.db_path)
+            if archives:
+                self._attach_archives(conn, archives)
             yield conn
             conn.commit()
         except Exception as e:
@@ -30,9 +45,10 @@ class DatabaseConnection:
             if conn:
                 conn.close()
     
-    def execute_query(self, query: str, params: tuple = None) -> list:
+    def execute_query(self, query: str, params: tuple = None, archives: Sequence[str] = ()) -> list:
         """执行查询并返回结果"""
-        with self.get_connection() as conn:
+        self.query_count += 1
+        with self.get_connection(archives) as conn:
             cursor = conn.cursor()
             if params:
                 cursor.execute(query, params)
@@ -40,9 +56,10 @@ class DatabaseConnection:
                 cursor.execute(query)
             return cursor.fetchall()
     
-    def execute_single(self, query: str, params: tuple = None) -> Optional[tuple]:
+    def execute_single(self, query: str, params: tuple = None, archives: Sequence[str] = ()) -> Optional[tuple]:
         """执行查询并返回单条结果"""
-        with self.get_connection() as conn:
+        self.query_count += 1
+        with self.get_connection(archives) as conn:
             cursor = conn.cursor()
             if params:
                 cursor.execute(query, params)
@@ -52,10 +69,67 @@ class DatabaseConnection:
     
     def execute_update(self, query: str, params: tuple = None) -> int:
         """执行更新操作并返回受影响的行数"""
+        self.query_count += 1
         with self.get_connection() as conn:
             cursor = conn.cursor()
             if params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
-            return cursor.rowcount
\ No newline at end of file
+            self.rows_written += max(cursor.rowcount, 0)
+            return cursor.rowcount
+    
+    def execute_insert(self, query: str, params: tuple) -> Optional[int]:
+        """执行插入操作并返回新记录的 id"""
+        self.query_count += 1
+        with self.get_connection() as conn:
+            cursor = conn.execute(query, params)
+            self.rows_written += max(cursor.rowcount, 0)
+            return cursor.lastrowid
+    
+    def execute_transaction(self, work: Callable[[sqlite3.Connection], int]) -> int:
+        """在同一个连接和事务中执行多条语句，work 返回写入的行数"""
+        self.query_count += 1
+        with self.get_connection() as conn:
+            written = work(conn)
+        self.rows_written += written
+        return written
+    
+    @staticmethod
+    def _attach_archives(conn, archives: Sequence[str]) -> None:
+        """挂载归档数据库并创建跨主库与归档的 UNION 视图"""
+        main_cols = [r[1] for r in conn.execute("PRAGMA main.table_info(media_history)").fetchall()]
+        selects = [f"SELECT {', '.join(main_cols)} FROM main.media_history"]
+        archives = list(archives)
+        if len(archives) <= MAX_ATTACHED - 1:
+            for i, path in enumerate(archives):
+                select = DatabaseConnection._attach_archive(conn, path, f"archive_{i}", main_cols)
+                if select:
+                    selects.append(select)
+        else:
+            # 超过挂载上限时分批挂载，把归档记录复制到临时表后再卸载
+            conn.execute(f"CREATE TEMP TABLE {ARCHIVED_TABLE} AS SELECT * FROM main.media_history WHERE 0")
+            column_list = ", ".join(main_cols)
+            for start in range(0, len(archives), MAX_ATTACHED - 1):
+                batch = archives[start:start + MAX_ATTACHED - 1]
+                aliases = [f"archive_{i}" for i in range(len(batch))]
+                for path, alias in zip(batch, aliases):
+                    select = DatabaseConnection._attach_archive(conn, path, alias, main_cols)
+                    if select:
+                        conn.execute(f"INSERT INTO temp.{ARCHIVED_TABLE} ({column_list}) {select}")
+                conn.commit()
+                for alias in aliases:
+                    conn.execute(f"DETACH DATABASE {alias}")
+            selects.append(f"SELECT {column_list} FROM temp.{ARCHIVED_TABLE}")
+        conn.execute(f"CREATE TEMP VIEW {HISTORY_VIEW} AS " + " UNION ALL ".join(selects))
+    
+    @staticmethod
+    def _attach_archive(conn, path: str, alias: str, main_cols: Sequence[str]) -> Optional[str]:
+        """挂载一个归档数据库，返回按主库列顺序读取其 media_history 的语句（没有该表时返回 None）"""
+        conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+        archive_cols = {r[1] for r in conn.execute(f"PRAGMA {alias}.table_info(media_history)").fetchall()}
+        if not archive_cols:
+            return None
+        # 归档可能来自较早的表结构，缺失的列以 NULL 补齐
+        columns = ", ".join(c if c in archive_cols else f"NULL AS {c}" for c in main_cols)
+        return f"SELECT {columns} FROM {alias}.media_history"
@@ -5,20 +5,26 @@ from datetime import datetime
 from typing import Dict, Any
 from config.config_manager import config
 from utils.logger import logger
+from .connection import HISTORY_VIEW
+from .repository import SKIP_TABLE
+from .retention import ROLLUP_TABLE
 
 
 class DataExporter:
     """数据导出器"""
     
-    def __init__(self, connection, statistics_service):
+    def __init__(self, connection, statistics_service, archive=None):
         self.connection = connection
         self.statistics = statistics_service
+        self.archive = archive
     
     def export_all(self) -> Dict[str, Any]:
         """导出所有数据"""
         try:
             tracks = self._export_tracks()
             sessions = self._export_sessions()
+            rollups = self._export_rollups()
+            skips = self._export_skips()
             
             export_data = {
                 'export_info': {
@@ -30,26 +36,37 @@ class DataExporter:
                 'sessions': sessions
             }
             
+            # 早期记录已汇总为按天统计时一并导出
+            if rollups:
+                export_data['export_info']['total_rollup_plays'] = sum(r['play_count'] for r in rollups)
+                export_data['rollups'] = rollups
+            
+            if skips:
+                export_data['export_info']['total_skips'] = sum(s['skip_count'] for s in skips)
+                export_data['skips'] = skips
+            
             # 包含统计信息
             if config.get("export.include_statistics", True):
                 export_data['statistics'] = self.statistics.get_all_statistics()
             
             return export_data
-            
+        
         except Exception as e:
             logger.error(f"导出数据失败: {e}")
             return {}
     
     def _export_tracks(self) -> list:
-        """导出播放历史"""
-        query = '''
+        """导出播放历史（包括已归档的记录）"""
+        archives = self.archive.archives_for_window(None) if self.archive else []
+        history = HISTORY_VIEW if archives else 'media_history'
+        query = f'''
             SELECT title, artist, album, album_artist, track_number, app_name, 
                    timestamp, duration, position, play_percentage, playback_status, genre, year
-            FROM media_history 
+            FROM {history} 
             WHERE title != ''
             ORDER BY timestamp DESC
         '''
-        tracks = self.connection.execute_query(query)
+        tracks = self.connection.execute_query(query, archives=archives)
         
         return [
             {
@@ -69,11 +86,56 @@ class DataExporter:
             } for track in tracks
         ]
     
+    def _export_rollups(self) -> list:
+        """导出按天汇总的早期播放记录"""
+        query = f'''
+            SELECT day, title, artist, album, app_name, genre,
+                   play_count, completed_count, total_duration
+            FROM {ROLLUP_TABLE}
+            WHERE title != ''
+            ORDER BY day DESC
+        '''
+        rollups = self.connection.execute_query(query)
+        
+        return [
+            {
+                'day': rollup[0],
+                'title': rollup[1],
+                'artist': rollup[2],
+                'album': rollup[3],
+                'app_name': rollup[4],
+                'genre': rollup[5],
+                'play_count': rollup[6],
+                'completed_count': rollup[7],
+                'total_duration': rollup[8]
+            } for rollup in rollups
+        ]
+    
+    def _export_skips(self) -> list:
+        """导出跳过计数"""
+        query = f'''
+            SELECT title, artist, app_name, skip_count, last_skipped
+            FROM {SKIP_TABLE}
+            ORDER BY skip_count DESC
+        '''
+        skips = self.connection.execute_query(query)
+        
+        return [
+            {
+                'title': skip[0],
+                'artist': skip[1],
+                'app_name': skip[2],
+                'skip_count': skip[3],
+                'last_skipped': skip[4]
+            } for skip in skips
+        ]
+    
     def _export_sessions(self) -> list:
         """导出会话信息"""
         query = '''
             SELECT session_start, session_end, app_name, tracks_played
             FROM playback_sessions
+            WHERE tracks_played > 0
             ORDER BY session_start DESC
         '''
         sessions = self.connection.execute_query(query)
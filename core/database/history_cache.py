@@ -0,0 +1,101 @@
+"""
+歌曲历史缓存 - 在内存中保存最近播放歌曲的最近几条播放记录，重复播放叠加层判断时不必查询数据库
+
+按 (歌名, 艺术家) 缓存最近 display.overlay_history_limit 条记录，最多缓存 database.history_cache_size 首歌曲
+（最近最少使用的先淘汰）。仓储写入播放记录、更新进度后同步更新已缓存的歌曲，新写入的歌曲也加入缓存
+（只含此后写入的记录，不足所需条数时仍查询数据库），因此缓存与数据库一致；
+记录被归档、汇总删除或从备份恢复时清空缓存。监控开始时预加载播放次数最多的歌曲。
+"""
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Set, Tuple
+from config.config_manager import config
+from core.media_info import MediaInfo
+
+
+class TrackHistoryCache:
+    """歌曲最近播放记录的 LRU 缓存（可在多个线程中使用）
+    
+    每首歌曲保存 (记录 id, 时间, 播放百分比, 播放状态, 应用名) 列表，按时间从新到旧，
+    最多 depth 条；不足 depth 条时即为该歌曲的全部记录。
+    """
+    
+    def __init__(self, capacity: int = None, depth: int = None):
+        self.capacity = config.get("database.history_cache_size", 256) if capacity is None else capacity
+        self.depth = config.get("display.overlay_history_limit", 5) if depth is None else depth
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], List[tuple]]" = OrderedDict()
+        # 由 record 加入的歌曲：只含加入后写入的记录，可能缺少更早的记录
+        self._partial: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+    
+    def get(self, title: str, artist: str, limit: int) -> Optional[List[tuple]]:
+        """缓存的最近 limit 条记录 (时间, 播放百分比, 播放状态, 应用名)，未缓存（或 limit 超过缓存条数）时返回 None"""
+        with self._lock:
+            key = (title, artist)
+            rows = self._entries.get(key) if limit <= self.depth else None
+            if rows is None or (key in self._partial and len(rows) < limit):
+                self.misses += 1
+                return None
+            self._entries.move_to_end((title, artist))
+            self.hits += 1
+            return [row[1:] for row in rows[:limit]]
+    
+    def put(self, title: str, artist: str, rows: List[tuple]) -> None:
+        """缓存歌曲的最近记录（rows 为从数据库读取的 (记录 id, 时间, 播放百分比, 播放状态, 应用名)，按时间从新到旧）"""
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._entries[(title, artist)] = [tuple(row) for row in rows[:self.depth]]
+            self._partial.discard((title, artist))
+            self._entries.move_to_end((title, artist))
+            self._evict()
+    
+    def record(self, record_id: int, media_info: MediaInfo, timestamp: str, inserted: bool) -> None:
+        """播放记录已写入（inserted 为新记录，否则为更新进度），更新已缓存的歌曲（不指定艺术家的查询也包含该记录）
+        
+        未缓存的歌曲写入新记录时加入缓存（最近最少使用的先淘汰），之后写入的记录都会同步到缓存；
+        写入时间晚于数据库中已有的记录，所以缓存的记录始终是该歌曲最近的几条。
+        """
+        row = (record_id, timestamp, media_info.percentage, media_info.status, media_info.app_name)
+        track = (media_info.title, media_info.artist)
+        with self._lock:
+            if inserted and track not in self._entries and self.capacity > 0:
+                self._entries[track] = []
+                self._partial.add(track)
+            for key in {track, (media_info.title, '')}:
+                rows = self._entries.get(key)
+                if rows is None:
+                    continue
+                self._entries.move_to_end(key)
+                old = next((r for r in rows if r[0] == record_id), None)
+                if old is not None:
+                    # 更新进度不改变记录的应用名
+                    rows.remove(old)
+                    rows.append(row[:4] + old[4:])
+                elif inserted:
+                    rows.append(row)
+                else:
+                    # 更新的是未缓存的较早记录，下次读取时重新查询
+                    del self._entries[key]
+                    self._partial.discard(key)
+                    continue
+                rows.sort(key=lambda r: r[1], reverse=True)
+                del rows[self.depth:]
+            self._evict()
+    
+    def clear(self) -> None:
+        """清空缓存（记录被删除或数据库被替换时）"""
+        with self._lock:
+            self._entries.clear()
+            self._partial.clear()
+    
+    def _evict(self) -> None:
+        """淘汰最近最少使用的歌曲，直到不超过容量（调用方持有锁）"""
+        while len(self._entries) > self.capacity:
+            key, _ = self._entries.popitem(last=False)
+            self._partial.discard(key)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,396 @@
+"""
+播放事件日志 - 监控循环写入的只追加事件日志，作为写入数据库前的缓冲
+
+每条记录为 16 字节的头（负载长度、负载的 CRC32、序号）加负载（UTF-8 JSON 数组：[类型, 时间, ...]），
+按大小切分为 journal/events-000001.log 等分段文件。写入只追加到文件末尾，
+最多每 database.journal_fsync_seconds 秒 fsync 一次（组提交）。
+压缩器按顺序读取尚未合并的事件，同一播放的多次进度只取最后一次，在一个事务中写入
+media_history 与跳过计数，并在同一事务中推进 db_config 中的日志水位线，崩溃后重新合并不会重复写入。
+已合并的分段不会删除：完整的事件流（含暂停、恢复、拖动进度等）保留用于之后的分析，
+也可以重放全部日志重建派生的数据：第一次合并时记录开始点，并把当时的跳过计数保存为基线，
+重建时跳过计数为基线加上日志中的跳过，日志中的播放记录缺失或进度不一致时补写或修正。
+"""
+import json
+import os
+import struct
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from config.config_manager import config
+from core.media_info import MediaInfo, TrackKey
+from utils.clock import SystemClock
+from utils.logger import logger
+from .history_cache import TrackHistoryCache
+from .repository import MediaRepository, SKIP_BASELINE_TABLE, SKIP_TABLE
+
+
+# 记录头：负载长度、负载的 CRC32、序号
+RECORD_HEADER = struct.Struct('<IIQ')
+
+SEGMENT_PREFIX = "events-"
+SEGMENT_SUFFIX = ".log"
+
+# db_config 中记录已合并位置（"分段号:偏移"）的键
+WATERMARK_KEY = "journal_position"
+
+# db_config 中记录第一次合并时间（开始点）的键，此前的跳过计数保存在基线表中
+START_KEY = "journal_start"
+
+# 事件类型：play、progress、skip 由压缩器写入数据库，其余只保留在日志中
+PLAY = 'play'
+PROGRESS = 'progress'
+SKIP = 'skip'
+
+# 压缩器记住的播放序号与记录 id 的对应数（进度事件通常紧跟在播放之后）
+MAX_TRACKED_PLAYS = 1024
+
+
+def _segment_name(number: int) -> str:
+    return f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}"
+
+
+def list_segments(directory: str) -> List[int]:
+    """日志目录中的分段号（升序）"""
+    if not os.path.isdir(directory):
+        return []
+    numbers = []
+    for name in os.listdir(directory):
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+            try:
+                numbers.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+            except ValueError:
+                continue
+    return sorted(numbers)
+
+
+def read_segment(path: str, offset: int = 0) -> Iterator[Tuple[int, int, list]]:
+    """从 offset 开始读取分段中的记录，依次返回 (记录结束偏移, 序号, 负载)
+    
+    遇到不完整或校验失败的记录（写入时崩溃留下的尾部）即停止。
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            length, checksum, seq = RECORD_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                logger.warning(f"事件日志 {os.path.basename(path)} 在偏移 {offset} 处损坏，忽略之后的内容")
+                return
+            offset += RECORD_HEADER.size + length
+            yield offset, seq, json.loads(payload.decode('utf-8'))
+
+
+def read_journal(directory: str, segment: int = 0, offset: int = 0) -> Iterator[Tuple[int, int, int, list]]:
+    """从 (segment, offset) 开始按顺序读取日志，依次返回 (分段号, 记录结束偏移, 序号, 负载)"""
+    for number in list_segments(directory):
+        if number < segment:
+            continue
+        start = offset if number == segment else 0
+        for end, seq, event in read_segment(os.path.join(directory, _segment_name(number)), start):
+            yield number, end, seq, event
+
+
+class PlaybackJournal:
+    """事件日志的写入端（只在一个线程中使用）"""
+    
+    def __init__(self, directory: str, clock: SystemClock = None):
+        self.directory = directory
+        # 事件时间取自监控循环的时钟，回放时为虚拟时间
+        self.clock = clock or SystemClock()
+        self.segment_bytes = int(config.get("database.journal_segment_mb", 4) * 1024 * 1024)
+        self.fsync_seconds = config.get("database.journal_fsync_seconds", 1)
+        self.appended = 0
+        self.syncs = 0
+        self._file = None
+        self._segment = 0
+        self._size = 0
+        self._dirty = False
+        self._synced_at = self.clock.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        self.next_seq = self._open_last()
+    
+    def _open_last(self) -> int:
+        """打开最后一个分段继续写入（截掉崩溃时写了一半的记录），返回下一个序号"""
+        segments = list_segments(self.directory)
+        last_seq = 0
+        for number in reversed(segments):
+            path = os.path.join(self.directory, _segment_name(number))
+            end = 0
+            for end, last_seq, _ in read_segment(path):
+                pass
+            if number == segments[-1] and os.path.getsize(path) > end:
+                with open(path, 'r+b') as f:
+                    f.truncate(end)
+            if last_seq:
+                break
+        self._open_segment(segments[-1] if segments else 1)
+        return last_seq + 1
+    
+    def _open_segment(self, number: int) -> None:
+        path = os.path.join(self.directory, _segment_name(number))
+        self._file = open(path, 'ab')
+        self._segment = number
+        self._size = self._file.tell()
+    
+    def _append(self, kind: str, timestamp: Optional[datetime], *fields: Any) -> int:
+        """追加一条事件（timestamp 为产生事件的时间，未给出时取时钟的当前时间），返回其序号"""
+        payload = json.dumps([kind, (timestamp or self.clock.now()).isoformat(), *fields],
+                             ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        seq = self.next_seq
+        self.next_seq += 1
+        if self._size >= self.segment_bytes:
+            # 当前分段已满，同步后切换到下一个分段
+            self.sync(force=True)
+            self._file.close()
+            self._open_segment(self._segment + 1)
+        self._file.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload), seq))
+        self._file.write(payload)
+        self._size += RECORD_HEADER.size + len(payload)
+        self._dirty = True
+        self.appended += 1
+        return seq
+    
+    def append_play(self, media_info: MediaInfo, timestamp: datetime = None) -> int:
+        """播放计入播放记录，返回的序号供之后的进度事件引用"""
+        return self._append(PLAY, timestamp, list(media_info))
+    
+    def append_progress(self, play_seq: Optional[int], media_info: MediaInfo, timestamp: datetime = None) -> int:
+        """播放进度（play_seq 为对应播放事件的序号，未知时按歌曲匹配最近的记录）"""
+        return self._append(PROGRESS, timestamp, play_seq, list(media_info))
+    
+    def append_skip(self, track: TrackKey, timestamp: datetime = None) -> int:
+        """歌曲未达到计入条件就被切走"""
+        return self._append(SKIP, timestamp, list(track))
+    
+    def append_event(self, kind: str, track: TrackKey, position: int, timestamp: datetime = None) -> int:
+        """只保留在日志中的播放事件（开始、暂停、恢复、拖动进度等）"""
+        return self._append(kind, timestamp, list(track), position)
+    
+    def flush(self) -> None:
+        """把缓冲写入文件（读取日志前调用）"""
+        if self._file is not None:
+            self._file.flush()
+    
+    def sync(self, force: bool = False) -> bool:
+        """组提交：距上次 fsync 超过 journal_fsync_seconds 秒（或 force）时 fsync，返回是否执行了 fsync"""
+        if self._file is None or not self._dirty:
+            return False
+        now = self.clock.monotonic()
+        if not force and now - self._synced_at < self.fsync_seconds:
+            return False
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._dirty = False
+        self._synced_at = now
+        self.syncs += 1
+        return True
+    
+    def close(self) -> None:
+        """同步并关闭日志"""
+        if self._file is None:
+            return
+        self.sync(force=True)
+        self._file.close()
+        self._file = None
+
+
+class JournalCompactor:
+    """把事件日志合并进数据库"""
+    
+    def __init__(self, connection, directory: str, history_cache: Optional[TrackHistoryCache] = None):
+        self.connection = connection
+        self.directory = directory
+        self.history_cache = history_cache  # 合并后同步更新的歌曲历史缓存
+        self._record_ids: Dict[int, int] = {}  # 播放事件序号 -> media_history 记录 id
+    
+    def _config_value(self, key: str) -> Optional[str]:
+        row = self.connection.execute_single("SELECT value FROM db_config WHERE key = ?", (key,))
+        return row[0] if row and row[0] else None
+    
+    def _watermark(self) -> Tuple[int, int]:
+        value = self._config_value(WATERMARK_KEY)
+        if value:
+            try:
+                segment, offset = value.split(':')
+                return int(segment), int(offset)
+            except ValueError:
+                logger.warning(f"事件日志水位线无效: {value}")
+        return 0, 0
+    
+    def _save_watermark(self, conn, position: Tuple[int, int]) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO db_config (key, value, updated_at) VALUES (?, ?, ?)",
+            (WATERMARK_KEY, f"{position[0]}:{position[1]}", datetime.now().isoformat())
+        )
+    
+    def end_position(self) -> Optional[Tuple[int, int]]:
+        """日志末尾的位置（分段号, 偏移），日志为空时返回 None"""
+        position = None
+        for number, end, _, _ in read_journal(self.directory, *self._watermark()):
+            position = (number, end)
+        return position
+    
+    def skip_to_end(self) -> None:
+        """把水位线移到日志末尾：已有的事件不再合并（恢复到较早时间点的备份后使用）"""
+        position = self.end_position()
+        if position is None:
+            return
+        
+        def write(conn) -> int:
+            self._save_watermark(conn, position)
+            return 1
+        
+        self.connection.execute_transaction(write)
+    
+    def compact(self) -> Optional[List[MediaInfo]]:
+        """合并尚未合并的事件，返回新写入的播放记录，失败时返回 None"""
+        segment, offset = self._watermark()
+        # 第一次合并：记录开始点与跳过计数基线
+        first = (segment, offset) == (0, 0) and self._config_value(START_KEY) is None
+        plays: Dict[int, list] = {}  # 播放序号 -> [媒体信息, 时间]，按出现顺序
+        progress: Dict[Any, list] = {}  # 本批之前的播放序号（或未知时的歌曲键）-> [媒体信息, 时间]
+        skips = []
+        position = None
+        started_at = None  # 第一个事件的时间，第一次合并时记为日志开始点
+        for number, end, seq, event in read_journal(self.directory, segment, offset):
+            position = (number, end)
+            kind, timestamp = event[0], event[1]
+            started_at = started_at or timestamp
+            if kind == PLAY:
+                plays[seq] = [MediaInfo(*event[2]), timestamp]
+            elif kind == PROGRESS:
+                play_seq, media_info = event[2], MediaInfo(*event[3])
+                if play_seq in plays:
+                    # 同一批中的播放直接以最后的进度写入（进度事件不带封面哈希）
+                    plays[play_seq] = [media_info._replace(artwork=plays[play_seq][0].artwork), timestamp]
+                else:
+                    progress[play_seq if play_seq is not None else media_info.key] = [media_info, timestamp]
+            elif kind == SKIP:
+                skips.append((TrackKey(*event[2]), timestamp))
+        if position is None:
+            return []
+        
+        record_ids = {}
+        written = []  # 事务提交后更新歌曲历史缓存的 (记录 id, 媒体信息, 时间, 是否为新记录)
+        def write(conn) -> int:
+            if first:
+                conn.execute(f"DELETE FROM {SKIP_BASELINE_TABLE}")
+                conn.execute(f"INSERT INTO {SKIP_BASELINE_TABLE} SELECT * FROM {SKIP_TABLE}")
+                conn.execute(
+                    "INSERT OR REPLACE INTO db_config (key, value, updated_at) VALUES (?, ?, ?)",
+                    (START_KEY, started_at, datetime.now().isoformat())
+                )
+            for seq, (media_info, timestamp) in plays.items():
+                cursor = conn.execute(MediaRepository.INSERT_QUERY,
+                                      MediaRepository._insert_params(media_info, timestamp))
+                record_ids[seq] = cursor.lastrowid
+                written.append((cursor.lastrowid, media_info, timestamp, True))
+            for ref, (media_info, timestamp) in progress.items():
+                record_id = self._record_ids.get(ref)
+                if record_id is None:
+                    row = conn.execute(MediaRepository.FIND_LATEST_QUERY, media_info.key).fetchone()
+                    record_id = row[0] if row else None
+                if record_id is not None:
+                    conn.execute(MediaRepository.UPDATE_PROGRESS_QUERY,
+                                 MediaRepository._progress_params(media_info, record_id, timestamp))
+                    written.append((record_id, media_info, timestamp, False))
+                else:
+                    record_id = conn.execute(MediaRepository.INSERT_QUERY,
+                                             MediaRepository._insert_params(media_info, timestamp)).lastrowid
+                    written.append((record_id, media_info, timestamp, True))
+            if skips:
+                conn.executemany(MediaRepository.SKIP_QUERY,
+                                 [MediaRepository._skip_params(track, timestamp) for track, timestamp in skips])
+            self._save_watermark(conn, position)
+            return len(plays) + len(progress) + len(skips)
+        
+        try:
+            self.connection.execute_transaction(write)
+        except Exception as e:
+            logger.error(f"合并事件日志失败: {e}")
+            return None
+        
+        if self.history_cache is not None:
+            for entry in written:
+                self.history_cache.record(*entry)
+        self._record_ids.update(record_ids)
+        while len(self._record_ids) > MAX_TRACKED_PLAYS:
+            del self._record_ids[next(iter(self._record_ids))]
+        saved = [media_info for media_info, _ in plays.values()]
+        logger.debug(f"合并事件日志: {len(saved)} 条新记录，{len(progress)} 条进度，{len(skips)} 次跳过")
+        return saved
+    
+    def rebuild(self, boundary: Optional[str] = None) -> Tuple[int, int]:
+        """重放全部日志重建派生的数据，返回 (补写或修正的播放记录数, 跳过次数)
+        
+        播放记录：每个播放事件按其最后的进度折叠，media_history 中（同一歌曲、时间在播放与最后进度之间）
+        没有对应记录时补写，进度不一致时修正；早于 boundary（已归档或汇总）的播放不处理。
+        跳过计数：有开始点时为基线加日志中的跳过；没有开始点（开始点功能之前启用的日志）时
+        不清除已有计数，只把低于日志中次数的计数提高到日志中的次数。
+        """
+        plays: Dict[int, list] = {}  # 播放序号 -> [播放时间, 最后的媒体信息, 最后的时间]
+        latest: Dict[TrackKey, int] = {}  # 歌曲键 -> 最近的播放序号（进度事件未带播放序号时使用）
+        counts: Dict[TrackKey, list] = {}
+        for _, _, seq, event in read_journal(self.directory):
+            kind, timestamp = event[0], event[1]
+            if kind == PLAY:
+                media_info = MediaInfo(*event[2])
+                plays[seq] = [timestamp, media_info, timestamp]
+                latest[media_info.key] = seq
+            elif kind == PROGRESS:
+                media_info = MediaInfo(*event[3])
+                play = plays.get(event[2] if event[2] is not None else latest.get(media_info.key))
+                if play is not None:
+                    play[1] = media_info._replace(artwork=play[1].artwork)
+                    play[2] = timestamp
+            elif kind == SKIP:
+                entry = counts.setdefault(TrackKey(*event[2]), [0, event[1]])
+                entry[0] += 1
+                entry[1] = event[1]
+        started = self._config_value(START_KEY) is not None
+        
+        def write(conn) -> int:
+            repaired = 0
+            for played_at, media_info, timestamp in plays.values():
+                if boundary and timestamp < boundary:
+                    continue
+                row = conn.execute(
+                    "SELECT id, position, play_percentage, playback_status, timestamp FROM media_history "
+                    "WHERE title = ? AND artist = ? AND app_name = ? AND timestamp BETWEEN ? AND ? "
+                    "ORDER BY timestamp DESC LIMIT 1",
+                    (*media_info.key, played_at, timestamp)
+                ).fetchone()
+                if row is None:
+                    conn.execute(MediaRepository.INSERT_QUERY, MediaRepository._insert_params(media_info, timestamp))
+                elif row[1:] != (media_info.position, media_info.percentage, media_info.status, timestamp):
+                    conn.execute(MediaRepository.UPDATE_PROGRESS_QUERY,
+                                 MediaRepository._progress_params(media_info, row[0], timestamp))
+                else:
+                    continue
+                repaired += 1
+            
+            rows = [(*track, count, last) for track, (count, last) in counts.items()]
+            if started:
+                conn.execute(f"DELETE FROM {SKIP_TABLE}")
+                conn.execute(f"INSERT INTO {SKIP_TABLE} SELECT * FROM {SKIP_BASELINE_TABLE}")
+                update = "skip_count = skip_count + excluded.skip_count"
+            else:
+                update = "skip_count = MAX(skip_count, excluded.skip_count)"
+            conn.executemany(
+                f"INSERT INTO {SKIP_TABLE} (title, artist, app_name, skip_count, last_skipped) VALUES (?, ?, ?, ?, ?) "
+                f"ON CONFLICT (title, artist, app_name) DO UPDATE SET {update}, "
+                f"last_skipped = MAX(COALESCE(last_skipped, ''), excluded.last_skipped)",
+                rows
+            )
+            return repaired + len(rows)
+        
+        written = self.connection.execute_transaction(write)
+        repaired = written - len(counts)
+        total = sum(count for count, _ in counts.values())
+        if not started:
+            logger.warning("事件日志没有记录开始点，跳过计数只按日志补足，不会减少")
+        logger.info(f"已从事件日志重建: 补写或修正 {repaired} 条播放记录，跳过计数 {len(counts)} 首歌曲（{total} 次跳过）")
+        return repaired, total
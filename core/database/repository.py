@@ -2,102 +2,219 @@
 数据仓储层 - 负责数据的CRUD操作
 """
 from datetime import datetime
-from typing import Dict, Any, List, Tuple, Optional
+from typing import List, Optional, Tuple
+from core.media_info import MediaInfo, TrackKey
+from utils.clock import SystemClock
 from utils.logger import logger
+from .history_cache import TrackHistoryCache
+
+
+# 跳过计数表名
+SKIP_TABLE = "track_skips"
+
+# 开始合并事件日志时的跳过计数（日志中没有的部分），重放日志重建跳过计数时以此为基础
+SKIP_BASELINE_TABLE = "track_skips_baseline"
 
 
 class MediaRepository:
     """媒体信息仓储"""
     
-    def __init__(self, connection):
+    INSERT_QUERY = '''
+        INSERT INTO media_history 
+        (title, artist, album, album_artist, track_number, app_name, app_id, 
+         timestamp, duration, position, play_percentage, playback_status, genre, year, artwork_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    
+    FIND_LATEST_QUERY = '''
+        SELECT id FROM media_history
+        WHERE title = ? AND artist = ? AND app_name = ?
+        ORDER BY timestamp DESC
+        LIMIT 1
+    '''
+    
+    UPDATE_PROGRESS_QUERY = '''
+        UPDATE media_history
+        SET position = ?, play_percentage = ?, playback_status = ?, timestamp = ?
+        WHERE id = ?
+    '''
+    
+    SKIP_QUERY = f'''
+        INSERT INTO {SKIP_TABLE} (title, artist, app_name, skip_count, last_skipped)
+        VALUES (?, ?, ?, 1, ?)
+        ON CONFLICT (title, artist, app_name)
+        DO UPDATE SET skip_count = skip_count + 1, last_skipped = excluded.last_skipped
+    '''
+    
+    HISTORY_QUERY = '''
+        SELECT id, timestamp, play_percentage, playback_status, app_name
+        FROM media_history
+        WHERE title = ? AND (? = '' OR artist = ?)
+        ORDER BY timestamp DESC
+        LIMIT ?
+    '''
+    
+    # 播放次数最多的歌曲各自的最近记录
+    PRELOAD_QUERY = '''
+        SELECT title, artist, id, timestamp, play_percentage, playback_status, app_name
+        FROM (
+            SELECT h.title, h.artist, h.id, h.timestamp, h.play_percentage, h.playback_status, h.app_name,
+                   ROW_NUMBER() OVER (PARTITION BY h.title, h.artist ORDER BY h.timestamp DESC) AS rn
+            FROM media_history h
+            JOIN (
+                SELECT title, artist FROM media_history
+                WHERE title != ''
+                GROUP BY title, artist
+                ORDER BY COUNT(*) DESC
+                LIMIT ?
+            ) top ON h.title = top.title AND h.artist = top.artist
+        )
+        WHERE rn <= ?
+        ORDER BY title, artist, timestamp DESC
+    '''
+    
+    def __init__(self, connection, clock: SystemClock = None):
         self.connection = connection
+        # 写入记录的时间取自监控循环的时钟，回放时为虚拟时间
+        self.clock = clock or SystemClock()
+        self.history_cache = TrackHistoryCache()
     
-    def save(self, media_info: Dict[str, Any]) -> bool:
-        """保存媒体信息"""
+    def _now(self, timestamp: datetime = None) -> str:
+        """写入记录的时间：监控循环产生事件时的时间，未给出时取时钟的当前时间"""
+        return (timestamp or self.clock.now()).isoformat()
+    
+    def save(self, media_info: MediaInfo, timestamp: datetime = None) -> Optional[int]:
+        """保存媒体信息，返回新记录的 id，失败时返回 None"""
         try:
-            duration = int(media_info.get('duration', 0) or 0)
-            position = int(media_info.get('position', 0) or 0)
-            play_percentage = self._calculate_percentage(duration, position)
-            
-            query = '''
-                INSERT INTO media_history 
-                (title, artist, album, album_artist, track_number, app_name, app_id, 
-                 timestamp, duration, position, play_percentage, playback_status, genre, year)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            '''
-            params = (
-                media_info.get('title', ''),
-                media_info.get('artist', ''),
-                media_info.get('album', ''),
-                media_info.get('album_artist', ''),
-                media_info.get('track_number', 0),
-                media_info.get('app_name', ''),
-                media_info.get('app_id', ''),
-                datetime.now().isoformat(),
-                duration,
-                position,
-                play_percentage,
-                media_info.get('status', ''),
-                media_info.get('genre', ''),
-                media_info.get('year', 0)
-            )
-            
-            self.connection.execute_update(query, params)
-            logger.info(f"保存媒体信息: {media_info.get('title', 'Unknown')} - {media_info.get('artist', 'Unknown')}")
-            return True
+            timestamp = self._now(timestamp)
+            record_id = self.connection.execute_insert(self.INSERT_QUERY, self._insert_params(media_info, timestamp))
+            self.history_cache.record(record_id, media_info, timestamp, inserted=True)
+            logger.info(f"保存媒体信息: {media_info.title or 'Unknown'} - {media_info.artist or 'Unknown'}")
+            return record_id
             
         except Exception as e:
             logger.error(f"保存媒体信息失败: {e}")
-            return False
+            return None
     
-    def update_progress(self, media_info: Dict[str, Any]) -> bool:
-        """更新播放进度"""
+    def update_progress(self, media_info: MediaInfo, record_id: Optional[int] = None,
+                        timestamp: datetime = None) -> bool:
+        """更新播放进度，已知记录 id 时直接更新，否则更新最近的匹配记录"""
         try:
-            duration = int(media_info.get('duration', 0) or 0)
-            position = int(media_info.get('position', 0) or 0)
-            play_percentage = self._calculate_percentage(duration, position)
+            if record_id is None:
+                # 查找最近的匹配记录
+                row = self.connection.execute_single(self.FIND_LATEST_QUERY, self._find_params(media_info))
+                record_id = row[0] if row else None
             
-            # 查找最近的匹配记录
-            find_query = '''
-                SELECT id FROM media_history
-                WHERE title = ? AND artist = ? AND app_name = ?
-                ORDER BY timestamp DESC
-                LIMIT 1
-            '''
-            find_params = (
-                media_info.get('title', ''),
-                media_info.get('artist', ''),
-                media_info.get('app_name', '')
-            )
-            
-            row = self.connection.execute_single(find_query, find_params)
-            
-            if row:
+            if record_id is not None:
                 # 更新现有记录
-                record_id = row[0]
-                update_query = '''
-                    UPDATE media_history
-                    SET position = ?, play_percentage = ?, playback_status = ?, timestamp = ?
-                    WHERE id = ?
-                '''
-                update_params = (
-                    position,
-                    play_percentage,
-                    media_info.get('status', ''),
-                    datetime.now().isoformat(),
-                    record_id
-                )
-                self.connection.execute_update(update_query, update_params)
-                logger.debug(f"更新播放进度: {media_info.get('title','')} -> {play_percentage}%")
+                updated_at = self._now(timestamp)
+                update_params = self._progress_params(media_info, record_id, updated_at)
+                self.connection.execute_update(self.UPDATE_PROGRESS_QUERY, update_params)
+                self.history_cache.record(record_id, media_info, updated_at, inserted=False)
+                logger.debug(f"更新播放进度: {media_info.title} -> {update_params[1]}%")
                 return True
             else:
                 # 没有找到记录，创建新记录
-                return self.save(media_info)
+                return self.save(media_info, timestamp) is not None
                 
         except Exception as e:
             logger.error(f"更新播放进度失败: {e}")
             return False
     
+    def record_skip(self, track: TrackKey, timestamp: datetime = None) -> bool:
+        """歌曲未达到计入条件就被切走，跳过计数加一"""
+        try:
+            self.connection.execute_update(self.SKIP_QUERY, self._skip_params(track, self._now(timestamp)))
+            logger.debug(f"记录跳过: {track.title} - {track.artist}")
+            return True
+        except Exception as e:
+            logger.error(f"记录跳过失败: {e}")
+            return False
+    
+    def save_batch(self, new_tracks: List[MediaInfo],
+                   progress: List[Tuple[Optional[int], MediaInfo]],
+                   skips: List[TrackKey] = (), timestamp: datetime = None) -> Optional[List[int]]:
+        """在同一个事务中插入新记录、更新播放进度（记录 id 未知时更新最近的匹配记录）并记录跳过
+        
+        返回新记录的 id 列表，失败时返回 None
+        """
+        if not new_tracks and not progress and not skips:
+            return []
+        record_ids = []
+        written = []  # 事务提交后更新歌曲历史缓存的 (记录 id, 媒体信息, 时间, 是否为新记录)
+        stamp = self._now(timestamp)  # 同一批写入使用同一个时间
+        def write(conn) -> int:
+            for media_info in new_tracks:
+                record_id = conn.execute(self.INSERT_QUERY, self._insert_params(media_info, stamp)).lastrowid
+                record_ids.append(record_id)
+                written.append((record_id, media_info, stamp, True))
+            for record_id, media_info in progress:
+                if record_id is None:
+                    row = conn.execute(self.FIND_LATEST_QUERY, self._find_params(media_info)).fetchone()
+                    record_id = row[0] if row else None
+                if record_id is not None:
+                    conn.execute(self.UPDATE_PROGRESS_QUERY, self._progress_params(media_info, record_id, stamp))
+                    written.append((record_id, media_info, stamp, False))
+                else:
+                    record_id = conn.execute(self.INSERT_QUERY, self._insert_params(media_info, stamp)).lastrowid
+                    written.append((record_id, media_info, stamp, True))
+            if skips:
+                conn.executemany(self.SKIP_QUERY, [self._skip_params(track, stamp) for track in skips])
+            return len(new_tracks) + len(progress) + len(skips)
+        
+        try:
+            self.connection.execute_transaction(write)
+            for entry in written:
+                self.history_cache.record(*entry)
+            for media_info in new_tracks:
+                logger.info(f"保存媒体信息: {media_info.title or 'Unknown'} - {media_info.artist or 'Unknown'}")
+            return record_ids
+        except Exception as e:
+            logger.error(f"批量保存媒体信息失败: {e}")
+            return None
+    
+    @staticmethod
+    def _insert_params(media_info: MediaInfo, timestamp: str = None) -> tuple:
+        """插入记录的参数（timestamp 默认为当前时间）"""
+        return (
+            media_info.title,
+            media_info.artist,
+            media_info.album,
+            media_info.album_artist,
+            media_info.track_number,
+            media_info.app_name,
+            media_info.app_id,
+            timestamp or datetime.now().isoformat(),
+            media_info.duration,
+            media_info.position,
+            media_info.percentage,
+            media_info.status,
+            media_info.genre,
+            media_info.year,
+            media_info.artwork or None
+        )
+    
+    @staticmethod
+    def _find_params(media_info: MediaInfo) -> tuple:
+        """查找最近匹配记录的参数（即歌曲键）"""
+        return media_info.key
+    
+    @staticmethod
+    def _skip_params(track: TrackKey, timestamp: str = None) -> tuple:
+        """跳过计数的参数"""
+        return (track.title, track.artist, track.app_name, timestamp or datetime.now().isoformat())
+    
+    @staticmethod
+    def _progress_params(media_info: MediaInfo, record_id: int, timestamp: str = None) -> tuple:
+        """更新播放进度的参数"""
+        return (
+            media_info.position,
+            media_info.percentage,
+            media_info.status,
+            timestamp or datetime.now().isoformat(),
+            record_id
+        )
+    
     def get_recent(self, limit: int) -> List[Tuple]:
         """获取最近播放的歌曲"""
         try:
@@ -115,31 +232,36 @@ class MediaRepository:
             return []
     
     def get_track_history(self, title: str, artist: str = '', limit: int = 5) -> List[Tuple]:
-        """获取指定歌曲的历史记录"""
+        """获取指定歌曲的历史记录（最近播放的歌曲直接从缓存读取）"""
+        cached = self.history_cache.get(title, artist, limit)
+        if cached is not None:
+            return cached
         try:
-            query = '''
-                SELECT timestamp, play_percentage, playback_status, app_name
-                FROM media_history
-                WHERE title = ? AND (? = '' OR artist = ?)
-                ORDER BY timestamp DESC
-                LIMIT ?
-            '''
-            return self.connection.execute_query(query, (title, artist, artist, limit))
+            rows = self.connection.execute_query(
+                self.HISTORY_QUERY, (title, artist, artist, max(limit, self.history_cache.depth))
+            )
         except Exception as e:
             logger.error(f"查询歌曲历史失败: {e}")
             return []
+        self.history_cache.put(title, artist, rows)
+        return [tuple(row[1:]) for row in rows[:limit]]
     
-    @staticmethod
-    def _calculate_percentage(duration: int, position: int) -> int:
-        """计算播放百分比"""
-        if duration <= 0:
+    def preload_history(self, count: int) -> int:
+        """预加载播放次数最多的 count 首歌曲的最近记录到歌曲历史缓存，返回加载的歌曲数"""
+        if count <= 0:
             return 0
         try:
-            percentage = int((position / duration) * 100)
-            return max(0, min(100, percentage))
-        except Exception:
+            rows = self.connection.execute_query(self.PRELOAD_QUERY, (count, self.history_cache.depth))
+        except Exception as e:
+            logger.error(f"预加载歌曲历史失败: {e}")
             return 0
-
+        tracks = {}
+        for title, artist, *row in rows:
+            tracks.setdefault((title, artist), []).append(row)
+        for (title, artist), history in tracks.items():
+            self.history_cache.put(title, artist, history)
+        return len(tracks)
+    
 
 class SessionRepository:
     """会话信息仓储"""
@@ -147,6 +269,56 @@ class SessionRepository:
     def __init__(self, connection):
         self.connection = connection
     
+    CHECKPOINT_QUERY = '''
+        UPDATE playback_sessions SET session_end = ?, app_name = ?, tracks_played = ?, is_open = ?
+        WHERE id = ?
+    '''
+    
+    def start(self, start_time: datetime) -> Optional[int]:
+        """写入进行中会话的检查点行，返回其 id"""
+        try:
+            query = '''
+                INSERT INTO playback_sessions (session_start, session_end, app_name, tracks_played, is_open)
+                VALUES (?, ?, 'Unknown', 0, 1)
+            '''
+            return self.connection.execute_insert(query, (start_time.isoformat(), start_time.isoformat()))
+        except Exception as e:
+            logger.error(f"写入会话检查点失败: {e}")
+            return None
+    
+    def checkpoint(self, session_id: int, end_time: datetime, app_name: str, tracks_count: int) -> None:
+        """更新进行中会话的检查点（异常退出时结束时间即为最后一次检查点的时间）"""
+        try:
+            self.connection.execute_update(
+                self.CHECKPOINT_QUERY, (end_time.isoformat(), app_name, tracks_count, 1, session_id)
+            )
+        except Exception as e:
+            logger.error(f"更新会话检查点失败: {e}")
+    
+    def finish(self, session_id: int, end_time: datetime, app_name: str, tracks_count: int) -> None:
+        """结束会话：没有播放歌曲的会话直接删除"""
+        try:
+            if tracks_count > 0:
+                self.connection.execute_update(
+                    self.CHECKPOINT_QUERY, (end_time.isoformat(), app_name, tracks_count, 0, session_id)
+                )
+                logger.info(f"保存会话信息: {app_name}, {tracks_count} 首歌曲")
+            else:
+                self.connection.execute_update('DELETE FROM playback_sessions WHERE id = ?', (session_id,))
+        except Exception as e:
+            logger.error(f"保存会话信息失败: {e}")
+    
+    def recover(self) -> int:
+        """结束上次未正常退出时遗留的会话（保留最后一次检查点），返回恢复的会话数"""
+        try:
+            def close(conn) -> int:
+                removed = conn.execute('DELETE FROM playback_sessions WHERE is_open = 1 AND tracks_played = 0').rowcount
+                return removed + conn.execute('UPDATE playback_sessions SET is_open = 0 WHERE is_open = 1').rowcount
+            return self.connection.execute_transaction(close)
+        except Exception as e:
+            logger.error(f"恢复未结束的会话失败: {e}")
+            return 0
+    
     def save(self, start_time: datetime, end_time: datetime, app_name: str, tracks_count: int) -> None:
         """保存播放会话"""
         try:
@@ -0,0 +1,161 @@
+"""
+播放记录汇总 - 将多年前的逐条播放记录降采样为按天、按歌曲的汇总记录
+
+早期记录只会被统计查询以聚合方式使用，汇总后数据库大小与查询成本保持有界，
+而累计播放次数、时长等统计结果保持不变。
+"""
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from config.config_manager import config
+from utils.logger import logger
+
+
+ROLLUP_TABLE = "media_history_rollup"
+
+# 近期统计（最近7天、90天）按小时/按天查询逐条记录，汇总不能早于这个范围
+MIN_ROLLUP_DAYS = 90
+
+
+class RetentionManager:
+    """播放记录汇总管理器"""
+    
+    def __init__(self, connection, archive=None):
+        self.connection = connection
+        self.archive = archive
+        self.on_rows_removed = None  # 有记录被汇总删除时的回调（用于重置增量备份链）
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def check_and_rollup(self) -> None:
+        """检查是否需要汇总，需要时在后台线程中执行"""
+        if not config.get("database.rollup_enabled", False):
+            return
+        
+        row = self.connection.execute_single(
+            "SELECT value FROM db_config WHERE key = 'rollup_last_run'"
+        )
+        if row and row[0]:
+            try:
+                if datetime.now() - datetime.fromisoformat(row[0]) < timedelta(days=1):
+                    return
+            except ValueError:
+                pass
+        
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run_scheduled_rollup, name="DatabaseRollup", daemon=True
+            )
+            self._thread.start()
+    
+    def wait_for_rollup(self, timeout: float = None) -> None:
+        """等待后台汇总完成"""
+        thread = self._thread
+        if thread and thread.is_alive():
+            thread.join(timeout)
+    
+    def _run_scheduled_rollup(self) -> None:
+        """后台汇总任务：等归档完成后再汇总，避免两者争用写锁"""
+        if self.archive:
+            self.archive.wait_for_archive()
+        self.rollup_old_records()
+    
+    def rollup_old_records(self) -> int:
+        """把早于 rollup_after_days 天的逐条记录合并为每天每首歌一条的汇总记录"""
+        try:
+            days = max(MIN_ROLLUP_DAYS, config.get("database.rollup_after_days", 730))
+            now = datetime.now()
+            # 按整天截止，保证同一天的记录在同一次汇总中处理
+            cutoff = (now - timedelta(days=days)).date().isoformat()
+            
+            rolled = 0
+            touched_archives = []
+            with self.connection.get_connection() as conn:
+                rolled += self._rollup_schema(conn, "main", cutoff)
+                
+                archive_files = self.archive.archive_files() if self.archive else {}
+                for year, path in sorted(archive_files.items()):
+                    if str(year) > cutoff[:4]:
+                        continue
+                    conn.execute("ATTACH DATABASE ? AS arc", (path,))
+                    try:
+                        count = self._rollup_schema(conn, "arc", cutoff)
+                    finally:
+                        conn.execute("DETACH DATABASE arc")
+                    if count:
+                        rolled += count
+                        touched_archives.append(path)
+                
+                # 早于 rollup_boundary 的逐条记录都已汇总（重放事件日志时不再补写）
+                conn.executemany(
+                    "INSERT OR REPLACE INTO db_config (key, value, updated_at) VALUES (?, ?, ?)",
+                    [('rollup_boundary', cutoff, now.isoformat()),
+                     ('rollup_last_run', now.isoformat(), now.isoformat())]
+                )
+            
+            if rolled:
+                # 汇总已提交：先重置备份链并清空缓存，VACUUM 失败不影响这一步
+                if self.on_rows_removed:
+                    self.on_rows_removed()
+                logger.info(f"已将 {rolled} 条早于 {cutoff} 的播放记录汇总为按天统计")
+                # 回收被删除记录占用的空间（每个库单独回收，失败时只记录警告）
+                try:
+                    with self.connection.get_connection() as conn:
+                        conn.isolation_level = None
+                        conn.execute("VACUUM")
+                except Exception as e:
+                    logger.warning(f"汇总后回收数据库空间失败: {e}")
+                for path in touched_archives:
+                    try:
+                        archive_conn = sqlite3.connect(path, isolation_level=None)
+                        try:
+                            archive_conn.execute("VACUUM")
+                        finally:
+                            archive_conn.close()
+                    except Exception as e:
+                        logger.warning(f"汇总后回收归档空间失败 ({path}): {e}")
+            return rolled
+        
+        except Exception as e:
+            logger.error(f"汇总播放记录失败: {e}")
+            return 0
+    
+    @staticmethod
+    def _rollup_schema(conn, schema: str, cutoff: str) -> int:
+        """汇总指定库（main 或挂载的归档）中早于截止日期的记录并删除原始记录"""
+        exists = conn.execute(
+            f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = 'media_history'"
+        ).fetchone()
+        if not exists:
+            return 0
+        
+        try:
+            conn.execute(f'''
+                INSERT INTO main.{ROLLUP_TABLE}
+                    (day, title, artist, album, app_name, genre,
+                     play_count, completed_count, total_duration, duration_count)
+                SELECT DATE(timestamp), COALESCE(title, ''), COALESCE(artist, ''), COALESCE(album, ''),
+                       COALESCE(app_name, ''), COALESCE(genre, ''),
+                       COUNT(*),
+                       SUM(CASE WHEN playback_status IN ('completed', 'ended') THEN 1 ELSE 0 END),
+                       COALESCE(SUM(duration), 0),
+                       COUNT(duration)
+                FROM {schema}.media_history
+                WHERE timestamp < ?
+                GROUP BY 1, 2, 3, 4, 5, 6
+                ON CONFLICT (day, title, artist, album, app_name, genre) DO UPDATE SET
+                    play_count = play_count + excluded.play_count,
+                    completed_count = completed_count + excluded.completed_count,
+                    total_duration = total_duration + excluded.total_duration,
+                    duration_count = duration_count + excluded.duration_count
+            ''', (cutoff,))
+            rolled = conn.execute(
+                f"DELETE FROM {schema}.media_history WHERE timestamp < ?", (cutoff,)
+            ).rowcount
+            conn.commit()
+            return rolled
+        except Exception:
+            conn.rollback()
+            raise
@@ -3,6 +3,7 @@
 """
 from datetime import datetime
 from utils.logger import logger
+from .repository import SKIP_BASELINE_TABLE, SKIP_TABLE
 
 
 class DatabaseSchema:
@@ -14,8 +15,11 @@ class DatabaseSchema:
     def create_tables(self) -> None:
         """创建所有必需的表"""
         self._create_media_history_table()
+        self._create_media_history_rollup_table()
         self._create_playback_sessions_table()
+        self._create_track_skips_table()
         self._create_config_table()
+        self._create_indexes()
         self._set_database_version()
         self._migrate_if_needed()
     
@@ -38,11 +42,31 @@ class DatabaseSchema:
                 playback_status TEXT,
                 genre TEXT,
                 year INTEGER,
+                artwork_hash TEXT,
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP
             )
         '''
         self.connection.execute_update(query)
     
+    def _create_media_history_rollup_table(self) -> None:
+        """创建播放记录汇总表（按天、按歌曲聚合的早期播放记录）"""
+        query = '''
+            CREATE TABLE IF NOT EXISTS media_history_rollup (
+                day DATE NOT NULL,
+                title TEXT NOT NULL,
+                artist TEXT NOT NULL,
+                album TEXT NOT NULL,
+                app_name TEXT NOT NULL,
+                genre TEXT NOT NULL,
+                play_count INTEGER NOT NULL DEFAULT 0,
+                completed_count INTEGER NOT NULL DEFAULT 0,
+                total_duration INTEGER NOT NULL DEFAULT 0,
+                duration_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, title, artist, album, app_name, genre)
+            ) WITHOUT ROWID
+        '''
+        self.connection.execute_update(query)
+    
     def _create_playback_sessions_table(self) -> None:
         """创建播放会话表"""
         query = '''
@@ -52,11 +76,27 @@ class DatabaseSchema:
                 session_end DATETIME,
                 app_name TEXT,
                 tracks_played INTEGER,
+                is_open INTEGER NOT NULL DEFAULT 0,
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP
             )
         '''
         self.connection.execute_update(query)
     
+    def _create_track_skips_table(self) -> None:
+        """创建跳过计数表（未达到计入条件就被切走的歌曲，每首歌一行）及其事件日志基线表"""
+        for table in (SKIP_TABLE, SKIP_BASELINE_TABLE):
+            query = f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    title TEXT NOT NULL,
+                    artist TEXT NOT NULL,
+                    app_name TEXT NOT NULL,
+                    skip_count INTEGER NOT NULL DEFAULT 0,
+                    last_skipped DATETIME,
+                    PRIMARY KEY (title, artist, app_name)
+                ) WITHOUT ROWID
+            '''
+            self.connection.execute_update(query)
+    
     def _create_config_table(self) -> None:
         """创建配置表"""
         query = '''
@@ -68,6 +108,12 @@ class DatabaseSchema:
         '''
         self.connection.execute_update(query)
     
+    def _create_indexes(self) -> None:
+        """创建索引（按时间的查询与增量备份的水位线扫描）"""
+        self.connection.execute_update(
+            'CREATE INDEX IF NOT EXISTS idx_media_history_timestamp ON media_history (timestamp)'
+        )
+    
     def _set_database_version(self) -> None:
         """设置数据库版本"""
         query = '''
@@ -91,5 +137,19 @@ class DatabaseSchema:
                     )
                     conn.commit()
                     logger.info("数据库迁移：已添加 play_percentage 列")
+                
+                if 'artwork_hash' not in cols:
+                    cursor.execute("ALTER TABLE media_history ADD COLUMN artwork_hash TEXT")
+                    conn.commit()
+                    logger.info("数据库迁移：已添加 artwork_hash 列")
+                
+                # 检查 playback_sessions 的检查点标记列是否存在
+                cursor.execute("PRAGMA table_info(playback_sessions)")
+                if 'is_open' not in [r[1] for r in cursor.fetchall()]:
+                    cursor.execute(
+                        "ALTER TABLE playback_sessions ADD COLUMN is_open INTEGER NOT NULL DEFAULT 0"
+                    )
+                    conn.commit()
+                    logger.info("数据库迁移：已添加 is_open 列")
         except Exception as e:
             logger.warning(f"数据库迁移检查失败: {e}")
\ No newline at end of file
@@ -1,16 +1,41 @@
 """
 统计分析服务
 """
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 import re
 from utils.logger import logger
+from .connection import HISTORY_VIEW
+from .repository import SKIP_TABLE
+from .retention import ROLLUP_TABLE
 
 
 class StatisticsService:
     """统计分析服务"""
     
-    def __init__(self, connection):
+    def __init__(self, connection, archive=None):
         self.connection = connection
+        self.archive = archive
+    
+    def _source(self, days: Optional[int] = None) -> Tuple[str, List[str]]:
+        """返回查询最近 days 天（None 为全部历史）应使用的表名及需要挂载的归档"""
+        archives = self.archive.archives_for_window(days) if self.archive else []
+        return (HISTORY_VIEW if archives else 'media_history'), archives
+    
+    def _plays(self) -> Tuple[str, List[str]]:
+        """全部历史的播放来源：逐条记录每条计 1 次，汇总记录按 play_count 计"""
+        history, archives = self._source()
+        source = f'''(
+            SELECT title, artist, album, app_name, genre, 1 AS plays,
+                   CASE WHEN playback_status IN ('completed', 'ended') THEN 1 ELSE 0 END AS completed,
+                   duration AS total_duration,
+                   CASE WHEN duration IS NULL THEN 0 ELSE 1 END AS duration_plays
+            FROM {history}
+            UNION ALL
+            SELECT title, artist, album, app_name, genre, play_count,
+                   completed_count, total_duration, duration_count
+            FROM {ROLLUP_TABLE}
+        )'''
+        return source, archives
     
     def get_all_statistics(self) -> Dict[str, Any]:
         """获取所有统计信息"""
@@ -32,75 +57,75 @@ class StatisticsService:
     def _get_basic_stats(self) -> Dict[str, Any]:
         """获取基础统计"""
         stats = {}
+        plays, archives = self._plays()
         
         # 总播放次数
         result = self.connection.execute_single(
-            'SELECT COUNT(*) FROM media_history WHERE title != ""'
+            f'SELECT COALESCE(SUM(plays), 0) FROM {plays} WHERE title != ""', archives=archives
         )
         stats['total_plays'] = result[0] if result else 0
         
         # 不同歌曲数量
-        result = self.connection.execute_single('''
+        result = self.connection.execute_single(f'''
             SELECT COUNT(*) FROM (
                 SELECT DISTINCT title, artist 
-                FROM media_history 
+                FROM {plays} 
                 WHERE title != ""
             )
-        ''')
+        ''', archives=archives)
         stats['unique_songs'] = result[0] if result else 0
         
         # 会话统计
-        result = self.connection.execute_single('SELECT COUNT(*) FROM playback_sessions')
+        # 进行中的会话在计入第一首歌曲之前不统计
+        result = self.connection.execute_single('SELECT COUNT(*) FROM playback_sessions WHERE tracks_played > 0')
         stats['total_sessions'] = result[0] if result else 0
         
-        result = self.connection.execute_single('SELECT AVG(tracks_played) FROM playback_sessions')
+        result = self.connection.execute_single('SELECT AVG(tracks_played) FROM playback_sessions WHERE tracks_played > 0')
         stats['avg_tracks_per_session'] = result[0] if result else 0
         
         # 完成播放次数
-        result = self.connection.execute_single('''
-            SELECT COUNT(*) FROM media_history 
-            WHERE title != "" AND playback_status IN ('completed', 'ended')
-        ''')
+        result = self.connection.execute_single(f'''
+            SELECT COALESCE(SUM(completed), 0) FROM {plays} 
+            WHERE title != ""
+        ''', archives=archives)
         stats['completed_play_count'] = result[0] if result else 0
         
+        # 未达到计入条件就被切走的次数
+        result = self.connection.execute_single(f'SELECT COALESCE(SUM(skip_count), 0) FROM {SKIP_TABLE}')
+        stats['total_skips'] = result[0] if result else 0
+        
         return stats
     
     def _get_top_songs(self) -> Dict[str, Any]:
         """获取最常播放的歌曲"""
-        query = '''
-            SELECT title, artist, album, COUNT(*) as play_count 
-            FROM media_history 
+        plays, archives = self._plays()
+        query = f'''
+            SELECT title, artist, album, SUM(plays) as play_count 
+            FROM {plays} 
             WHERE title != ""
             GROUP BY title, artist 
             ORDER BY play_count DESC 
             LIMIT 10
         '''
-        return {'top_songs': self.connection.execute_query(query)}
+        return {'top_songs': self.connection.execute_query(query, archives=archives)}
     
     def _get_top_artists(self) -> Dict[str, Any]:
         """获取最常播放的艺术家"""
-        # 获取所有不同的艺术家记录
-        query = '''
-            SELECT DISTINCT artist
-            FROM media_history 
-            WHERE artist != "" AND artist IS NOT NULL
+        # 一次查询得到每个艺术家字符串的播放次数
+        plays, archives = self._plays()
+        query = f'''
+            SELECT artist, SUM(plays)
+            FROM {plays} 
+            WHERE artist != "" AND artist IS NOT NULL AND title != ""
+            GROUP BY artist
         '''
-        unique_artists = [row[0] for row in self.connection.execute_query(query)]
         
         # 统计每个艺术家的播放次数
         artist_counts = {}
         
-        for artist_string in unique_artists:
+        for artist_string, count in self.connection.execute_query(query, archives=archives):
             individual_artists = self._parse_artists(artist_string)
             
-            count_query = '''
-                SELECT COUNT(*) 
-                FROM media_history 
-                WHERE artist = ? AND title != ""
-            '''
-            result = self.connection.execute_single(count_query, (artist_string,))
-            count = result[0] if result else 0
-            
             if len(individual_artists) <= 1:
                 # 单艺术家
                 artist_name = individual_artists[0] if individual_artists else artist_string
@@ -116,74 +141,79 @@ class StatisticsService:
     
     def _get_top_apps(self) -> Dict[str, Any]:
         """获取最常使用的应用"""
-        query = '''
-            SELECT app_name, COUNT(*) as usage_count 
-            FROM media_history 
+        plays, archives = self._plays()
+        query = f'''
+            SELECT app_name, SUM(plays) as usage_count 
+            FROM {plays} 
             WHERE title != ""
             GROUP BY app_name 
             ORDER BY usage_count DESC
         '''
-        return {'top_apps': self.connection.execute_query(query)}
+        return {'top_apps': self.connection.execute_query(query, archives=archives)}
     
     def _get_time_based_stats(self) -> Dict[str, Any]:
         """获取基于时间的统计"""
         stats = {}
         
-        # 最近7天的每日统计
-        daily_query = '''
+        # 最近7天的每日统计（时间窗口未跨入归档时只查询主库）
+        history, archives = self._source(7)
+        daily_query = f'''
             SELECT DATE(timestamp) as play_date, COUNT(*) as daily_count
-            FROM media_history 
+            FROM {history} 
             WHERE title != "" AND datetime(timestamp) >= datetime('now', '-7 days')
             GROUP BY DATE(timestamp)
             ORDER BY play_date DESC
         '''
-        stats['daily_stats'] = self.connection.execute_query(daily_query)
+        stats['daily_stats'] = self.connection.execute_query(daily_query, archives=archives)
         
         # 按小时统计
-        hourly_query = '''
+        hourly_query = f'''
             SELECT 
                 strftime('%H', timestamp) as hour, 
                 COUNT(*) as count
-            FROM media_history 
+            FROM {history} 
             WHERE title != "" 
             AND datetime(timestamp) >= datetime('now', '-7 days')
             GROUP BY hour 
             ORDER BY hour
         '''
-        hourly_results = self.connection.execute_query(hourly_query)
+        hourly_results = self.connection.execute_query(hourly_query, archives=archives)
         stats['hourly_stats'] = [(int(h), c) for h, c in hourly_results]
         
         # 月度统计（近3个月）
-        monthly_query = '''
+        history, archives = self._source(90)
+        monthly_query = f'''
             SELECT 
                 strftime('%Y-%m', timestamp) as month, 
                 COUNT(*) as count
-            FROM media_history 
+            FROM {history} 
             WHERE title != "" 
             AND datetime(timestamp) >= datetime('now', '-90 days')
             GROUP BY month 
             ORDER BY month DESC
             LIMIT 3
         '''
-        stats['monthly_stats'] = self.connection.execute_query(monthly_query)
+        stats['monthly_stats'] = self.connection.execute_query(monthly_query, archives=archives)
         
         return stats
     
     def _get_duration_stats(self) -> Dict[str, Any]:
         """获取时长统计"""
         stats = {}
+        plays, archives = self._plays()
         
         # 总播放时长
-        result = self.connection.execute_single('''
-            SELECT SUM(duration) FROM media_history WHERE title != ""
-        ''')
+        result = self.connection.execute_single(f'''
+            SELECT SUM(total_duration) FROM {plays} WHERE title != ""
+        ''', archives=archives)
         total_duration = result[0] if result and result[0] else 0
         stats['total_duration_minutes'] = total_duration // 60 if total_duration > 0 else 0
         
         # 平均单曲时长
-        result = self.connection.execute_single('''
-            SELECT AVG(duration) FROM media_history WHERE title != ""
-        ''')
+        result = self.connection.execute_single(f'''
+            SELECT SUM(total_duration) * 1.0 / NULLIF(SUM(duration_plays), 0)
+            FROM {plays} WHERE title != ""
+        ''', archives=archives)
         avg_duration = result[0] if result and result[0] else 0
         stats['avg_track_duration_minutes'] = avg_duration // 60 if avg_duration > 0 else 0
         
@@ -191,30 +221,32 @@ class StatisticsService:
     
     def _get_genre_stats(self) -> Dict[str, Any]:
         """获取流派统计"""
-        query = '''
-            SELECT genre, COUNT(*) as count 
-            FROM media_history 
+        plays, archives = self._plays()
+        query = f'''
+            SELECT genre, SUM(plays) as count 
+            FROM {plays} 
             WHERE genre != "" AND title != ""
             GROUP BY genre 
             ORDER BY count DESC
         '''
-        results = self.connection.execute_query(query)
+        results = self.connection.execute_query(query, archives=archives)
         return {'genre_distribution': dict(results)}
     
     def _get_album_stats(self) -> Dict[str, Any]:
         """获取专辑统计"""
-        query = '''
+        plays, archives = self._plays()
+        query = f'''
             SELECT album, AVG(tracks_played) as avg_tracks 
             FROM (
-                SELECT album, title, COUNT(*) as tracks_played 
-                FROM media_history 
+                SELECT album, title, SUM(plays) as tracks_played 
+                FROM {plays} 
                 WHERE album != "" AND title != ""
                 GROUP BY album, title
             ) 
             GROUP BY album
             ORDER BY avg_tracks DESC
         '''
-        results = self.connection.execute_query(query)
+        results = self.connection.execute_query(query, archives=archives)
         return {'album_completion_stats': dict(results)}
     
     @staticmethod
@@ -0,0 +1,45 @@
+"""
+媒体信息记录 - 媒体源、监控循环、数据库与叠加层之间传递的不可变媒体快照
+"""
+from typing import NamedTuple
+
+
+class TrackKey(NamedTuple):
+    """识别同一首歌曲的键（同一歌曲在不同应用中播放视为不同记录）"""
+    title: str
+    artist: str
+    app_name: str
+
+
+class MediaInfo(NamedTuple):
+    """一次读取到的媒体信息，没有的字段为空字符串或 0"""
+    title: str = ''
+    artist: str = ''
+    album: str = ''
+    album_artist: str = ''
+    track_number: int = 0
+    genre: str = ''
+    year: int = 0
+    app_id: str = 'Unknown'
+    app_name: str = 'Unknown'
+    status: str = 'Unknown'
+    duration: int = 0
+    position: int = 0
+    artwork: str = ''  # 封面图片的内容哈希（计入播放记录时由监控循环填写）
+    
+    @property
+    def key(self) -> TrackKey:
+        """歌曲键"""
+        return TrackKey(self.title, self.artist, self.app_name)
+    
+    @property
+    def complete(self) -> bool:
+        """元数据是否完整（有专辑和时长）"""
+        return bool(self.album) and bool(self.duration)
+
+    @property
+    def percentage(self) -> int:
+        """播放百分比"""
+        if self.duration <= 0:
+            return 0
+        return max(0, min(100, int(self.position / self.duration * 100)))
@@ -1,223 +1,513 @@
 # media_monitor.py
 import asyncio
 from datetime import datetime
-from typing import Dict, Any, Optional
+from operator import attrgetter
+from typing import Dict, Any, Optional, Set, Tuple
 from config.config_manager import config
 from core.database import db
+from core.database.artwork import artwork_hash
 from utils.logger import logger
 from utils.safe_print import safe_print
 from utils.overlay import overlay
+from utils.clock import SystemClock
 
-try:
-    import winsdk.windows.media.control as wmc
-    from winsdk.windows.storage.streams import RandomAccessStreamReference
-except ImportError:
-    safe_print("需要安装 winsdk 库: pip install winsdk")
-    exit(1)
+from core.media_info import MediaInfo
+from core.media_source import MediaSource, create_media_source
+from core.pipeline import MonitorPipeline
+from core.play_state import PlayTracker
+from core.poll_scheduler import PollScheduler
+
+# 事件驱动模式下，收到第一个事件后稍等片刻以合并同一次切歌触发的多个事件
+EVENT_SETTLE_SECONDS = 0.1
+
+# 切歌后等待元数据稳定：首次复查间隔，之后每次翻倍
+STABILIZE_INITIAL_DELAY = 0.05
+
+# 判断元数据是否稳定所比较的字段
+STABLE_FIELDS = ('title', 'artist', 'album', 'duration')
+_stable_fields = attrgetter(*STABLE_FIELDS)
 
 class MediaMonitor:
-    def __init__(self):
-        self.current_session = None
+    def __init__(self, source: Optional[MediaSource] = None, database=None,
+                 clock: Optional[SystemClock] = None, use_overlay: bool = True):
+        self.source = source
+        self.db = database or db
+        self.clock = clock or SystemClock()
+        self.use_overlay = use_overlay
         self.running = False
+        # 事件驱动模式：媒体源的回调线程通过事件循环把通知放入队列
+        self._event_loop = None
+        self._event_queue = None
+        # 监控流水线：数据库写入、控制台输出与叠加层在采样循环之外依次处理
+        self._pipeline = None
+        self.pipeline_stats = []  # 上一次监控结束时各阶段的背压统计
+        self._tracks_saved = 0
+        self._last_app_name = None
+        # 会话检查点：进行中的会话保存在数据库的一行中，异常退出后下次启动时结束
+        self._session_id = None
+        self._checkpoint_at = 0.0
+        # 播放事件日志（database.journal_enabled），启用时持久化阶段只追加事件，按间隔合并进数据库
+        self._journal = None
+        self._compacted_at = 0.0
+        # 配置文件被修改（监视线程回调），监控循环在下一轮应用新的轮询间隔
+        self._config_changed = False
         
     def stop_monitoring(self):
         """停止监控"""
         self.running = False
+        self._notify("stop")
         
-    async def get_basic_media_info(self) -> Dict[str, Any]:
-        """获取基本媒体信息（仅歌名和艺术家，用于快速检测变化）"""
+    def _get_source(self) -> MediaSource:
+        """获取媒体源，未指定时按配置创建（SMTC 媒体源在此时才导入 winsdk）"""
+        if self.source is None:
+            self.source = create_media_source()
+        return self.source
+    
+    def _notify(self, reason: str) -> None:
+        """从任意线程唤醒事件驱动的监控循环"""
+        loop, queue = self._event_loop, self._event_queue
+        if loop is None or queue is None:
+            return
         try:
-            sessions_manager = await wmc.GlobalSystemMediaTransportControlsSessionManager.request_async()
-            current_session = sessions_manager.get_current_session()
-            
-            if current_session is None:
-                return {}
-                
-            # 获取基本媒体属性
-            try:
-                media_properties = await current_session.try_get_media_properties_async()
-                playback_info = current_session.get_playback_info()
-            except Exception as e:
-                logger.debug(f"获取基本媒体属性失败: {e}")
-                return {}
-                
-            if not media_properties:
-                return {}
-                
-            # 获取应用信息
-            try:
-                app_id = current_session.source_app_user_model_id or 'Unknown'
-                app_name = config.get_app_name(app_id)
-                
-                # 检查是否忽略此应用
-                if config.is_app_ignored(app_id):
-                    return {}
-            except Exception as e:
-                logger.debug(f"获取应用信息失败: {e}")
-                app_name = 'Unknown'
-                
-            # 获取播放状态
-            status_map = {
-                0: 'Closed',
-                1: 'Opened', 
-                2: 'Changing',
-                3: 'Stopped',
-                4: 'Playing',
-                5: 'Paused'
-            }
-            status = status_map.get(playback_info.playback_status if playback_info else 0, 'Unknown')
-                
-            return {
-                'title': media_properties.title or '',
-                'artist': media_properties.artist or '',
-                'app_name': app_name,
-                'status': status
-            }
+            loop.call_soon_threadsafe(queue.put_nowait, reason)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+    
+    def _on_config_changed(self, changed: Set[str]) -> None:
+        """配置重新加载（在监视线程中回调）：唤醒监控循环应用新的配置"""
+        self._config_changed = True
+        self._notify("config")
+    
+    def _watch_config(self) -> None:
+        """监控期间监视配置文件的修改"""
+        self._config_changed = False
+        config.subscribe(self._on_config_changed)
+        config.start_watching()
+    
+    def _unwatch_config(self) -> None:
+        config.unsubscribe(self._on_config_changed)
+        config.stop_watching()
+    
+    def _apply_config(self, interval: float, fixed_interval: bool, schedulers: list) -> Tuple[float, float]:
+        """应用重新加载的配置：更新轮询间隔（命令行指定的监控间隔不变），返回新的监控间隔与心跳间隔"""
+        self._config_changed = False
+        if not fixed_interval:
+            interval = config.get_monitoring_interval()
+        heartbeat = max(interval, config.get("monitoring.heartbeat_interval", 30))
+        for scheduler in schedulers:
+            scheduler.configure(interval)
+        logger.info(f"已应用新的配置，监控间隔: {interval}秒")
+        return interval, heartbeat
+    
+    def _open_wakeup(self) -> None:
+        """创建唤醒队列：停止监控、配置变化与媒体源事件都通过它唤醒等待中的监控循环"""
+        self._event_loop = asyncio.get_running_loop()
+        self._event_queue = asyncio.Queue()
+    
+    def _start_events(self) -> None:
+        """进入事件驱动模式：让媒体源把变化推送到唤醒队列"""
+        self.source.start_events(self._notify)
+    
+    def _stop_events(self) -> None:
+        """退出事件驱动模式"""
+        if self.source is not None:
+            self.source.stop_events()
+        self._event_loop = None
+        self._event_queue = None
+    
+    async def _sleep(self, delay: float) -> None:
+        """轮询模式下等待下一次检查，停止监控（如收到 SIGTERM）或配置变化时提前返回"""
+        await self.clock.wait_for(self._event_queue, delay)
+    
+    async def _wait_for_event(self, timeout: float) -> None:
+        """等待媒体源事件，超时即作为兜底心跳返回"""
+        queue = self._event_queue
+        if await self.clock.wait_for(queue, timeout) is None:
+            return
+        # 合并同一次变化触发的连串事件
+        await self.clock.sleep(EVENT_SETTLE_SECONDS)
+        while not queue.empty():
+            queue.get_nowait()
+    
+    async def _get_stable_media_info(self) -> Optional[MediaInfo]:
+        """以逐渐加长的间隔重复读取媒体信息，直到歌名、艺术家、专辑、时长不再变化
+        
+        信息完整（有专辑和时长）时连续两次一致即返回；不完整时需保持不变至少
+        最长等待时间的一半，给发布较慢的应用补全专辑的机会。总等待不超过 monitoring.metadata_max_wait 秒。
+        """
+        max_wait = config.get("monitoring.metadata_max_wait", 2)
+        start = self.clock.monotonic()
+        delay = STABILIZE_INITIAL_DELAY
+        
+        media_info = await self.get_media_info()
+        stable_since = start
+        while True:
+            elapsed = self.clock.monotonic() - start
+            if elapsed >= max_wait:
+                return media_info
+            await self.clock.sleep(min(delay, max_wait - elapsed))
+            delay *= 2
             
-        except Exception as e:
-            logger.error(f"获取基本媒体信息时出错: {e}")
-            return {}
+            sample = await self.get_media_info()
+            now = self.clock.monotonic()
+            if not sample or not media_info or _stable_fields(sample) != _stable_fields(media_info):
+                media_info = sample
+                stable_since = now
+                continue
+            media_info = sample
+            if sample.complete or now - stable_since >= max_wait / 2:
+                return media_info
+    
+    async def get_basic_media_info(self) -> Optional[MediaInfo]:
+        """获取基本媒体信息（仅歌名和艺术家，用于快速检测变化）"""
+        return await self._get_source().get_basic_media_info()
         
-    async def get_media_info(self) -> Dict[str, Any]:
+    async def get_media_info(self) -> Optional[MediaInfo]:
         """获取完整的媒体信息"""
-        try:
-            sessions_manager = await wmc.GlobalSystemMediaTransportControlsSessionManager.request_async()
-            current_session = sessions_manager.get_current_session()
-            
-            if current_session is None:
-                return {}
-                
-            # 获取媒体属性
-            try:
-                media_properties = await current_session.try_get_media_properties_async()
-            except Exception as e:
-                logger.debug(f"获取媒体属性失败: {e}")
-                media_properties = None
-                
-            # 获取播放信息
-            try:
-                playback_info = current_session.get_playback_info()
-                timeline_info = current_session.get_timeline_properties()
-            except Exception as e:
-                logger.debug(f"获取播放信息失败: {e}")
-                playback_info = None
-                timeline_info = None
-                
-            media_info = {}
-            
-            if media_properties:
-                media_info.update({
-                    'title': media_properties.title or '',
-                    'artist': media_properties.artist or '',
-                    'album': media_properties.album_title or '',
-                    'album_artist': media_properties.album_artist or '',
-                    'track_number': media_properties.track_number or 0,
-                    'genre': getattr(media_properties, 'genres', [None])[0] if hasattr(media_properties, 'genres') and media_properties.genres else '',
-                })
-                
-                # 尝试获取年份
-                try:
-                    if hasattr(media_properties, 'year') and media_properties.year:
-                        media_info['year'] = media_properties.year
-                except:
-                    media_info['year'] = 0
-                
-            if playback_info:
-                status_map = {
-                    0: 'Closed',
-                    1: 'Opened', 
-                    2: 'Changing',
-                    3: 'Stopped',
-                    4: 'Playing',
-                    5: 'Paused'
-                }
-                media_info['status'] = status_map.get(playback_info.playback_status, 'Unknown')
-                
-            if timeline_info:
-                try:
-                    media_info.update({
-                        'duration': int(timeline_info.end_time.total_seconds()) if timeline_info.end_time else 0,
-                        'position': int(timeline_info.position.total_seconds()) if timeline_info.position else 0,
-                    })
-                except:
-                    media_info.update({
-                        'duration': 0,
-                        'position': 0,
-                    })
-                
-            # 获取应用信息
-            try:
-                app_id = current_session.source_app_user_model_id or 'Unknown'
-                media_info['app_id'] = app_id
-                media_info['app_name'] = config.get_app_name(app_id)
-                
-                # 检查是否忽略此应用
-                if config.is_app_ignored(app_id):
-                    return {}
-                    
-            except Exception as e:
-                logger.debug(f"获取应用信息失败: {e}")
-                media_info['app_name'] = 'Unknown'
-                media_info['app_id'] = 'Unknown'
-                
-            return media_info
-            
-        except Exception as e:
-            logger.error(f"获取媒体信息时出错: {e}")
-            return {}
+        return await self._get_source().get_media_info()
             
-    def _format_media_output(self, media_info: Dict[str, Any], current_time: datetime, silent_mode: bool = False) -> None:
+    def _format_media_output(self, media_info: MediaInfo, current_time: datetime, silent_mode: bool = False) -> None:
         """格式化媒体输出"""
         if silent_mode:
             return
             
-        use_emoji = config.should_use_emoji()
+        settings = config.snapshot
+        use_emoji = settings.use_emoji
         
         safe_print(f"[{current_time.strftime('%H:%M:%S')}] 正在播放:")
         
         title_prefix = "🎵 " if use_emoji else ""
-        safe_print(f"  {title_prefix}歌曲: {media_info.get('title', 'Unknown')}")
+        safe_print(f"  {title_prefix}歌曲: {media_info.title or 'Unknown'}")
         
-        if media_info.get('artist'):
+        if media_info.artist:
             artist_prefix = "🎤 " if use_emoji else ""
-            safe_print(f"  {artist_prefix}艺术家: {media_info.get('artist')}")
+            safe_print(f"  {artist_prefix}艺术家: {media_info.artist}")
             
-        if media_info.get('album'):
+        if media_info.album:
             album_prefix = "💿 " if use_emoji else ""
-            safe_print(f"  {album_prefix}专辑: {media_info.get('album')}")
+            safe_print(f"  {album_prefix}专辑: {media_info.album}")
             
-        if media_info.get('album_artist') and media_info.get('album_artist') != media_info.get('artist'):
+        if media_info.album_artist and media_info.album_artist != media_info.artist:
             group_prefix = "👥 " if use_emoji else ""
-            safe_print(f"  {group_prefix}专辑艺术家: {media_info.get('album_artist')}")
+            safe_print(f"  {group_prefix}专辑艺术家: {media_info.album_artist}")
             
-        if config.get("display.show_track_number", True) and media_info.get('track_number'):
+        if settings.show_track_number and media_info.track_number:
             track_prefix = "🔢 " if use_emoji else ""
-            safe_print(f"  {track_prefix}曲目号: {media_info.get('track_number')}")
+            safe_print(f"  {track_prefix}曲目号: {media_info.track_number}")
             
-        if config.get("display.show_genre", True) and media_info.get('genre'):
+        if settings.show_genre and media_info.genre:
             genre_prefix = "🎭 " if use_emoji else ""
-            safe_print(f"  {genre_prefix}流派: {media_info.get('genre')}")
+            safe_print(f"  {genre_prefix}流派: {media_info.genre}")
             
-        if config.get("display.show_year", True) and media_info.get('year'):
+        if settings.show_year and media_info.year:
             year_prefix = "📅 " if use_emoji else ""
-            safe_print(f"  {year_prefix}年份: {media_info.get('year')}")
+            safe_print(f"  {year_prefix}年份: {media_info.year}")
             
         app_prefix = "📱 " if use_emoji else ""
-        safe_print(f"  {app_prefix}应用: {media_info.get('app_name', 'Unknown')}")
+        safe_print(f"  {app_prefix}应用: {media_info.app_name}")
         
         status_prefix = "⚡ " if use_emoji else ""
-        safe_print(f"  {status_prefix}状态: {media_info.get('status', 'Unknown')}")
+        safe_print(f"  {status_prefix}状态: {media_info.status}")
         
-        if config.get("display.show_progress", True) and media_info.get('duration'):
-            duration_str = f"{media_info['duration']//60}:{media_info['duration']%60:02d}"
-            position_str = f"{media_info.get('position', 0)//60}:{media_info.get('position', 0)%60:02d}"
+        if settings.show_progress and media_info.duration:
+            duration_str = f"{media_info.duration//60}:{media_info.duration%60:02d}"
+            position_str = f"{media_info.position//60}:{media_info.position%60:02d}"
             progress_prefix = "⏱️ " if use_emoji else ""
             safe_print(f"  {progress_prefix}进度: {position_str}/{duration_str}")
             
+    def _load_source(self) -> bool:
+        """加载媒体源，失败时提示并返回 False"""
+        try:
+            self._get_source()
+            return True
+        except ImportError:
+            safe_print("需要安装 winsdk 库: pip install winsdk")
+            logger.error("无法加载 SMTC 媒体源：缺少 winsdk")
+        except (OSError, ValueError) as e:
+            safe_print(f"无法加载媒体源: {e}")
+            logger.error(f"无法加载媒体源: {e}")
+        return False
+    
+    def _start_pipeline(self, silent_mode: bool) -> None:
+        """创建并启动监控流水线：持久化（背压）、控制台输出与叠加层（队列满时丢弃）"""
+        queue_size = config.get("monitoring.pipeline_queue_size", 100)
+        pipeline = MonitorPipeline()
+        pipeline.add_stage('persist', self._persist, queue_size)
+        if not silent_mode:
+            pipeline.add_stage('output', self._output, queue_size, lossy=True)
+        if self.use_overlay:
+            # 是否显示由 display.show_overlay_on_repeat 在每次显示时决定（可在运行中修改）
+            pipeline.add_stage('overlay', self._overlay, queue_size, lossy=True)
+            if config.snapshot.show_overlay_on_repeat:
+                # 常听的歌曲重复播放时不必查询数据库
+                preloaded = self.db.preload_track_history()
+                logger.debug(f"已预加载 {preloaded} 首歌曲的播放历史")
+        self._pipeline = pipeline
+        self._tracks_saved = 0
+        self._last_app_name = None
+        if config.get("database.journal_enabled", False):
+            self._journal = self.db.open_journal()
+            # 合并上次异常退出时尚未合并的事件
+            self.db.compact_journal()
+            self._compacted_at = self.clock.monotonic()
+        pipeline.start()
+    
+    async def _stop_pipeline(self) -> None:
+        """处理完流水线中剩余的事件后停止，并记录各阶段的背压统计"""
+        pipeline = self._pipeline
+        if pipeline is None:
+            return
+        if self._journal is not None:
+            # 停止前同步并合并事件日志
+            await pipeline.emit('persist', (self.clock.now(), ('flush',)))
+        await pipeline.close()
+        self._pipeline = None
+        if self._journal is not None:
+            self.db.close_journal()
+            self._journal = None
+        self.pipeline_stats = pipeline.stats()
+        for stats in self.pipeline_stats:
+            logger.info(f"流水线阶段 {stats['name']}: 处理 {stats['processed']} 个事件，最大积压 {stats['high_water']}，"
+                        f"阻塞 {stats['blocked']} 次（{stats['blocked_seconds']:.3f} 秒），丢弃 {stats['dropped']} 个")
+    
+    async def _print(self, text: str) -> None:
+        """通过输出阶段打印一行"""
+        await self._pipeline.emit('output', ('text', text))
+    
+    async def _show(self, media_info: MediaInfo) -> None:
+        """通过输出阶段显示正在播放的信息"""
+        await self._pipeline.emit('output', ('media', media_info, self.clock.now()))
+    
+    async def _output(self, event: tuple) -> None:
+        """输出阶段：打印控制台信息"""
+        kind = event[0]
+        use_emoji = config.snapshot.use_emoji
+        if kind == 'text':
+            safe_print(event[1])
+        elif kind == 'media':
+            self._format_media_output(event[1], event[2])
+        elif kind == 'saved':
+            save_prefix = "✅ " if use_emoji else ""
+            safe_print(f"  {save_prefix}已保存到数据库: {event[1].title}")
+        elif kind == 'failed':
+            warn_prefix = "⚠️ " if use_emoji else ""
+            safe_print(f"  {warn_prefix}保存到数据库失败")
+    
+    async def _overlay(self, media_info: MediaInfo) -> None:
+        """叠加层阶段：检查是否之前曾有播放记录，若有则显示叠加层"""
+        try:
+            settings = config.snapshot
+            if not settings.show_overlay_on_repeat:
+                return
+            limit = settings.overlay_history_limit
+            history = await self._pipeline.run_blocking(self.db.get_track_history, media_info.title, media_info.artist, limit)
+            # 因为刚插入当前记录，若历史记录>=2则说明之前记录过
+            if history and len(history) > 1:
+                # 封面从封面存储的缓存中读取
+                artwork = await self._pipeline.run_blocking(self.db.get_artwork, media_info.artwork) if media_info.artwork else None
+                # 将最近几次（包含本次）传给叠加层显示
+                overlay.show(media_info, history[:limit],
+                             duration=settings.overlay_duration_seconds, artwork=artwork)
+        except Exception as e:
+            logger.debug(f"尝试显示叠加层时出错: {e}")
+    
+    async def _emit_persist(self, event: tuple) -> None:
+        """把事件交给持久化阶段，附带产生事件时监控时钟的时间（写入的时间不受积压与执行器线程影响）"""
+        await self._pipeline.emit('persist', (self.clock.now(), event))
+    
+    async def _persist(self, stamped: tuple) -> None:
+        """持久化阶段：在执行器线程中按顺序写入数据库
+        
+        进度事件携带播放状态机，记录 id 在处理时才读取，因此可以紧跟在尚未写入的播放记录之后。
+        """
+        timestamp, event = stamped
+        kind = event[0]
+        run_blocking = self._pipeline.run_blocking
+        if self._journal is not None:
+            saved = await run_blocking(self._write_journal, event, timestamp)
+            if saved is None or saved:
+                await self._saved(saved)
+        elif kind == 'play':
+            _, tracker, media_info = event
+            tracker.record_id = await run_blocking(self.db.save_media_info, media_info, timestamp)
+            await self._saved([media_info] if tracker.record_id else None)
+        elif kind == 'progress':
+            _, tracker, media_info = event
+            await run_blocking(self.db.update_media_progress, media_info, tracker.record_id, timestamp)
+        elif kind == 'skip':
+            await run_blocking(self.db.record_skip, event[1], timestamp)
+        elif kind == 'artwork':
+            await run_blocking(self.db.store_artwork, event[2])
+        elif kind == 'batch':
+            _, new_tracks, progress, skips = event
+            record_ids = await run_blocking(self.db.save_media_batch, [media_info for _, media_info in new_tracks],
+                                            [(tracker.record_id, media_info) for tracker, media_info in progress], skips,
+                                            timestamp)
+            for (tracker, _), record_id in zip(new_tracks, record_ids or []):
+                tracker.record_id = record_id
+            if new_tracks:
+                await self._saved([media_info for _, media_info in new_tracks] if record_ids else None)
+        await self._checkpoint_session(timestamp)
+    
+    def _write_journal(self, event: tuple, timestamp: datetime) -> Optional[list]:
+        """启用事件日志时的持久化（在执行器线程中运行）：追加事件，按间隔同步与合并
+        
+        返回合并时新写入的播放记录（本次未合并时为空列表），合并失败时返回 None。
+        """
+        journal = self._journal
+        kind = event[0]
+        if kind == 'play':
+            _, tracker, media_info = event
+            tracker.journal_seq = journal.append_play(media_info, timestamp)
+        elif kind == 'progress':
+            _, tracker, media_info = event
+            journal.append_progress(tracker.journal_seq, media_info, timestamp)
+        elif kind == 'skip':
+            journal.append_skip(event[1], timestamp)
+        elif kind == 'event':
+            _, name, track, position = event
+            journal.append_event(name, track, position, timestamp)
+        elif kind == 'artwork':
+            # 封面直接写入封面存储（在引用它的播放事件之前），不写入日志
+            self.db.store_artwork(event[2])
+        elif kind == 'batch':
+            _, new_tracks, progress, skips = event
+            for tracker, media_info in new_tracks:
+                tracker.journal_seq = journal.append_play(media_info, timestamp)
+            for tracker, media_info in progress:
+                journal.append_progress(tracker.journal_seq, media_info, timestamp)
+            for track in skips:
+                journal.append_skip(track, timestamp)
+        
+        final = kind == 'flush'
+        journal.sync(force=final)
+        now = self.clock.monotonic()
+        if not final and now - self._compacted_at < config.snapshot.journal_compact_seconds:
+            return []
+        self._compacted_at = now
+        return self.db.compact_journal()
+    
+    async def _journal_event(self, tracker: PlayTracker) -> None:
+        """启用事件日志时记录播放状态机报告的播放事件（开始、暂停、恢复、拖动进度等）"""
+        if self._journal is not None and tracker.event is not None:
+            await self._emit_persist(('event', tracker.event, tracker.track, tracker.latest.position))
+    
+    async def _capture_artwork(self, media_info: MediaInfo) -> MediaInfo:
+        """歌曲计入播放记录时读取封面，交给持久化阶段保存，返回带封面哈希的媒体信息"""
+        if not config.snapshot.capture_artwork:
+            return media_info
+        try:
+            data = await self.source.get_artwork(media_info.app_id)
+        except Exception as e:
+            logger.debug(f"读取封面失败: {e}")
+            return media_info
+        if not data:
+            return media_info
+        digest = artwork_hash(data)
+        await self._emit_persist(('artwork', digest, data))
+        return media_info._replace(artwork=digest)
+    
+    async def _saved(self, saved: Optional[list]) -> None:
+        """播放记录写入后更新会话统计并通知输出和叠加层，saved 为 None 表示写入失败"""
+        if saved is None:
+            await self._pipeline.emit('output', ('failed',))
+            return
+        for media_info in saved:
+            self._tracks_saved += 1
+            self._last_app_name = media_info.app_name
+            await self._pipeline.emit('output', ('saved', media_info))
+            await self._pipeline.emit('overlay', media_info)
+    
+    def _begin_session(self) -> None:
+        """开始会话：结束上次异常退出时遗留的会话，并写入本次会话的检查点行"""
+        recovered = self.db.recover_sessions()
+        if recovered:
+            logger.info(f"已结束 {recovered} 个上次未正常退出的会话")
+        self._session_id = self.db.start_session(self.clock.now())
+        self._checkpoint_at = self.clock.monotonic()
+    
+    async def _checkpoint_session(self, end_time: datetime) -> None:
+        """更新会话检查点（最多每 monitoring.session_checkpoint_seconds 秒一次）"""
+        now = self.clock.monotonic()
+        if self._session_id is None or now - self._checkpoint_at < config.snapshot.session_checkpoint_seconds:
+            return
+        self._checkpoint_at = now
+        await self._pipeline.run_blocking(self.db.checkpoint_session, self._session_id, end_time,
+                                          self._last_app_name or 'Unknown', self._tracks_saved)
+    
+    def _finish_session(self, interrupted: bool, silent_mode: bool) -> None:
+        """监控停止：结束会话（没有播放歌曲的会话不保存）"""
+        if interrupted and not silent_mode:
+            safe_print(f"\n监控已停止")
+        
+        session_id, self._session_id = self._session_id, None
+        if session_id is not None:
+            self.db.finish_session(session_id, self.clock.now(), self._last_app_name or 'Unknown', self._tracks_saved)
+        if self._tracks_saved > 0 and not silent_mode:
+            safe_print(f"本次会话播放了 {self._tracks_saved} 首歌曲")
+    
+    async def _track(self, tracker: Optional[PlayTracker], media_info: MediaInfo) -> PlayTracker:
+        """返回 media_info 所属歌曲的播放状态机，换歌时先结束上一首"""
+        if tracker is not None and tracker.track == media_info.key:
+            return tracker
+        await self._end_tracker(tracker)
+        tracker = PlayTracker(media_info, self.clock)
+        await self._journal_event(tracker)
+        return tracker
+    
+    async def _record_progress(self, tracker: PlayTracker, media_info: MediaInfo) -> None:
+        """把同一歌曲的新进度交给播放状态机，需要时写入进度，达到计入条件时写入播放记录"""
+        progress = tracker.observe(media_info)
+        await self._journal_event(tracker)
+        if progress is not None:
+            await self._emit_persist(('progress', tracker, progress))
+        if not tracker.recorded and tracker.qualified:
+            tracker.record()
+            await self._emit_persist(('play', tracker, await self._capture_artwork(tracker.latest)))
+    
+    async def _pause_tracker(self, tracker: Optional[PlayTracker]) -> None:
+        """播放暂停：写入尚未写入的进度"""
+        if tracker is None:
+            return
+        progress = tracker.pause()
+        await self._journal_event(tracker)
+        if progress is not None:
+            await self._emit_persist(('progress', tracker, progress))
+    
+    async def _end_tracker(self, tracker: Optional[PlayTracker], stopped: bool = False) -> None:
+        """歌曲结束：写入尚未写入的最后进度，未计入的播放记为跳过（监控停止时直接丢弃）"""
+        if tracker is None:
+            return
+        progress = tracker.end()
+        if progress is not None:
+            await self._emit_persist(('progress', tracker, progress))
+        elif not tracker.recorded and not stopped:
+            await self._emit_persist(('skip', tracker.track))
+    
+    @staticmethod
+    def _collect_end(state: Dict[str, Any], progress: list, skips: Optional[list]) -> None:
+        """多会话模式：会话的当前歌曲结束，把尚未写入的最后进度或跳过加入本轮写入（skips 为 None 时丢弃未计入的播放）"""
+        tracker, state['tracker'] = state['tracker'], None
+        if tracker is None:
+            return
+        written = tracker.end()
+        if written is not None:
+            progress.append((tracker, written))
+        elif not tracker.recorded and skips is not None:
+            skips.append(tracker.track)
+    
     async def monitor_media(self, interval: int = None, silent_mode: bool = False) -> None:
-        """监控媒体播放并记录"""
+        """监控媒体播放并记录（未指定 interval 时按配置，配置文件修改后随之更新）"""
+        if config.get("monitoring.multi_session", False):
+            await self.monitor_all_sessions(interval, silent_mode)
+            return
+        fixed_interval = interval is not None
         if interval is None:
             interval = config.get_monitoring_interval()
+        event_driven = config.get("monitoring.event_driven", True)
+        heartbeat = max(interval, config.get("monitoring.heartbeat_interval", 30))
+        scheduler = PollScheduler(interval, self.clock)
             
         if not silent_mode:
             safe_print("开始监控媒体播放...")
@@ -225,111 +515,276 @@ class MediaMonitor:
             safe_print("按 Ctrl+C 停止监控\n")
         
         last_song_info = None
-        session_start = datetime.now()
-        tracks_in_session = 0
+        tracker = None  # 当前歌曲的播放状态机，负责合并进度写入
+        interrupted = False
+        
+        if not self._load_source():
+            return
         
         self.running = True
-        logger.info(f"开始媒体监控，间隔: {interval}秒，静默模式: {silent_mode}")
+        self._begin_session()
+        self._start_pipeline(silent_mode)
+        self._open_wakeup()
+        self._watch_config()
+        logger.info(f"开始媒体监控，间隔: {interval}秒，静默模式: {silent_mode}，事件驱动: {event_driven}")
         
         try:
+            if event_driven:
+                self._start_events()
+
             while self.running:
+                if self._config_changed:
+                    interval, heartbeat = self._apply_config(interval, fixed_interval, [scheduler])
+                
                 # 首先获取基本信息进行快速检测
                 basic_info = await self.get_basic_media_info()
+                status = basic_info.status if basic_info and basic_info.title else None
                 
-                if basic_info and basic_info.get('title'):
-                    current_song_id = f"{basic_info.get('title')}_{basic_info.get('artist')}_{basic_info.get('app_name')}"
-                    last_song_id = f"{last_song_info.get('title', '')}_{last_song_info.get('artist', '')}_{last_song_info.get('app_name', '')}" if last_song_info else ""
-                    
+                if basic_info and basic_info.title:
                     # 检查是否是新歌曲或状态变为播放
-                    song_changed = current_song_id != last_song_id
-                    status_changed_to_playing = (last_song_info and last_song_info.get('status') != 'Playing' and basic_info.get('status') == 'Playing')
+                    song_changed = last_song_info is None or basic_info.key != last_song_info.key
+                    status_changed_to_playing = (last_song_info and last_song_info.status != 'Playing' and status == 'Playing')
                     
-                    if (song_changed and basic_info.get('status') == 'Playing') or status_changed_to_playing:
-                        if not silent_mode and song_changed:
+                    if (song_changed and status == 'Playing') or status_changed_to_playing:
+                        if song_changed:
                             detecting_prefix = "🔍 " if config.should_use_emoji() else ""
-                            safe_print(f"{detecting_prefix}检测到新歌曲，等待2秒获取完整信息...")
+                            await self._print(f"{detecting_prefix}检测到新歌曲，等待完整信息...")
                         
-                        # 如果检测到歌曲变化，等待2秒再获取完整信息
+                        # 获取完整的媒体信息；切歌时应用可能分多次发布元数据，等其稳定后再记录
                         if song_changed:
-                            await asyncio.sleep(2)
-                        
-                        # 获取完整的媒体信息
-                        media_info = await self.get_media_info()
+                            media_info = await self._get_stable_media_info()
+                        else:
+                            media_info = await self.get_media_info()
 
-                        if media_info and media_info.get('title'):
-                            current_time = datetime.now()
-                            self._format_media_output(media_info, current_time, silent_mode)
+                        if media_info and media_info.title:
+                            scheduler.observe(media_info)
+                            await self._show(media_info)
 
-                            # 如果是新歌曲则插入，否则更新进度
-                            if song_changed:
-                                if db.save_media_info(media_info):
-                                    if not silent_mode:
-                                        save_prefix = "✅ " if config.should_use_emoji() else ""
-                                        safe_print(f"  {save_prefix}已保存到数据库")
-                                    tracks_in_session += 1
-                                    # 检查是否之前曾有播放记录，若有则显示叠加层
-                                    try:
-                                        if config.get("display.show_overlay_on_repeat", True):
-                                            history = db.get_track_history(media_info.get('title',''), media_info.get('artist',''), limit=config.get("display.overlay_history_limit", 5))
-                                            # 因为刚插入当前记录，若历史记录>=2则说明之前记录过
-                                            if history and len(history) > 1:
-                                                # 将最近几次（包含本次）传给叠加层显示
-                                                overlay_history = history[:config.get("display.overlay_history_limit", 5)]
-                                                overlay.show(media_info.get('title',''), media_info.get('artist',''), overlay_history, duration=config.get("display.overlay_duration_seconds", 5))
-                                    except Exception as e:
-                                        logger.debug(f"尝试显示叠加层时出错: {e}")
-                                else:
-                                    if not silent_mode:
-                                        warn_prefix = "⚠️ " if config.should_use_emoji() else ""
-                                        safe_print(f"  {warn_prefix}保存到数据库失败")
-                            else:
-                                # 状态从非播放变为播放，也更新进度
-                                if not db.update_media_progress(media_info):
-                                    # 若更新失败则尝试插入
-                                    db.save_media_info(media_info)
+                            # 新歌曲先作为待定播放，达到计入条件后才写入；状态从非播放变为播放时也更新进度
+                            tracker = await self._track(tracker, media_info)
+                            await self._record_progress(tracker, media_info)
 
-                            if not silent_mode:
-                                safe_print("-" * 60)
-                            last_song_info = media_info.copy()
+                            await self._print("-" * 60)
+                            last_song_info = media_info
                         else:
                             # 如果获取完整信息失败，使用基本信息
-                            if not silent_mode:
-                                warning_prefix = "⚠️ " if config.should_use_emoji() else ""
-                                safe_print(f"  {warning_prefix}获取完整信息失败，使用基本信息")
-                            last_song_info = basic_info.copy()
+                            warning_prefix = "⚠️ " if config.should_use_emoji() else ""
+                            await self._print(f"  {warning_prefix}获取完整信息失败，使用基本信息")
+                            last_song_info = basic_info
                     else:
                         # 非歌曲变化场景：只在正在播放时更新进度
-                        if basic_info.get('status') == 'Playing':
+                        if status == 'Playing':
                             media_info = await self.get_media_info()
-                            if media_info and media_info.get('title'):
+                            if media_info and media_info.title:
+                                scheduler.observe(media_info)
                                 # 只在不为静默或配置允许时显示简短进度
-                                if not silent_mode and config.get("display.show_progress", True) and media_info.get('duration'):
-                                    current_time = datetime.now()
-                                    self._format_media_output(media_info, current_time, silent_mode)
+                                if not silent_mode and config.snapshot.show_progress and media_info.duration:
+                                    await self._show(media_info)
 
-                                # 始终更新最近记录的播放进度
-                                db.update_media_progress(media_info)
+                                # 更新最近记录的播放进度（由播放状态机合并写入），达到计入条件时写入播放记录
+                                tracker = await self._track(tracker, media_info)
+                                await self._record_progress(tracker, media_info)
                         else:
-                            # 状态不是Playing时，更新last_song_info的状态但不写数据库
+                            # 状态不是Playing时，更新last_song_info的状态，只写入暂停前尚未写入的进度
                             if last_song_info:
-                                last_song_info['status'] = basic_info.get('status')
+                                last_song_info = last_song_info._replace(status=status)
+                            await self._pause_tracker(tracker)
+                elif tracker is not None:
+                    # 媒体会话消失，写入尚未写入的进度
+                    await self._pause_tracker(tracker)
                         
-                await asyncio.sleep(interval)
+                if not self.running:
+                    break
+                # 按播放状态决定等待时间：空闲、暂停时慢速，接近歌曲结束时快速
+                delay = scheduler.next_delay(status)
+                if event_driven and self.source.events_available():
+                    # 变化由会话事件即时唤醒；未播放时仅以慢速心跳兜底
+                    await self._wait_for_event(delay if status == 'Playing' else max(delay, heartbeat))
+                else:
+                    await self._sleep(delay)
                 
         except KeyboardInterrupt:
-            if not silent_mode:
-                safe_print(f"\n监控已停止")
+            interrupted = True
             
-            # 保存会话信息
-            if tracks_in_session > 0:
-                db.save_session_info(session_start, datetime.now(), 
-                                   last_song_info.get('app_name', 'Unknown') if last_song_info else 'Unknown', 
-                                   tracks_in_session)
-                if not silent_mode:
-                    safe_print(f"本次会话播放了 {tracks_in_session} 首歌曲")
+        finally:
+            self.running = False
+            self._unwatch_config()
+            await self._end_tracker(tracker, stopped=True)
+            # 等待流水线写完已采样的数据后再保存会话信息
+            await self._stop_pipeline()
+            self._finish_session(interrupted, silent_mode)
+            self._stop_events()
+            if self.source is not None:
+                self.source.close()
+            logger.info("媒体监控已停止")
+
+    async def monitor_all_sessions(self, interval: int = None, silent_mode: bool = False) -> None:
+        """同时监控所有媒体会话：按应用分别跟踪播放状态，每轮的数据库写入合并为一个事务"""
+        fixed_interval = interval is not None
+        if interval is None:
+            interval = config.get_monitoring_interval()
+        event_driven = config.get("monitoring.event_driven", True)
+        heartbeat = max(interval, config.get("monitoring.heartbeat_interval", 30))
+        max_wait = config.get("monitoring.metadata_max_wait", 2)
+        grace = config.get("monitoring.session_grace_seconds", 10)
+        
+        if not silent_mode:
+            safe_print("开始监控所有媒体会话...")
+            safe_print("按 Ctrl+C 停止监控\n")
+        
+        if not self._load_source():
+            return
+        
+        # app_id -> 该应用的播放状态：已记录的歌曲、等待元数据稳定的歌曲及轮询调度器
+        sessions: Dict[str, Dict[str, Any]] = {}
+        idle_scheduler = PollScheduler(interval, self.clock)
+        interrupted = False
+        
+        self.running = True
+        self._begin_session()
+        self._start_pipeline(silent_mode)
+        self._open_wakeup()
+        self._watch_config()
+        logger.info(f"开始多会话媒体监控，间隔: {interval}秒，静默模式: {silent_mode}，事件驱动: {event_driven}")
+        
+        try:
+            if event_driven:
+                self._start_events()
             
+            while self.running:
+                if self._config_changed:
+                    schedulers = [idle_scheduler] + [state['scheduler'] for state in sessions.values()]
+                    interval, heartbeat = self._apply_config(interval, fixed_interval, schedulers)
+                    max_wait = config.get("monitoring.metadata_max_wait", 2)
+                    grace = config.get("monitoring.session_grace_seconds", 10)
+                
+                infos = await self.source.get_all_media_info()
+                now = self.clock.monotonic()
+                # 本轮的写入：新计入的播放与进度均为 (播放状态机, 媒体信息)
+                new_tracks, progress, skips = [], [], []
+                detected = []  # 本轮开始播放的新歌曲
+                delays = []
+                
+                active = set()
+                for info in infos:
+                    if not info.title:
+                        continue
+                    app_id = info.app_id
+                    if app_id in active:
+                        # 同一应用的多个会话只跟踪第一个
+                        continue
+                    active.add(app_id)
+                    state = sessions.setdefault(app_id, {
+                        'last': None, 'pending': None, 'tracker': None, 'scheduler': PollScheduler(interval, self.clock),
+                        'missing_since': None
+                    })
+                    state['missing_since'] = None
+                    state['scheduler'].observe(info)
+                    status = info.status
+                    last = state['last']
+                    
+                    if last is not None and info.key == last.key:
+                        state['pending'] = None
+                        tracker = state['tracker']
+                        # 播放中（或从暂停恢复）时由播放状态机决定是否写入进度
+                        written = tracker.observe(info) if status == 'Playing' else tracker.pause()
+                        await self._journal_event(tracker)
+                        if written is not None:
+                            progress.append((tracker, written))
+                        elif not tracker.recorded and tracker.qualified:
+                            # 达到计入条件
+                            tracker.record()
+                            new_tracks.append((tracker, await self._capture_artwork(tracker.latest)))
+                        state['last'] = info
+                        delays.append(state['scheduler'].next_delay(status))
+                        continue
+                    
+                    if status != 'Playing':
+                        # 新歌曲尚未开始播放，暂不记录
+                        state['pending'] = None
+                        delays.append(state['scheduler'].next_delay(status))
+                        continue
+                    
+                    # 新歌曲：与单会话模式相同，等待元数据稳定后作为待定播放跟踪
+                    pending = state['pending']
+                    if pending is None or info.key != pending['info'].key:
+                        state['pending'] = {'info': info, 'since': now, 'stable_since': now, 'delay': STABILIZE_INITIAL_DELAY}
+                        delays.append(STABILIZE_INITIAL_DELAY)
+                        continue
+                    if _stable_fields(info) != _stable_fields(pending['info']):
+                        pending['stable_since'] = now
+                    pending['info'] = info
+                    settled = now - pending['stable_since'] > 0 and (info.complete or now - pending['stable_since'] >= max_wait / 2)
+                    if settled or now - pending['since'] >= max_wait:
+                        self._collect_end(state, progress, skips)
+                        state['tracker'] = tracker = PlayTracker(info, self.clock)
+                        await self._journal_event(tracker)
+                        detected.append(info)
+                        if tracker.qualified:
+                            tracker.record()
+                            new_tracks.append((tracker, await self._capture_artwork(info)))
+                        state['last'] = info
+                        state['pending'] = None
+                        delays.append(state['scheduler'].next_delay(status))
+                    else:
+                        pending['delay'] *= 2
+                        delays.append(min(pending['delay'], max(0.0, max_wait - (now - pending['since']))))
+                
+                # 本轮未读到的应用先暂停跟踪（读取失败或会话短暂消失），
+                # 连续 session_grace_seconds 秒读不到才视为会话已关闭，不再跟踪
+                missing_playing = False
+                for app_id in list(sessions):
+                    if app_id in active:
+                        continue
+                    state = sessions[app_id]
+                    if state['missing_since'] is None:
+                        state['missing_since'] = now
+                        state['pending'] = None
+                        tracker = state['tracker']
+                        if tracker is not None:
+                            written = tracker.pause()
+                            await self._journal_event(tracker)
+                            if written is not None:
+                                progress.append((tracker, written))
+                    if now - state['missing_since'] >= grace:
+                        self._collect_end(sessions.pop(app_id), progress, skips)
+                        continue
+                    last_status = state['last'].status if state['last'] is not None else None
+                    missing_playing = missing_playing or last_status == 'Playing'
+                    delays.append(state['scheduler'].next_delay(last_status))
+                
+                for media_info in detected:
+                    await self._show(media_info)
+                    await self._print("-" * 60)
+                if new_tracks or progress or skips:
+                    await self._emit_persist(('batch', new_tracks, progress, skips))
+                
+                if not self.running:
+                    break
+                delay = min(delays) if delays else idle_scheduler.next_delay(None)
+                # 有会话在播放或等待元数据稳定时按计算的间隔检查，否则依赖事件唤醒
+                busy = missing_playing or any(info.status == 'Playing' for info in infos if info.title)
+                if event_driven and self.source.events_available():
+                    await self._wait_for_event(delay if busy else max(delay, heartbeat))
+                else:
+                    await self._sleep(delay)
+        
+        except KeyboardInterrupt:
+            interrupted = True
+        
         finally:
             self.running = False
+            self._unwatch_config()
+            progress = []
+            for state in sessions.values():
+                self._collect_end(state, progress, None)
+            if progress:
+                await self._emit_persist(('batch', [], progress, []))
+            await self._stop_pipeline()
+            self._finish_session(interrupted, silent_mode)
+            self._stop_events()
+            if self.source is not None:
+                self.source.close()
             logger.info("媒体监控已停止")
 
 # 全局监控器实例
@@ -0,0 +1,32 @@
+"""
+媒体源模块 - 监控循环读取播放信息的来源
+
+SMTC 媒体源依赖 winsdk，仅在实际使用时才导入；脚本化媒体源可在任何平台上回放时间线。
+"""
+from .base import MediaSource
+from .scripted import ScriptedMediaSource
+from .recording import RecordingMediaSource
+from config.config_manager import config
+
+
+def create_media_source(kind: str = None) -> MediaSource:
+    """按配置创建媒体源（monitoring.source: smtc / scripted），配置了 record_file 时同时录制"""
+    kind = kind or config.get("monitoring.source", "smtc")
+    if kind == "scripted":
+        timeline_file = config.get("monitoring.timeline_file", "")
+        if not timeline_file:
+            raise ValueError("使用脚本化媒体源时需要配置 monitoring.timeline_file")
+        source = ScriptedMediaSource.from_file(
+            timeline_file, speed=config.get("monitoring.timeline_speed", 1.0)
+        )
+    elif kind == "smtc":
+        # 延迟导入：缺少 winsdk 时抛出 ImportError
+        from .smtc import SmtcMediaSource
+        source = SmtcMediaSource()
+    else:
+        raise ValueError(f"未知的媒体源: {kind}")
+    
+    record_file = config.get("monitoring.record_file", "")
+    if record_file:
+        source = RecordingMediaSource(source, record_file)
+    return source
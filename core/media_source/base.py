@@ -0,0 +1,56 @@
+"""
+媒体源接口 - 监控循环只通过该接口读取当前播放的媒体
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional
+from core.media_info import MediaInfo
+
+
+class MediaSource(ABC):
+    """媒体源基类（子类必须实现 get_basic_media_info 与 get_media_info）"""
+    
+    def __init__(self):
+        self._notify_callback: Optional[Callable[[str], None]] = None
+    
+    @abstractmethod
+    async def get_basic_media_info(self) -> Optional[MediaInfo]:
+        """获取基本媒体信息（歌名、艺术家、应用、状态），无播放时返回 None"""
+    
+    @abstractmethod
+    async def get_media_info(self) -> Optional[MediaInfo]:
+        """获取完整的媒体信息，无播放时返回 None"""
+    
+    async def get_all_media_info(self) -> List[MediaInfo]:
+        """获取所有媒体会话的完整信息（默认只有当前会话）"""
+        info = await self.get_media_info()
+        return [info] if info else []
+    
+    async def get_artwork(self, app_id: str) -> Optional[bytes]:
+        """获取应用当前播放歌曲的封面图片，没有封面或不支持时返回 None"""
+        return None
+    
+    def call_stats(self) -> List[Dict[str, Any]]:
+        """对外部接口调用的次数、超时与失败统计（不涉及外部调用的媒体源为空）"""
+        return []
+    
+    def start_events(self, notify: Callable[[str], None]) -> None:
+        """开始推送变化事件，notify 可能在任意线程中被调用"""
+        self._notify_callback = notify
+    
+    def stop_events(self) -> None:
+        """停止推送变化事件"""
+        self._notify_callback = None
+    
+    def events_available(self) -> bool:
+        """变化是否能通过事件及时推送（否则监控循环按间隔轮询）"""
+        return False
+    
+    def close(self) -> None:
+        """释放媒体源占用的资源"""
+        pass
+    
+    def _notify(self, reason: str) -> None:
+        """通知监控循环有变化发生"""
+        callback = self._notify_callback
+        if callback is not None:
+            callback(reason)
@@ -0,0 +1,96 @@
+"""
+调用熔断 - 为媒体源的异步调用加上超时，并在连续失败后暂停调用
+
+无响应的播放器可能让 WinRT 异步调用一直不返回，从而卡住整个监控循环。
+每次调用最多等待 monitoring.source_call_timeout 秒；连续失败（超时或出错）
+monitoring.source_failure_threshold 次后熔断，熔断期间直接拒绝调用，
+熔断时长从 BACKOFF_INITIAL_SECONDS 开始每次翻倍，最长 monitoring.source_backoff_max 秒，
+调用成功后恢复。
+"""
+import asyncio
+from typing import Any, Awaitable, Dict
+from config.config_manager import config
+from utils.clock import SystemClock
+from utils.logger import logger
+
+
+# 首次熔断的时长（秒），之后每次翻倍
+BACKOFF_INITIAL_SECONDS = 1
+
+
+class CircuitOpenError(Exception):
+    """熔断期间拒绝调用"""
+
+
+class CircuitBreaker:
+    """一类调用（如会话管理器、某个应用的会话）的超时与熔断状态"""
+    
+    def __init__(self, name: str, clock: SystemClock = None):
+        self.name = name
+        self.clock = clock or SystemClock()
+        self.timeout = config.get("monitoring.source_call_timeout", 2)
+        self.threshold = max(1, config.get("monitoring.source_failure_threshold", 3))
+        self.backoff_max = config.get("monitoring.source_backoff_max", 60)
+        self.calls = 0
+        self.timeouts = 0
+        self.failures = 0  # 出错（不含超时）的次数
+        self.rejected = 0  # 熔断期间被拒绝的次数
+        self.trips = 0  # 熔断的次数
+        self._consecutive = 0
+        self._backoff = BACKOFF_INITIAL_SECONDS
+        self._open_until = None
+    
+    @property
+    def is_open(self) -> bool:
+        """是否处于熔断期间"""
+        return self._open_until is not None and self.clock.monotonic() < self._open_until
+    
+    async def call(self, awaitable: Awaitable) -> Any:
+        """在超时限制内等待调用结果；熔断期间抛出 CircuitOpenError，超时抛出 asyncio.TimeoutError"""
+        if self.is_open:
+            self.rejected += 1
+            close = getattr(awaitable, 'close', None)
+            if close is not None:
+                # 未等待的协程需要关闭，避免警告
+                close()
+            raise CircuitOpenError(f"{self.name} 暂停调用中")
+        self.calls += 1
+        try:
+            result = await asyncio.wait_for(awaitable, self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._failed(f"超过 {self.timeout} 秒未响应")
+            raise
+        except Exception as e:
+            self.failures += 1
+            self._failed(str(e))
+            raise
+        self._succeeded()
+        return result
+    
+    def _failed(self, reason: str) -> None:
+        self._consecutive += 1
+        if self._consecutive < self.threshold:
+            logger.debug(f"{self.name} 调用失败（连续 {self._consecutive} 次）: {reason}")
+            return
+        self.trips += 1
+        self._open_until = self.clock.monotonic() + self._backoff
+        logger.warning(f"{self.name} 连续 {self._consecutive} 次调用失败，暂停 {self._backoff} 秒: {reason}")
+        self._backoff = min(self._backoff * 2, self.backoff_max)
+    
+    def _succeeded(self) -> None:
+        if self._open_until is not None:
+            logger.info(f"{self.name} 已恢复响应")
+        self._consecutive = 0
+        self._backoff = BACKOFF_INITIAL_SECONDS
+        self._open_until = None
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'calls': self.calls,
+            'timeouts': self.timeouts,
+            'failures': self.failures,
+            'rejected': self.rejected,
+            'trips': self.trips,
+        }
@@ -0,0 +1,173 @@
+"""
+录制媒体源 - 包装真实媒体源，把读到的媒体快照的变化写入时间线文件，供脚本化媒体源回放
+
+多会话监控读取的每个应用的快照以 session 字段（应用 ID）分别记录，回放时各会话独立展开。
+"""
+import gzip
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional
+from core.media_info import MediaInfo
+from utils.clock import SystemClock
+from utils.logger import logger
+from .base import MediaSource
+
+
+# 实际进度与按播放时间推算的进度相差超过该秒数时视为拖动，记录新的快照
+SEEK_TOLERANCE_SECONDS = 3
+
+# 只有这些字段的变化才需要记录（进度由回放时按时间推算）
+SNAPSHOT_FIELDS = ('title', 'artist', 'album', 'album_artist', 'track_number',
+                   'genre', 'year', 'app_id', 'status', 'duration')
+
+
+class RecordingMediaSource(MediaSource):
+    """录制媒体快照的媒体源包装"""
+    
+    def __init__(self, inner: MediaSource, path: str, clock: SystemClock = None):
+        super().__init__()
+        self.inner = inner
+        self.path = path
+        self.clock = clock or SystemClock()
+        self._file = None
+        self._started_at = None
+        self._offset = 0.0
+        # 会话名（单会话为 ''，多会话为应用 ID）-> 上一次记录的快照（含 at 与 position）
+        self._last: Dict[str, Dict[str, Any]] = {}
+    
+    async def get_basic_media_info(self) -> Optional[MediaInfo]:
+        info = await self.inner.get_basic_media_info()
+        last = self._last.get('')
+        if not info:
+            self._record_idle('')
+        elif last and info.title == last.get('title') \
+                and info.status != last.get('status'):
+            # 播放状态变化（监控循环暂停期间不读取完整信息）
+            self._write({'status': info.status}, '', position=self._expected_position(''))
+        return info
+    
+    async def get_media_info(self) -> Optional[MediaInfo]:
+        info = await self.inner.get_media_info()
+        if not info:
+            self._record_idle('')
+            return info
+        self._record(info, '')
+        return info
+        
+    async def get_all_media_info(self) -> List[MediaInfo]:
+        infos = await self.inner.get_all_media_info()
+        seen = set()
+        for info in infos:
+            # 与监控循环相同，同一应用只记录第一个会话
+            if not info.title or info.app_id in seen:
+                continue
+            seen.add(info.app_id)
+            self._record(info, info.app_id)
+        for session in list(self._last):
+            if session and session not in seen:
+                self._record_idle(session)
+        return infos
+    
+    async def get_artwork(self, app_id: str) -> Optional[bytes]:
+        return await self.inner.get_artwork(app_id)
+    
+    def call_stats(self) -> List[Dict[str, Any]]:
+        return self.inner.call_stats()
+    
+    def start_events(self, notify: Callable[[str], None]) -> None:
+        super().start_events(notify)
+        self.inner.start_events(notify)
+    
+    def stop_events(self) -> None:
+        self.inner.stop_events()
+        super().stop_events()
+    
+    def events_available(self) -> bool:
+        return self.inner.events_available()
+    
+    def close(self) -> None:
+        """关闭录制文件（再次写入时以追加方式重新打开）"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.inner.close()
+    
+    def _elapsed(self) -> float:
+        """录制开始后经过的秒数"""
+        now = self.clock.monotonic()
+        if self._started_at is None:
+            self._started_at = now
+            self._offset = self._resume_offset()
+        return round(self._offset + now - self._started_at, 3)
+    
+    def _resume_offset(self) -> float:
+        """追加到已有录制文件时，新条目的时间接在文件中最后一个条目之后"""
+        if not os.path.exists(self.path):
+            return 0.0
+        try:
+            opener = gzip.open if self.path.endswith('.gz') else open
+            last_at = 0.0
+            with opener(self.path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        last_at = max(last_at, json.loads(line).get('at', 0))
+            return last_at + 1
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取已有录制文件失败: {e}")
+            return 0.0
+    
+    def _record(self, info: MediaInfo, session: str) -> None:
+        """快照与上次记录的不同（或进度被拖动）时记录"""
+        snapshot = {key: getattr(info, key) for key in SNAPSHOT_FIELDS if getattr(info, key) not in ('', 0)}
+        position = int(info.position or 0)
+        last = self._last.get(session)
+        changed = last is None or any(snapshot.get(key) != last.get(key) for key in SNAPSHOT_FIELDS)
+        if not changed:
+            expected = self._expected_position(session)
+            changed = expected is not None and abs(position - expected) > SEEK_TOLERANCE_SECONDS
+        if changed:
+            self._write(snapshot, session, position=position)
+    
+    def _expected_position(self, session: str) -> Optional[int]:
+        """按会话上次快照推算的当前进度"""
+        last = self._last.get(session)
+        if not last or 'title' not in last:
+            return None
+        position = last.get('position', 0)
+        if last.get('status') == 'Playing':
+            position += self._elapsed() - last['at']
+            if last.get('duration'):
+                # 播放到结尾后进度停在时长处
+                position = min(position, last['duration'])
+        return int(position)
+    
+    def _record_idle(self, session: str) -> None:
+        """记录媒体会话消失"""
+        last = self._last.get(session)
+        if last is not None and 'title' in last:
+            self._write({'idle': True}, session)
+    
+    def _write(self, fields: Dict[str, Any], session: str, position: Optional[int] = None) -> None:
+        """追加一条时间线条目（多会话的条目带 session 字段）"""
+        entry = {'at': self._elapsed()}
+        if session:
+            entry['session'] = session
+        entry.update(fields)
+        if position is not None:
+            entry['position'] = position
+        
+        if 'idle' in entry:
+            self._last[session] = {'at': entry['at']}
+        elif 'title' in entry:
+            self._last[session] = dict(entry)
+        else:
+            self._last[session] = dict(self._last.get(session) or {}, **entry)
+        
+        try:
+            if self._file is None:
+                opener = gzip.open if self.path.endswith('.gz') else open
+                self._file = opener(self.path, 'at', encoding='utf-8')
+            self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._file.flush()
+        except OSError as e:
+            logger.error(f"写入录制文件失败: {e}")
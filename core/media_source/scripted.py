@@ -0,0 +1,188 @@
+"""
+脚本化媒体源 - 按时间线文件回放播放过程，用于在没有 SMTC 的环境中运行监控循环
+
+时间线文件为 JSON：
+{
+  "tracks": [
+    {"at": 0, "title": "歌曲", "artist": "艺术家", "album": "专辑", "app_id": "Spotify.exe", "duration": 200},
+    {"at": 120, "status": "Paused"},
+    {"at": 150, "status": "Playing"},
+    {"at": 230, "idle": true}
+  ]
+}
+at 为相对开始的秒数；带 title 的条目表示切换到新歌曲（进度从 position 或 0 开始），
+其余条目只修改给出的字段；idle 表示此时没有任何媒体会话。
+带 title 的条目可带 artwork 字段（封面图片文件的路径）。
+条目可带 session 字段模拟多个同时存在的媒体会话，各会话的条目独立展开；
+当前会话为最近发生变化的会话。
+也可以是每行一个条目的 JSON Lines 文件（录制文件即为此格式），文件名以 .gz 结尾时按 gzip 读取。
+"""
+import gzip
+import json
+from typing import Any, Callable, Dict, List, Optional
+from config.config_manager import config
+from core.media_info import MediaInfo
+from utils.clock import SystemClock
+from .base import MediaSource
+
+
+class ScriptedMediaSource(MediaSource):
+    """按时间线回放的媒体源"""
+    
+    def __init__(self, timeline: List[Dict[str, Any]], speed: float = 1.0, clock: SystemClock = None):
+        super().__init__()
+        self.speed = speed
+        self.clock = clock or SystemClock()
+        grouped = {}
+        for entry in timeline:
+            grouped.setdefault(entry.get('session', ''), []).append(entry)
+        self._sessions = {name: self._resolve(entries) for name, entries in grouped.items()}
+        self._change_points = sorted(state['at'] for states in self._sessions.values() for state in states)
+        self._started_at = None
+        self._timers = []
+    
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "ScriptedMediaSource":
+        """从时间线文件（JSON 或 JSON Lines，可 gzip 压缩）创建媒体源"""
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            content = f.read()
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError:
+            data = [json.loads(line) for line in content.splitlines() if line.strip()]
+        if isinstance(data, dict):
+            data = data.get("tracks", [])
+        return cls(data, **kwargs)
+    
+    @staticmethod
+    def _resolve(timeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """把增量条目展开为每个时间点的完整状态，并计算各时间点的播放进度"""
+        states = []
+        current = {}
+        for entry in sorted(timeline, key=lambda e: e.get('at', 0)):
+            at = float(entry.get('at', 0))
+            if entry.get('idle'):
+                current = {}
+            else:
+                if 'title' in entry:
+                    base = {'status': 'Playing', 'position': 0}
+                else:
+                    # 沿用上一状态，进度推进到当前时间点
+                    base = dict(current)
+                    if base:
+                        base['position'] = ScriptedMediaSource._position_at(states[-1], at)
+                base.update({k: v for k, v in entry.items() if k not in ('at', 'idle', 'session')})
+                current = base
+            states.append(dict(current, at=at) if current else {'at': at})
+        return states
+    
+    @staticmethod
+    def _position_at(state: Dict[str, Any], at: float) -> int:
+        """某状态在时间点 at 的播放进度（秒）"""
+        position = state.get('position', 0)
+        if state.get('status') == 'Playing':
+            position += at - state['at']
+        duration = state.get('duration')
+        if duration:
+            position = min(position, duration)
+        return int(position)
+    
+    def elapsed(self) -> float:
+        """时间线上已经过的秒数（首次查询时开始计时）"""
+        now = self.clock.monotonic()
+        if self._started_at is None:
+            self._started_at = now
+        return (now - self._started_at) * self.speed
+    
+    def duration(self) -> float:
+        """时间线总长度（秒）"""
+        return self._change_points[-1] if self._change_points else 0.0
+    
+    def finished(self) -> bool:
+        """时间线是否已回放完毕"""
+        return self.elapsed() >= self.duration()
+    
+    def _active_states(self) -> List[Dict[str, Any]]:
+        """各会话在当前时间点的状态（不含没有媒体的会话），按最近变化时间升序"""
+        now = self.elapsed()
+        active = []
+        for states in self._sessions.values():
+            state = None
+            for candidate in states:
+                if candidate['at'] > now:
+                    break
+                state = candidate
+            if state and 'title' in state:
+                active.append(dict(state, position=self._position_at(state, now)))
+        active.sort(key=lambda s: s['at'])
+        return active
+    
+    async def get_basic_media_info(self) -> Optional[MediaInfo]:
+        """获取基本媒体信息（读取完整信息没有额外开销，直接返回完整信息）"""
+        return await self.get_media_info()
+    
+    async def get_media_info(self) -> Optional[MediaInfo]:
+        """获取当前会话的完整媒体信息"""
+        active = self._active_states()
+        return self._media_info(active[-1]) if active else None
+        
+    async def get_all_media_info(self) -> List[MediaInfo]:
+        """获取所有会话的完整媒体信息"""
+        return [info for info in map(self._media_info, self._active_states()) if info]
+    
+    async def get_artwork(self, app_id: str) -> Optional[bytes]:
+        """读取应用当前歌曲的封面图片文件"""
+        for state in reversed(self._active_states()):
+            if (state.get('app_id') or 'Unknown') == app_id:
+                path = state.get('artwork')
+                if not path:
+                    return None
+                try:
+                    with open(path, 'rb') as f:
+                        return f.read()
+                except OSError:
+                    return None
+        return None
+    
+    @staticmethod
+    def _media_info(state: Dict[str, Any]) -> Optional[MediaInfo]:
+        """把时间线状态转换为媒体信息，被忽略的应用返回 None"""
+        app_id = state.get('app_id') or 'Unknown'
+        if config.is_app_ignored(app_id):
+            return None
+        
+        return MediaInfo(
+            title=state.get('title', ''),
+            artist=state.get('artist', ''),
+            album=state.get('album', ''),
+            album_artist=state.get('album_artist', ''),
+            track_number=state.get('track_number', 0),
+            genre=state.get('genre', ''),
+            year=state.get('year', 0),
+            app_id=app_id,
+            app_name=config.get_app_name(app_id),
+            status=state.get('status', 'Playing'),
+            duration=int(state.get('duration', 0)),
+            position=state['position']
+        )
+    
+    def start_events(self, notify: Callable[[str], None]) -> None:
+        """在时间线的每个变化点推送事件"""
+        super().start_events(notify)
+        now = self.elapsed()
+        for at in self._change_points:
+            if at > now:
+                delay = (at - now) / self.speed
+                self._timers.append(self.clock.call_later(delay, self._notify, "media"))
+    
+    def stop_events(self) -> None:
+        """取消尚未触发的事件"""
+        for timer in self._timers:
+            timer.cancel()
+        self._timers = []
+        super().stop_events()
+    
+    def events_available(self) -> bool:
+        """时间线的变化点都会推送事件"""
+        return self._notify_callback is not None
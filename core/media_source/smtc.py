@@ -0,0 +1,371 @@
+"""
+Windows 系统媒体传输控制（SMTC）媒体源
+"""
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+from config.config_manager import config
+from core.media_info import MediaInfo
+from utils.logger import logger
+from .base import MediaSource
+from .breaker import CircuitBreaker, CircuitOpenError
+
+import winsdk.windows.media.control as wmc
+from winsdk.windows.storage.streams import Buffer, InputStreamOptions
+
+
+# SMTC 播放状态枚举值对应的状态名
+PLAYBACK_STATUS = {
+    0: 'Closed',
+    1: 'Opened',
+    2: 'Changing',
+    3: 'Stopped',
+    4: 'Playing',
+    5: 'Paused'
+}
+
+# 封面图片的最大字节数，超过时不读取
+MAX_ARTWORK_BYTES = 8 * 1024 * 1024
+
+
+class SmtcMediaSource(MediaSource):
+    """通过 SMTC 读取当前会话的媒体源"""
+    
+    def __init__(self):
+        super().__init__()
+        self.current_session = None
+        self.sessions = []
+        # 会话管理器只请求一次，当前会话与会话列表缓存到系统通知会话变化为止
+        self._sessions_manager = None
+        self._session_tokens = None
+        self._session_stale = True
+        self._sessions_stale = True
+        self._watched = []  # [(会话, 事件订阅令牌)]
+        self._watch_failed = False
+        # 异步调用的超时与熔断：会话管理器一个，每个应用的会话各一个
+        self._manager_breaker = CircuitBreaker("SMTC 会话管理器")
+        self._session_breakers: Dict[str, CircuitBreaker] = {}
+    
+    async def _get_sessions_manager(self):
+        """获取会话管理器（仅首次或失效后重新请求）"""
+        if self._sessions_manager is None:
+            manager = await self._manager_breaker.call(
+                wmc.GlobalSystemMediaTransportControlsSessionManager.request_async()
+            )
+            try:
+                self._session_tokens = (
+                    manager.add_current_session_changed(self._on_sessions_changed),
+                    manager.add_sessions_changed(self._on_sessions_changed),
+                )
+            except Exception as e:
+                # 无法订阅通知时不缓存会话，每次都重新获取
+                logger.debug(f"订阅会话变化通知失败: {e}")
+                self._session_tokens = None
+            self._sessions_manager = manager
+            self._session_stale = True
+            self._sessions_stale = True
+        return self._sessions_manager
+    
+    def _session_breaker(self, session) -> CircuitBreaker:
+        """会话所属应用的熔断状态（同一应用无响应时不影响其他应用）"""
+        try:
+            app_id = session.source_app_user_model_id or 'Unknown'
+        except Exception:
+            app_id = 'Unknown'
+        breaker = self._session_breakers.get(app_id)
+        if breaker is None:
+            breaker = self._session_breakers[app_id] = CircuitBreaker(f"媒体会话 {app_id}")
+        return breaker
+    
+    async def _get_media_properties(self, session):
+        """在超时限制内读取会话的媒体属性"""
+        return await self._session_breaker(session).call(session.try_get_media_properties_async())
+    
+    def _on_sessions_changed(self, sender, args) -> None:
+        """会话变化通知（在系统线程中回调），下次使用时重新获取当前会话与会话列表"""
+        self._session_stale = True
+        self._sessions_stale = True
+        self._notify("session")
+    
+    def _on_session_updated(self, sender, args) -> None:
+        """已订阅会话的媒体属性或播放状态变化通知（在系统线程中回调）"""
+        self._notify("media")
+    
+    async def _get_current_session(self):
+        """获取当前会话，未收到变化通知时直接使用缓存"""
+        manager = await self._get_sessions_manager()
+        if self._session_stale or self._session_tokens is None:
+            # 先清除标记再获取，获取期间到达的通知不会丢失
+            self._session_stale = False
+            self.current_session = manager.get_current_session()
+            if self._notify_callback is not None:
+                self._watch_sessions([self.current_session] if self.current_session else [])
+        return self.current_session
+    
+    async def _get_sessions(self) -> list:
+        """获取所有媒体会话，未收到变化通知时直接使用缓存"""
+        manager = await self._get_sessions_manager()
+        if self._sessions_stale or self._session_tokens is None:
+            self._sessions_stale = False
+            self.sessions = list(manager.get_sessions())
+            if self._notify_callback is not None:
+                self._watch_sessions(self.sessions)
+        return self.sessions
+    
+    def _watch_sessions(self, sessions) -> None:
+        """订阅会话的媒体属性与播放状态变化事件（取代之前的订阅）"""
+        self._unwatch_sessions()
+        for session in sessions:
+            try:
+                tokens = (
+                    session.add_media_properties_changed(self._on_session_updated),
+                    session.add_playback_info_changed(self._on_session_updated),
+                )
+                self._watched.append((session, tokens))
+            except Exception as e:
+                logger.debug(f"订阅会话事件失败: {e}")
+                self._watch_failed = True
+    
+    def _unwatch_sessions(self) -> None:
+        """取消之前的会话事件订阅"""
+        watched, self._watched = self._watched, []
+        self._watch_failed = False
+        for session, tokens in watched:
+            try:
+                session.remove_media_properties_changed(tokens[0])
+                session.remove_playback_info_changed(tokens[1])
+            except Exception:
+                pass
+    
+    def start_events(self, notify: Callable[[str], None]) -> None:
+        """开始推送事件，下次获取会话时订阅其事件"""
+        super().start_events(notify)
+        self._session_stale = True
+        self._sessions_stale = True
+    
+    def stop_events(self) -> None:
+        """停止推送事件并取消会话事件订阅"""
+        self._unwatch_sessions()
+        super().stop_events()
+    
+    def events_available(self) -> bool:
+        """会话变化与已获取会话的事件是否都已订阅成功"""
+        return bool(self._session_tokens) and not self._watch_failed
+    
+    def _reset_sessions_manager(self) -> None:
+        """WinRT 调用失败时丢弃缓存，下次重新请求会话管理器"""
+        manager, tokens = self._sessions_manager, self._session_tokens
+        self._sessions_manager = None
+        self._session_tokens = None
+        self.current_session = None
+        self.sessions = []
+        self._session_stale = True
+        self._sessions_stale = True
+        self._unwatch_sessions()
+        if manager is not None and tokens:
+            try:
+                manager.remove_current_session_changed(tokens[0])
+                manager.remove_sessions_changed(tokens[1])
+            except Exception:
+                pass
+    
+    def call_stats(self) -> List[Dict[str, Any]]:
+        """各类异步调用的次数、超时、失败与熔断统计"""
+        return [self._manager_breaker.as_dict()] + [breaker.as_dict() for breaker in self._session_breakers.values()]
+    
+    def close(self) -> None:
+        """记录异步调用的统计"""
+        for stats in self.call_stats():
+            if stats['timeouts'] or stats['failures']:
+                logger.info(f"{stats['name']}: 调用 {stats['calls']} 次，超时 {stats['timeouts']} 次，"
+                            f"失败 {stats['failures']} 次，熔断 {stats['trips']} 次，拒绝 {stats['rejected']} 次")
+    
+    async def get_basic_media_info(self) -> Optional[MediaInfo]:
+        """获取基本媒体信息（仅歌名和艺术家，用于快速检测变化）"""
+        try:
+            current_session = await self._get_current_session()
+            
+            if current_session is None:
+                return None
+            
+            # 获取基本媒体属性
+            try:
+                media_properties = await self._get_media_properties(current_session)
+                playback_info = current_session.get_playback_info()
+            except Exception as e:
+                logger.debug(f"获取基本媒体属性失败: {e}")
+                # 缓存的会话可能已失效
+                self._session_stale = True
+                return None
+            
+            if not media_properties:
+                return None
+            
+            # 获取应用信息
+            try:
+                app_id = current_session.source_app_user_model_id or 'Unknown'
+                app_name = config.get_app_name(app_id)
+                
+                # 检查是否忽略此应用
+                if config.is_app_ignored(app_id):
+                    return None
+            except Exception as e:
+                logger.debug(f"获取应用信息失败: {e}")
+                app_name = 'Unknown'
+            
+            # 获取播放状态
+            status = PLAYBACK_STATUS.get(playback_info.playback_status if playback_info else 0, 'Unknown')
+            
+            return MediaInfo(
+                title=media_properties.title or '',
+                artist=media_properties.artist or '',
+                app_name=app_name,
+                status=status
+            )
+        
+        except CircuitOpenError:
+            # 会话管理器暂停请求中
+            return None
+        except Exception as e:
+            logger.error(f"获取基本媒体信息时出错: {e}")
+            self._reset_sessions_manager()
+            return None
+    
+    async def get_media_info(self) -> Optional[MediaInfo]:
+        """获取完整的媒体信息"""
+        try:
+            current_session = await self._get_current_session()
+            
+            if current_session is None:
+                return None
+            
+            return await self._read_session(current_session)
+        
+        except CircuitOpenError:
+            return None
+        except Exception as e:
+            logger.error(f"获取媒体信息时出错: {e}")
+            self._reset_sessions_manager()
+            return None
+
+    async def get_all_media_info(self) -> List[MediaInfo]:
+        """并发读取所有媒体会话的完整信息"""
+        try:
+            sessions = await self._get_sessions()
+            results = await asyncio.gather(
+                *(self._read_session(session) for session in sessions), return_exceptions=True
+            )
+        except CircuitOpenError:
+            return []
+        except Exception as e:
+            logger.error(f"获取媒体会话列表时出错: {e}")
+            self._reset_sessions_manager()
+            return []
+        
+        infos = []
+        for result in results:
+            if isinstance(result, Exception):
+                logger.debug(f"读取媒体会话失败: {result}")
+                self._sessions_stale = True
+            elif result:
+                infos.append(result)
+        return infos
+    
+    async def get_artwork(self, app_id: str) -> Optional[bytes]:
+        """读取应用会话的封面缩略图（只在歌曲计入播放记录时读取一次）"""
+        try:
+            sessions = [self.current_session] + list(self.sessions)
+            session = next((s for s in sessions if s is not None and s.source_app_user_model_id == app_id), None)
+            if session is None:
+                return None
+            media_properties = await self._get_media_properties(session)
+            thumbnail = media_properties.thumbnail if media_properties else None
+            if thumbnail is None:
+                return None
+            breaker = self._session_breaker(session)
+            stream = await breaker.call(thumbnail.open_read_async())
+            try:
+                size = stream.size
+                if not size or size > MAX_ARTWORK_BYTES:
+                    return None
+                buffer = Buffer(size)
+                await breaker.call(stream.read_async(buffer, size, InputStreamOptions.READ_AHEAD))
+                return bytes(buffer)
+            finally:
+                stream.close()
+        except CircuitOpenError:
+            return None
+        except Exception as e:
+            logger.debug(f"读取封面失败: {e}")
+            return None
+    
+    async def _read_session(self, session) -> Optional[MediaInfo]:
+        """读取单个会话的完整媒体信息，被忽略的应用返回 None"""
+        # 获取媒体属性
+        try:
+            media_properties = await self._get_media_properties(session)
+        except Exception as e:
+            logger.debug(f"获取媒体属性失败: {e}")
+            # 缓存的会话可能已失效
+            self._session_stale = True
+            self._sessions_stale = True
+            media_properties = None
+        
+        # 获取播放信息
+        try:
+            playback_info = session.get_playback_info()
+            timeline_info = session.get_timeline_properties()
+        except Exception as e:
+            logger.debug(f"获取播放信息失败: {e}")
+            playback_info = None
+            timeline_info = None
+        
+        # 获取应用信息
+        try:
+            app_id = session.source_app_user_model_id or 'Unknown'
+            app_name = config.get_app_name(app_id)
+            
+            # 检查是否忽略此应用
+            if config.is_app_ignored(app_id):
+                return None
+        
+        except Exception as e:
+            logger.debug(f"获取应用信息失败: {e}")
+            app_name = 'Unknown'
+            app_id = 'Unknown'
+        
+        status = PLAYBACK_STATUS.get(playback_info.playback_status, 'Unknown') if playback_info else 'Unknown'
+
+        duration = position = 0
+        if timeline_info:
+            try:
+                duration = int(timeline_info.end_time.total_seconds()) if timeline_info.end_time else 0
+                position = int(timeline_info.position.total_seconds()) if timeline_info.position else 0
+            except:
+                duration = position = 0
+        
+        if not media_properties:
+            # 读不到媒体属性时只保留播放状态与进度
+            return MediaInfo(app_id=app_id, app_name=app_name, status=status, duration=duration, position=position)
+        
+        # 尝试获取年份
+        year = 0
+        try:
+            if hasattr(media_properties, 'year') and media_properties.year:
+                year = media_properties.year
+        except:
+            pass
+        
+        return MediaInfo(
+            title=media_properties.title or '',
+            artist=media_properties.artist or '',
+            album=media_properties.album_title or '',
+            album_artist=media_properties.album_artist or '',
+            track_number=media_properties.track_number or 0,
+            genre=getattr(media_properties, 'genres', [None])[0] if hasattr(media_properties, 'genres') and media_properties.genres else '',
+            year=year,
+            app_id=app_id,
+            app_name=app_name,
+            status=status,
+            duration=duration,
+            position=position
+        )
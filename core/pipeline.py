@@ -0,0 +1,126 @@
+"""
+监控流水线 - 把媒体采样与持久化、控制台输出、叠加层解耦
+
+监控循环（采样方）只负责读取媒体信息并决定要做什么，把事件放入各阶段的有界队列，
+每个阶段由独立的消费任务按顺序处理。阻塞的数据库操作在单线程执行器中运行，
+因此磁盘缓慢或数据库被长时间的统计查询锁住时不会拖住下一次采样。
+不可丢失的阶段（持久化）队列满时采样方等待（背压），可丢失的阶段（输出、叠加层）队列满时丢弃事件。
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List
+from utils.logger import logger
+
+
+class StageStats:
+    """阶段队列的背压统计"""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.blocked = 0  # 队列满时采样方等待的次数
+        self.blocked_seconds = 0.0
+        self.high_water = 0  # 队列的最大深度
+        self.errors = 0
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'enqueued': self.enqueued,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'blocked': self.blocked,
+            'blocked_seconds': self.blocked_seconds,
+            'high_water': self.high_water,
+            'errors': self.errors,
+        }
+
+
+class _Stage:
+    """一个阶段：有界队列与消费任务"""
+    
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[None]], maxsize: int, lossy: bool):
+        self.handler = handler
+        self.lossy = lossy
+        self.queue = asyncio.Queue(maxsize)
+        self.stats = StageStats(name)
+        self.task = None
+    
+    async def put(self, event) -> None:
+        stats = self.stats
+        if self.queue.full():
+            if self.lossy:
+                stats.dropped += 1
+                return
+            stats.blocked += 1
+            started = time.perf_counter()
+            await self.queue.put(event)
+            stats.blocked_seconds += time.perf_counter() - started
+        else:
+            self.queue.put_nowait(event)
+        stats.enqueued += 1
+        stats.high_water = max(stats.high_water, self.queue.qsize())
+    
+    async def run(self) -> None:
+        while True:
+            event = await self.queue.get()
+            try:
+                await self.handler(event)
+            except Exception as e:
+                self.stats.errors += 1
+                logger.error(f"处理{self.stats.name}事件失败: {e}")
+            finally:
+                self.stats.processed += 1
+                self.queue.task_done()
+
+
+class MonitorPipeline:
+    """监控流水线"""
+    
+    def __init__(self):
+        self._stages: Dict[str, _Stage] = {}
+        self._executor = None
+    
+    def add_stage(self, name: str, handler: Callable[[Any], Awaitable[None]], maxsize: int = 100,
+                  lossy: bool = False) -> None:
+        """添加阶段，阶段按添加顺序排空"""
+        self._stages[name] = _Stage(name, handler, maxsize, lossy)
+    
+    def has_stage(self, name: str) -> bool:
+        return name in self._stages
+    
+    def start(self) -> None:
+        """启动各阶段的消费任务"""
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="monitor-db")
+        for stage in self._stages.values():
+            stage.task = asyncio.get_running_loop().create_task(stage.run())
+    
+    async def emit(self, name: str, event) -> None:
+        """把事件放入阶段队列（未添加的阶段直接忽略）"""
+        stage = self._stages.get(name)
+        if stage is not None:
+            await stage.put(event)
+    
+    async def run_blocking(self, func: Callable, *args):
+        """在执行器线程中运行阻塞操作（数据库操作按提交顺序依次执行）"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+    
+    async def close(self) -> None:
+        """处理完所有已放入的事件后停止消费任务"""
+        for stage in self._stages.values():
+            if stage.task is not None:
+                await stage.queue.join()
+        for stage in self._stages.values():
+            if stage.task is not None:
+                stage.task.cancel()
+                stage.task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+    
+    def stats(self) -> List[Dict[str, Any]]:
+        """各阶段的背压统计"""
+        return [stage.stats.as_dict() for stage in self._stages.values()]
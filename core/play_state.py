@@ -0,0 +1,165 @@
+"""
+播放状态机 - 在内存中跟踪当前歌曲的播放，决定何时计入播放记录以及何时写入播放进度
+
+状态：started（开始播放）→ progressing（播放中）⇄ paused（暂停）→ finished（播放完毕）/ skipped（未播完被切走）
+新歌曲先作为待定播放保存在内存中，累计播放时间达到计入条件（PlayQualification）后才写入播放记录；
+未达到条件就被切走的歌曲只在跳过计数中加一。
+已计入的播放只有状态变化、进度变化达到 progress_min_delta 个百分点、或距上次写入超过
+progress_checkpoint_seconds 秒时才写入进度；歌曲切换或监控停止时写入尚未写入的最后进度，
+因此记录的最终结果与每次轮询都写入时相同。
+"""
+from typing import Optional
+from config.config_manager import config
+from core.media_info import MediaInfo, TrackKey
+from utils.clock import SystemClock
+
+
+STARTED = 'started'
+PROGRESSING = 'progressing'
+PAUSED = 'paused'
+FINISHED = 'finished'
+SKIPPED = 'skipped'
+
+# 播放进度达到该百分比视为播放完毕
+FINISHED_PERCENTAGE = 95
+
+# 播放事件（写入事件日志，供之后分析）
+EVENT_START = 'start'
+EVENT_PAUSE = 'pause'
+EVENT_RESUME = 'resume'
+EVENT_SEEK = 'seek'
+EVENT_FINISH = 'finish'
+
+# 进度与按播放时间推算的进度相差超过该秒数视为拖动了进度
+SEEK_TOLERANCE_SECONDS = 5
+
+
+class PlayQualification:
+    """计入播放记录的条件：累计播放时间达到歌曲时长的 percentage% 或 seconds 秒（任一满足即可）
+    
+    两者任一设为 0 时开始播放即计入；歌曲时长未知时只按秒数判断。
+    """
+    
+    def __init__(self, percentage: float = None, seconds: float = None):
+        self.percentage = config.get("monitoring.qualify_percentage", 50) if percentage is None else percentage
+        self.seconds = config.get("monitoring.qualify_seconds", 240) if seconds is None else seconds
+    
+    def is_met(self, listened: float, duration: int) -> bool:
+        """累计播放 listened 秒、时长为 duration 秒的歌曲是否计入播放记录"""
+        if self.percentage <= 0 or listened >= self.seconds:
+            return True
+        return duration > 0 and listened >= duration * self.percentage / 100
+
+
+class PlayTracker:
+    """单个媒体会话中当前歌曲的播放状态"""
+    
+    def __init__(self, media_info: MediaInfo, clock: SystemClock = None, qualification: PlayQualification = None):
+        self.clock = clock or SystemClock()
+        self.qualification = qualification or PlayQualification()
+        self.track: TrackKey = media_info.key
+        self.recorded = False  # 是否已计入播放记录
+        self.record_id: Optional[int] = None  # 播放记录的 id，由写入数据库的一方在写入后设置
+        self.state = STARTED
+        self.latest = media_info  # 最近一次读到的进度
+        self.listened = 0.0  # 累计播放秒数
+        self.min_delta = config.get("monitoring.progress_min_delta", 10)
+        self.checkpoint_seconds = config.get("monitoring.progress_checkpoint_seconds", 60)
+        self.journal_seq: Optional[int] = None  # 启用事件日志时播放事件的序号
+        self.event: Optional[str] = EVENT_START  # 最近一次读取进度时发生的播放事件
+        self._observed_at = self.clock.monotonic()
+        # 最近一次进度变化时的进度与累计播放秒数，用于识别拖动进度
+        # （部分应用只在状态变化时更新进度，因此不能按两次读取的间隔推算）
+        self._anchor_position = media_info.position
+        self._anchor_listened = 0.0
+        self._written = None  # 最近一次写入数据库的进度
+        self._written_at = 0.0
+        self._pending = None  # 尚未写入的最新进度
+    
+    @property
+    def qualified(self) -> bool:
+        """是否已达到计入播放记录的条件"""
+        return self.qualification.is_met(self.listened, self.latest.duration)
+    
+    def record(self) -> None:
+        """播放按最近一次读到的进度计入播放记录（之后的进度从此开始合并写入）"""
+        self.recorded = True
+        self._written = self.latest
+        self._written_at = self.clock.monotonic()
+        self._pending = None
+    
+    def observe(self, media_info: MediaInfo) -> Optional[MediaInfo]:
+        """记录同一歌曲的新进度，需要写入数据库时返回要写入的进度"""
+        now = self.clock.monotonic()
+        if self.state != PAUSED and media_info.status == 'Playing':
+            self.listened += now - self._observed_at
+        self._observed_at = now
+        
+        if media_info.status != 'Playing':
+            state = PAUSED
+        elif media_info.percentage >= FINISHED_PERCENTAGE:
+            state = FINISHED
+        else:
+            state = PROGRESSING
+        self.event = self._event(state, media_info)
+        self.latest = media_info
+        # 开始播放后进入播放中不算状态变化（计入时已写入）
+        transition = state != self.state and not (self.state == STARTED and state == PROGRESSING)
+        self.state = state
+        
+        if not self.recorded:
+            # 尚未计入播放记录，没有可更新的记录
+            return None
+        written = self._written
+        if media_info.position == written.position and media_info.status == written.status:
+            self._pending = None
+            return None
+        if transition \
+                or abs(media_info.percentage - written.percentage) >= self.min_delta \
+                or now - self._written_at >= self.checkpoint_seconds:
+            return self._write(media_info)
+        self._pending = media_info
+        return None
+    
+    def _event(self, state: str, media_info: MediaInfo) -> Optional[str]:
+        """本次读取进度时发生的播放事件"""
+        if media_info.position != self.latest.position:
+            expected = self._anchor_position + self.listened - self._anchor_listened
+            seeked = abs(media_info.position - expected) > SEEK_TOLERANCE_SECONDS
+            self._anchor_position = media_info.position
+            self._anchor_listened = self.listened
+        else:
+            seeked = False
+        if state == PAUSED:
+            return EVENT_PAUSE if self.state != PAUSED else None
+        if self.state == PAUSED:
+            return EVENT_RESUME
+        if state == FINISHED and self.state != FINISHED:
+            return EVENT_FINISH
+        return EVENT_SEEK if seeked else None
+    
+    def pause(self) -> Optional[MediaInfo]:
+        """播放暂停或停止（此时不读取进度），返回尚未写入的最后进度"""
+        self.event = EVENT_PAUSE if self.state != PAUSED else None
+        self.state = PAUSED
+        return self.flush()
+    
+    def end(self) -> Optional[MediaInfo]:
+        """歌曲被切换或会话结束，返回尚未写入的最后进度"""
+        if not self.recorded or self.latest.percentage < FINISHED_PERCENTAGE:
+            self.state = SKIPPED
+        else:
+            self.state = FINISHED
+        return self.flush()
+    
+    def flush(self) -> Optional[MediaInfo]:
+        """返回尚未写入的最新进度（并视为已写入）"""
+        if self._pending is None:
+            return None
+        return self._write(self._pending)
+    
+    def _write(self, media_info: MediaInfo) -> MediaInfo:
+        self._written = media_info
+        self._written_at = self.clock.monotonic()
+        self._pending = None
+        return media_info
@@ -0,0 +1,61 @@
+"""
+自适应轮询调度 - 根据播放状态决定监控循环下一次检查前的等待时间
+
+空闲和暂停时慢速轮询，播放时按监控间隔轮询，接近预计的歌曲结束时间时快速轮询以及时发现切歌。
+"""
+from typing import Optional
+from config.config_manager import config
+from core.media_info import MediaInfo
+from utils.clock import SystemClock
+
+
+class PollScheduler:
+    """按播放状态计算轮询间隔"""
+    
+    def __init__(self, playing_interval: float, clock: SystemClock = None):
+        self.clock = clock or SystemClock()
+        self.configure(playing_interval)
+        self._position = None
+        self._duration = 0
+        self._sampled_at = None
+    
+    def configure(self, playing_interval: float) -> None:
+        """按监控间隔与当前配置计算各状态的轮询间隔（配置重新加载后再次调用）"""
+        self.playing_interval = playing_interval
+        self.idle_interval = max(playing_interval, config.get("monitoring.idle_interval", 30))
+        self.paused_interval = max(playing_interval, config.get("monitoring.paused_interval", 15))
+        self.track_end_window = config.get("monitoring.track_end_window", 10)
+        self.track_end_interval = min(playing_interval, config.get("monitoring.track_end_interval", 1))
+    
+    def observe(self, media_info: MediaInfo) -> None:
+        """记录最近一次读到的播放进度，用于预测歌曲结束时间"""
+        duration = media_info.duration
+        if duration > 0:
+            self._position = media_info.position
+            self._duration = duration
+            self._sampled_at = self.clock.monotonic()
+        else:
+            self._position = None
+    
+    def remaining(self) -> Optional[float]:
+        """按播放时间推算的当前歌曲剩余秒数，未知时返回 None"""
+        if self._position is None:
+            return None
+        elapsed = self.clock.monotonic() - self._sampled_at
+        return self._duration - self._position - elapsed
+    
+    def next_delay(self, status: Optional[str]) -> float:
+        """下一次轮询前的等待秒数，status 为 None 表示没有媒体会话"""
+        if not status:
+            return self.idle_interval
+        if status != 'Playing':
+            return self.paused_interval
+        
+        remaining = self.remaining()
+        if remaining is None or remaining < -self.track_end_window:
+            # 进度未知，或已远超预计结束时间（进度信息不可靠）
+            return self.playing_interval
+        if remaining <= self.track_end_window:
+            return self.track_end_interval
+        # 正常轮询，但不越过预计结束前的快速轮询窗口
+        return max(self.track_end_interval, min(self.playing_interval, remaining - self.track_end_window))
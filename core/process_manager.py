@@ -2,10 +2,22 @@ import os
 import sys
 import time
 import subprocess
+from config.config_manager import config
 from utils.system_utils import get_executable_dir, get_pid_file_path, is_process_running, terminate_process
 from utils.logger import logger
 from utils.safe_print import safe_print
 
+
+# 停止后台程序时，除一次检查所需的时间外，额外留给结束会话、写入数据库与事件日志的秒数
+STOP_GRACE_SECONDS = 10
+
+
+def get_stop_timeout() -> float:
+    """等待后台程序正常退出的最长秒数：一次媒体源调用超时、元数据稳定等待与一个监控间隔，另加收尾时间"""
+    return (config.get("monitoring.source_call_timeout", 2) + config.get("monitoring.metadata_max_wait", 2)
+            + config.get_monitoring_interval() + STOP_GRACE_SECONDS)
+
+
 class ProcessManager:
     @staticmethod
     def stop_background_process(pid_file: str = None):
@@ -102,26 +114,18 @@ class ProcessManager:
                 os.remove(pid_file_path)
                 return False
             
-            safe_print(f"🎯 正在终止进程 {pid}...")
+            timeout = get_stop_timeout()
+            safe_print(f"🎯 正在终止进程 {pid}（最多等待 {timeout:g} 秒写入剩余数据）...")
             
-            # 尝试终止进程
-            success = terminate_process(pid)
+            # 请求正常退出，超时后才强制终止
+            success = terminate_process(pid, timeout)
             
             if success:
-                # 等待一下确保进程完全停止
-                time.sleep(2)
-                
-                # 再次检查进程是否已停止
+                # 强制终止后短暂等待进程完全停止
                 if is_process_running(pid):
-                    safe_print(f"⚠️ 进程 {pid} 仍在运行，尝试强制终止...")
-                    if sys.platform == "win32":
-                        subprocess.run(
-                            ['taskkill', '/PID', str(pid), '/F', '/T'],
-                            capture_output=True,
-                            text=True,
-                            creationflags=subprocess.CREATE_NO_WINDOW
-                        )
                     time.sleep(1)
+                    if is_process_running(pid):
+                        safe_print(f"⚠️ 进程 {pid} 仍在运行")
                 
                 # 删除PID文件
                 if os.path.exists(pid_file_path):
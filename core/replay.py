@@ -0,0 +1,77 @@
+"""
+回放基准 - 用虚拟时钟驱动监控循环回放录制的时间线，统计数据库写入、查询次数、CPU 时间与流水线背压
+
+录制：在配置中设置 monitoring.record_file，监控时会把媒体快照的变化写入该文件。
+回放：main.py --replay FILE，监控循环中的所有等待都由虚拟时钟瞬间完成，结果写入临时数据库。
+"""
+import asyncio
+import os
+import tempfile
+import time
+from typing import Any, Dict
+from core.database import DatabaseManager
+from core.media_monitor import MediaMonitor
+from core.media_source import ScriptedMediaSource
+from utils.clock import VirtualClock
+from utils.safe_print import safe_print
+
+
+# 时间线结束后再多运行的秒数，让最后一个变化被处理完
+REPLAY_TAIL_SECONDS = 10
+
+
+def replay_timeline(path: str, interval: int = None) -> Dict[str, Any]:
+    """回放时间线文件并返回统计结果"""
+    clock = VirtualClock()
+    source = ScriptedMediaSource.from_file(path, clock=clock)
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        database = DatabaseManager(os.path.join(temp_dir, "replay.db"), maintenance=False, clock=clock)
+        monitor = MediaMonitor(source, database=database, clock=clock, use_overlay=False)
+        connection = database.connection
+        queries_before = connection.query_count
+        rows_before = connection.rows_written
+        
+        async def run():
+            clock.call_later(source.duration() + REPLAY_TAIL_SECONDS, monitor.stop_monitoring)
+            await monitor.monitor_media(interval, silent_mode=True)
+        
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        asyncio.run(run())
+        wall_seconds = time.perf_counter() - wall_start
+        cpu_seconds = time.process_time() - cpu_start
+        
+        queries = connection.query_count - queries_before
+        rows_written = connection.rows_written - rows_before
+        tracks = connection.execute_single("SELECT COUNT(*) FROM media_history")[0]
+    
+    simulated_seconds = clock.monotonic()
+    hours = simulated_seconds / 3600 if simulated_seconds > 0 else 0
+    return {
+        'simulated_seconds': simulated_seconds,
+        'wall_seconds': wall_seconds,
+        'speedup': simulated_seconds / wall_seconds if wall_seconds > 0 else 0,
+        'tracks': tracks,
+        'rows_written': rows_written,
+        'queries': queries,
+        'cpu_seconds': cpu_seconds,
+        'rows_per_hour': rows_written / hours if hours else 0,
+        'queries_per_hour': queries / hours if hours else 0,
+        'cpu_ms_per_hour': cpu_seconds * 1000 / hours if hours else 0,
+        'pipeline': monitor.pipeline_stats,
+    }
+
+
+def print_replay_report(path: str, report: Dict[str, Any]) -> None:
+    """打印回放统计"""
+    safe_print(f"回放文件: {path}")
+    safe_print(f"  模拟时长: {report['simulated_seconds'] / 3600:.2f} 小时"
+               f"（实际 {report['wall_seconds']:.2f} 秒，{report['speedup']:.0f} 倍速）")
+    safe_print(f"  记录歌曲: {report['tracks']}")
+    safe_print(f"  写入行数: {report['rows_written']}（{report['rows_per_hour']:.1f} 行/小时）")
+    safe_print(f"  查询次数: {report['queries']}（{report['queries_per_hour']:.1f} 次/小时）")
+    safe_print(f"  CPU 时间: {report['cpu_seconds']:.3f} 秒（{report['cpu_ms_per_hour']:.1f} 毫秒/小时）")
+    for stage in report['pipeline']:
+        safe_print(f"  流水线 {stage['name']}: 最大积压 {stage['high_water']}，"
+                   f"阻塞 {stage['blocked']} 次（{stage['blocked_seconds']:.3f} 秒），丢弃 {stage['dropped']}")
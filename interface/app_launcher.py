@@ -4,7 +4,7 @@ import os
 from pathlib import Path
 from utils.safe_print import safe_print
 from interface.cli_parser import parse_arguments
-from utils.system_utils import check_and_install_dependencies, setup_signal_handlers
+from utils.system_utils import check_and_install_dependencies, setup_signal_handlers, get_pid_file_path, is_process_running
 from core.process_manager import ProcessManager
 from utils.export_manager import ExportManager
 from interface.interactive_mode import InteractiveMode
@@ -101,7 +101,8 @@ class AppLauncher:
         self._setup_environment_for_daemon()
         
         # 获取运行参数
-        interval = getattr(self.args, 'interval', None) or config.get_monitoring_interval()
+        # 未指定间隔时按配置（配置文件修改后随之更新）
+        interval = getattr(self.args, 'interval', None)
         pid_file_path = os.environ.get('MEDIA_TRACKER_PID_FILE')
         
         if not pid_file_path:
@@ -109,9 +110,14 @@ class AppLauncher:
             logger.error("守护进程工作模式：缺少PID文件路径")
             sys.exit(1)
         
+        from core.database import db
+        db.start_maintenance()
+        
         # 创建并运行守护进程工作模式
         daemon_mode = DaemonMode(monitor)
         daemon_mode.set_verbose(self.verbose)
+        # --stop 通过 SIGTERM 结束工作进程，收到信号后正常停止监控
+        setup_signal_handlers(monitor)
         daemon_mode.run_daemon_worker(interval, pid_file_path)
     
     def handle_commands(self):
@@ -121,8 +127,27 @@ class AppLauncher:
             ProcessManager.stop_background_process(self.args.pid_file)
             return True
         
-        # 检查依赖（对于需要monitor的命令）
-        if not check_and_install_dependencies():
+        # 从备份恢复数据库
+        if self.args.restore is not None:
+            self._restore_database(self.args.restore)
+            return True
+        
+        # 不恢复数据库时才开始后台备份、归档与汇总
+        from core.database import db
+        db.start_maintenance()
+        
+        # 回放录制的时间线（不需要 winsdk）
+        if self.args.replay:
+            self._replay_timeline(self.args.replay)
+            return True
+        
+        # 重放事件日志重建派生表
+        if self.args.rebuild_from_journal:
+            self._rebuild_from_journal()
+            return True
+        
+        # 检查依赖（对于需要monitor的命令，脚本化媒体源不依赖 winsdk）
+        if config.get("monitoring.source", "smtc") == "smtc" and not check_and_install_dependencies():
             return True
         
         # 显示最近播放
@@ -142,6 +167,58 @@ class AppLauncher:
         
         return False
     
+    def _restore_database(self, target):
+        """从备份恢复数据库"""
+        from core.database.backup import parse_restore_time
+        try:
+            target_time = parse_restore_time(target)
+        except ValueError as e:
+            safe_print(f"❌ {e}")
+            safe_print("💡 支持的格式: 20250601_120000、2025-06-01 12:00:00、2025-06-01")
+            return False
+        # 后台监控仍在写入时替换数据库文件会丢失其之后的写入
+        running_pid = self._running_instance_pid()
+        if running_pid is not None:
+            safe_print(f"❌ 监控进程正在运行 (PID: {running_pid})，请先使用 --stop 停止后再恢复")
+            return False
+        from core.database import db
+        return db.restore_backup(target_time)
+    
+    def _running_instance_pid(self):
+        """PID 文件中仍在运行的监控进程 PID，没有时返回 None"""
+        pid_file_path = get_pid_file_path(getattr(self.args, 'pid_file', None))
+        if not os.path.exists(pid_file_path):
+            return None
+        try:
+            with open(pid_file_path, 'r') as f:
+                pid = int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+        if pid != os.getpid() and is_process_running(pid):
+            return pid
+        return None
+    
+    def _rebuild_from_journal(self):
+        """重放事件日志重建播放记录与跳过计数"""
+        from core.database import db
+        try:
+            repaired, total = db.rebuild_from_journal()
+        except Exception as e:
+            safe_print(f"❌ 重建失败: {e}")
+            return False
+        safe_print(f"✅ 已从事件日志重建：补写或修正 {repaired} 条播放记录，跳过计数 {total} 次跳过")
+        return True
+    
+    def _replay_timeline(self, path):
+        """以虚拟时间回放时间线并输出统计"""
+        from core.replay import replay_timeline, print_replay_report
+        if not os.path.exists(path):
+            safe_print(f"❌ 时间线文件不存在: {path}")
+            return False
+        report = replay_timeline(path, getattr(self.args, 'interval', None))
+        print_replay_report(path, report)
+        return True
+    
     def launch_mode(self):
         """启动对应的运行模式"""
         # 如果启动时传入任何命令行参数，则以命令行模式运行（不显示 GUI）
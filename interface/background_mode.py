@@ -9,18 +9,15 @@ class BackgroundMode:
         self.monitor = monitor
     
     async def run(self, interval=None, quiet=False):
-        """运行后台监控模式"""
-        if interval is None:
-            interval = config.get_monitoring_interval()
-        
+        """运行后台监控模式（未指定 interval 时按配置，配置文件修改后随之更新）"""
         if not quiet:
             use_emoji = config.should_use_emoji()
             rocket_prefix = "🚀 " if use_emoji else ""
             safe_print(f"{rocket_prefix}开始后台监控模式...")
-            safe_print(f"⏱️ 监控间隔: {interval}秒")
+            safe_print(f"⏱️ 监控间隔: {interval or config.get_monitoring_interval()}秒")
             safe_print("按 Ctrl+C 停止监控")
         
-        logger.info(f"后台监控模式启动，间隔: {interval}秒")
+        logger.info(f"后台监控模式启动，间隔: {interval or config.get_monitoring_interval()}秒")
         
         try:
             await self.monitor.monitor_media(interval)
@@ -26,6 +26,10 @@ def parse_arguments():
     python main.py -e output.json     # 导出播放历史到JSON文件
     python main.py -e history.json -q # 静默导出，不显示过程信息
   
+  备份恢复:
+    python main.py --restore          # 从最新备份恢复数据库
+    python main.py --restore "2025-06-01 12:00"  # 恢复到指定时间点
+  
   进程管理:
     python main.py --stop             # 停止后台运行的程序（自动查找）
     python main.py --stop --pid-file daemon.pid  # 使用指定PID文件停止
@@ -34,6 +38,7 @@ def parse_arguments():
     python main.py -v                 # 详细输出模式，显示调试信息
     python main.py -b -q --no-emoji   # 后台监控，静默纯文本模式
     python main.py -b -v -i 3         # 后台监控，详细输出，3秒间隔
+    python main.py --replay rec.jsonl.gz  # 回放录制的时间线，统计写入与CPU时间
         '''
     )
     
@@ -51,6 +56,12 @@ def parse_arguments():
                            help='导出播放历史到指定文件')
     mode_group.add_argument('--stop', action='store_true',
                            help='停止后台运行的程序（自动查找PID文件）')
+    mode_group.add_argument('--restore', nargs='?', const='latest', metavar='TIMESTAMP',
+                           help='从备份恢复数据库，可指定恢复到的时间点(默认最新备份)')
+    mode_group.add_argument('--replay', type=str, metavar='FILE',
+                           help='以虚拟时间回放录制的时间线并输出性能统计')
+    mode_group.add_argument('--rebuild-from-journal', action='store_true',
+                           help='重放播放事件日志，重建播放记录与跳过计数')
     
     # 监控参数
     parser.add_argument('-i', '--interval', type=int, metavar='SECONDS',
@@ -23,9 +23,6 @@ class DaemonMode:
     
     def run_daemon(self, interval=None, pid_file=None):
         """守护进程模式（主进程启动逻辑）- 整合自 run_modes.py"""
-        if interval is None:
-            interval = config.get_monitoring_interval()
-
         pid_file_path = get_pid_file_path(pid_file)
         
         self.debug_print(f"🔧 调试：当前工作目录: {os.getcwd()}")
@@ -56,7 +53,7 @@ class DaemonMode:
             from interface.background_mode import BackgroundMode
             background_mode = BackgroundMode(self.monitor)
             
-            self.debug_print(f"🔧 准备启动后台监控，间隔: {interval}秒")
+            self.debug_print(f"🔧 准备启动后台监控，间隔: {interval if interval is not None else config.get_monitoring_interval()}秒")
             import asyncio
             asyncio.run(background_mode.run(interval, quiet=True))
             
@@ -107,7 +104,9 @@ class DaemonMode:
             work_dir = Path(__file__).parent.parent  # 调整路径
             self.debug_print(f"🔧 调试：脚本模式，Python: {python_exe}")
         
-        cmd.extend(['-i', str(interval)])
+        # 未指定间隔时不传 -i，子进程跟随配置（含热重载）
+        if interval is not None:
+            cmd.extend(['-i', str(interval)])
         
         if self.verbose:
             cmd.append('-v')
@@ -17,6 +17,10 @@ except Exception:
     pystray = None
 
 
+# seconds to wait for the monitor thread to finish after Quit
+MONITOR_STOP_TIMEOUT = 5
+
+
 class GuiLoggerHandler(logging.Handler):
     def __init__(self, write_cb):
         super().__init__()
@@ -197,10 +201,12 @@ class GuiApp:
         logging.getLogger().addHandler(handler)
 
         # auto-start monitoring if requested
+        monitor_thread = None
         if auto_start and monitor is not None:
             try:
                 import asyncio
-                threading.Thread(target=lambda: asyncio.run(monitor.monitor_media()), daemon=True).start()
+                monitor_thread = threading.Thread(target=lambda: asyncio.run(monitor.monitor_media()), daemon=True)
+                monitor_thread.start()
             except Exception:
                 pass
 
@@ -213,3 +219,8 @@ class GuiApp:
 
         self.root.after(200, poll)
         self.root.mainloop()
+
+        # stop monitoring so pending writes are flushed and the session is finished
+        if monitor_thread is not None:
+            monitor.stop_monitoring()
+            monitor_thread.join(MONITOR_STOP_TIMEOUT)
@@ -0,0 +1,172 @@
+"""
+SMTC 媒体源的会话缓存测试 - 用假的会话管理器代替 winsdk，在任何平台上都可运行
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import types
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import winsdk.windows.media.control  # noqa: F401
+except ImportError:
+    # 没有 winsdk 时注册空模块，只为导入 smtc；测试中的 wmc 会替换为假的会话管理器
+    for name in ("winsdk", "winsdk.windows", "winsdk.windows.media",
+                 "winsdk.windows.media.control", "winsdk.windows.storage", "winsdk.windows.storage.streams"):
+        sys.modules.setdefault(name, types.ModuleType(name))
+    sys.modules["winsdk.windows.storage.streams"].Buffer = bytearray
+    sys.modules["winsdk.windows.storage.streams"].InputStreamOptions = types.SimpleNamespace(READ_AHEAD=1)
+
+from utils import system_utils
+
+# 配置与日志单例在导入时创建文件，放到临时目录中，测试不在源码目录中留下 config.json 与日志
+_work_dir = tempfile.TemporaryDirectory()
+with mock.patch.object(system_utils, "get_executable_dir", lambda: _work_dir.name):
+    from core.media_source import smtc
+
+
+def tearDownModule():
+    for handler in logging.getLogger("MediaTracker").handlers[:]:
+        handler.close()
+    _work_dir.cleanup()
+
+
+class FakeSession:
+    """只实现 smtc.py 用到的接口的媒体会话"""
+    
+    def __init__(self, app_id, title):
+        self.source_app_user_model_id = app_id
+        self.title = title
+        self.property_reads = 0
+    
+    async def _properties(self):
+        self.property_reads += 1
+        return types.SimpleNamespace(title=self.title, artist="Artist", album_title="", album_artist="",
+                                     track_number=0, genres=[], year=0, thumbnail=None)
+    
+    def try_get_media_properties_async(self):
+        return self._properties()
+    
+    def get_playback_info(self):
+        return types.SimpleNamespace(playback_status=4)
+    
+    def get_timeline_properties(self):
+        return types.SimpleNamespace(end_time=timedelta(seconds=200), position=timedelta(seconds=10))
+    
+    def add_media_properties_changed(self, handler):
+        return 1
+    
+    def add_playback_info_changed(self, handler):
+        return 2
+    
+    def remove_media_properties_changed(self, token):
+        pass
+    
+    def remove_playback_info_changed(self, token):
+        pass
+
+
+class FakeManager:
+    """记录调用次数的会话管理器，保存会话变化通知的回调"""
+    
+    def __init__(self, sessions):
+        self.sessions = sessions
+        self.current_calls = 0
+        self.list_calls = 0
+        self.handlers = []
+    
+    def get_current_session(self):
+        self.current_calls += 1
+        return self.sessions[0] if self.sessions else None
+    
+    def get_sessions(self):
+        self.list_calls += 1
+        return list(self.sessions)
+    
+    def add_current_session_changed(self, handler):
+        self.handlers.append(handler)
+        return len(self.handlers)
+    
+    def add_sessions_changed(self, handler):
+        self.handlers.append(handler)
+        return len(self.handlers)
+    
+    def remove_current_session_changed(self, token):
+        pass
+    
+    def remove_sessions_changed(self, token):
+        pass
+    
+    def notify_changed(self):
+        for handler in self.handlers:
+            handler(self, None)
+
+
+class SmtcSessionCacheTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.sessions = [FakeSession("Spotify.exe", "Song A"), FakeSession("chrome.exe", "Video B")]
+        self.manager = FakeManager(self.sessions)
+        self.requests = 0
+        
+        async def request_async():
+            self.requests += 1
+            return self.manager
+        
+        fake_wmc = types.SimpleNamespace(
+            GlobalSystemMediaTransportControlsSessionManager=types.SimpleNamespace(request_async=request_async)
+        )
+        patcher = mock.patch.object(smtc, "wmc", fake_wmc)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.source = smtc.SmtcMediaSource()
+    
+    def poll(self, read, times):
+        """在同一个事件循环中连续轮询 times 次（与监控循环相同）"""
+        async def run():
+            return [await read() for _ in range(times)]
+        return asyncio.run(run())
+    
+    def test_manager_and_current_session_fetched_once(self):
+        infos = self.poll(self.source.get_media_info, 5)
+        
+        self.assertEqual([info.title for info in infos], ["Song A"] * 5)
+        self.assertEqual(self.requests, 1)
+        self.assertEqual(self.manager.current_calls, 1)
+        # 每次轮询仍读取缓存会话的最新属性
+        self.assertEqual(self.sessions[0].property_reads, 5)
+    
+    def test_session_list_reused_across_polls(self):
+        polls = self.poll(self.source.get_all_media_info, 3)
+        
+        self.assertEqual([sorted(info.title for info in infos) for infos in polls], [["Song A", "Video B"]] * 3)
+        self.assertEqual(self.requests, 1)
+        self.assertEqual(self.manager.list_calls, 1)
+    
+    def test_change_notification_refreshes_session_only(self):
+        self.poll(self.source.get_media_info, 2)
+        self.sessions.reverse()
+        self.manager.notify_changed()
+        infos = self.poll(self.source.get_media_info, 2)
+        
+        self.assertEqual([info.title for info in infos], ["Video B"] * 2)
+        self.assertEqual(self.requests, 1)
+        self.assertEqual(self.manager.current_calls, 2)
+    
+    def test_manager_requested_again_after_reset(self):
+        self.poll(self.source.get_media_info, 2)
+        self.source._reset_sessions_manager()
+        self.poll(self.source.get_media_info, 2)
+        
+        self.assertEqual(self.requests, 2)
+        self.assertEqual(self.manager.current_calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+时钟 - 监控循环通过时钟读取时间与等待，回放时可替换为虚拟时钟
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional
+
+
+class SystemClock:
+    """真实时钟"""
+    
+    def now(self) -> datetime:
+        """当前时间"""
+        return datetime.now()
+    
+    def monotonic(self) -> float:
+        """单调递增的秒数"""
+        return time.monotonic()
+    
+    async def sleep(self, seconds: float) -> None:
+        """等待指定秒数"""
+        await asyncio.sleep(seconds)
+    
+    async def wait_for(self, queue: asyncio.Queue, timeout: float) -> Optional[Any]:
+        """从队列取一个元素，超时返回 None"""
+        try:
+            return await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+    
+    def call_later(self, delay: float, callback: Callable, *args):
+        """在 delay 秒后于当前事件循环中调用 callback，返回可 cancel() 的句柄"""
+        return asyncio.get_running_loop().call_later(delay, callback, *args)
+
+
+class _VirtualTimer:
+    """虚拟时钟上的定时回调"""
+    
+    def __init__(self, callback: Callable, args: tuple):
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+    
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class VirtualClock(SystemClock):
+    """虚拟时钟：等待不消耗真实时间，而是直接把时间推进到等待结束或下一个定时回调"""
+    
+    def __init__(self, start: datetime = None):
+        self.start = start or datetime.now()
+        self.elapsed = 0.0
+        self._timers = []
+        self._sequence = itertools.count()
+    
+    def now(self) -> datetime:
+        return self.start + timedelta(seconds=self.elapsed)
+    
+    def monotonic(self) -> float:
+        return self.elapsed
+    
+    async def sleep(self, seconds: float) -> None:
+        self._advance_to(self.elapsed + max(0.0, seconds))
+        # 让出事件循环，使定时回调投递的通知得到处理
+        await asyncio.sleep(0)
+    
+    async def wait_for(self, queue: asyncio.Queue, timeout: float) -> Optional[Any]:
+        deadline = self.elapsed + timeout
+        while queue.empty():
+            due = self._next_due()
+            if due is None or due > deadline:
+                self._advance_to(deadline)
+                await asyncio.sleep(0)
+                if queue.empty():
+                    return None
+                break
+            self._advance_to(due)
+            await asyncio.sleep(0)
+        return queue.get_nowait()
+    
+    def call_later(self, delay: float, callback: Callable, *args) -> _VirtualTimer:
+        timer = _VirtualTimer(callback, args)
+        heapq.heappush(self._timers, (self.elapsed + max(0.0, delay), next(self._sequence), timer))
+        return timer
+    
+    def _next_due(self) -> Optional[float]:
+        """下一个未取消的定时回调时间"""
+        while self._timers and self._timers[0][2].cancelled:
+            heapq.heappop(self._timers)
+        return self._timers[0][0] if self._timers else None
+    
+    def _advance_to(self, target: float) -> None:
+        """推进时间，并依次执行到期的定时回调"""
+        while True:
+            due = self._next_due()
+            if due is None or due > target:
+                break
+            _, _, timer = heapq.heappop(self._timers)
+            self.elapsed = max(self.elapsed, due)
+            timer.callback(*timer.args)
+        self.elapsed = max(self.elapsed, target)
@@ -23,8 +23,9 @@ class DisplayUtils:
     @staticmethod
     def show_recent_tracks(limit: int = None) -> None:
         """显示最近播放的歌曲"""
+        settings = config.snapshot
         if limit is None:
-            limit = config.get("display.default_recent_limit", 10)
+            limit = settings.default_recent_limit
             
         records = db.get_recent_tracks(limit)
         
@@ -32,8 +33,8 @@ class DisplayUtils:
             safe_print("暂无播放记录")
             return
             
-        use_emoji = config.should_use_emoji()
-        timestamp_format = config.get_timestamp_format()
+        use_emoji = settings.use_emoji
+        timestamp_format = settings.timestamp_format
         
         title_prefix = "📋 " if use_emoji else ""
         safe_print(f"\n{title_prefix}最近 {len(records)} 首歌曲:")
@@ -58,15 +59,15 @@ class DisplayUtils:
                 group_prefix = "👥 " if use_emoji else ""
                 safe_print(f"     {group_prefix}专辑艺术家: {album_artist}")
                 
-            if config.get("display.show_track_number", True) and track_number:
+            if settings.show_track_number and track_number:
                 track_prefix = "🔢 " if use_emoji else ""
                 safe_print(f"     {track_prefix}曲目号: {track_number}")
                 
-            if config.get("display.show_genre", True) and genre:
+            if settings.show_genre and genre:
                 genre_prefix = "🎭 " if use_emoji else ""
                 safe_print(f"     {genre_prefix}流派: {genre}")
                 
-            if config.get("display.show_year", True) and year:
+            if settings.show_year and year:
                 year_prefix = "📅 " if use_emoji else ""
                 safe_print(f"     {year_prefix}年份: {year}")
                 
@@ -148,6 +149,7 @@ class DisplayUtils:
         """创建基础统计面板"""
         total_plays = stats.get('total_plays', 0)
         unique_songs = stats.get('unique_songs', 0)
+        total_skips = stats.get('total_skips', 0)
         
         content = f"""
 [bold cyan]📊 核心指标[/bold cyan]
@@ -155,6 +157,7 @@ class DisplayUtils:
 ┃ 📌 总播放记录: [yellow]{total_plays:,}[/yellow] 次         ┃
 ┃ 🎵 不同歌曲数: [green]{unique_songs:,}[/green] 首          ┃
 ┃ 🔄 平均重播率: [blue]{(total_plays/unique_songs if unique_songs > 0 else 0):.1f}[/blue] 次/首     ┃
+┃ ⏭️ 跳过次数: [magenta]{total_skips:,}[/magenta] 次           ┃
 ┗━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━┛
         """.strip()
         
@@ -9,6 +9,7 @@ class Logger:
     def __init__(self, name: str = "MediaTracker"):
         self.logger = logging.getLogger(name)
         self._setup_logger()
+        config.subscribe(self._on_config_changed)
         
     def _setup_logger(self) -> None:
         """设置日志记录器"""
@@ -37,6 +38,13 @@ class Logger:
         
         # 文件处理器 - 使用正确的路径
         self._setup_file_handler(formatter)
+    
+    def _on_config_changed(self, changed) -> None:
+        """配置文件被修改：应用新的日志级别"""
+        if 'logging.level' in changed:
+            level = config.get("logging.level", "INFO")
+            self.logger.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+            self.logger.info(f"日志级别已改为 {level}")
             
     def _setup_file_handler(self, formatter) -> None:
         """设置文件处理器"""
@@ -1,13 +1,19 @@
 # overlay.py
 """Simple overlay window using tkinter to show recent plays for a track.
-This is intentionally lightweight: creates a borderless, topmost window
-centered on the primary screen and destroys itself after `duration` seconds.
+One long-lived worker thread owns a single Tk root and a prebuilt, borderless,
+topmost window centered on the primary screen. `show` only queues a request;
+the worker collapses bursts (rapid skipping) to the latest request, refreshes
+the window in place and hides it again after `duration` seconds via `after()`.
 """
+import atexit
+import base64
+import io
+import queue
 import threading
-import time
 from datetime import datetime
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from config.config_manager import config
+from core.media_info import MediaInfo
 from utils.safe_print import safe_print
 
 try:
@@ -16,13 +22,36 @@ try:
 except Exception:
     tk = None
 
+try:
+    from PIL import Image, ImageTk
+except Exception:
+    Image = None
+
+# Cover art is scaled to fit this many pixels
+ARTWORK_SIZE = 128
+
+# How often the worker checks the request queue (Tk must only be touched from its own thread)
+POLL_INTERVAL_MS = 100
+
+# Sentinel request that stops the worker
+_STOP = object()
+
+BG = "#111111"
+
 
 class Overlay:
     def __init__(self):
         self._thread = None
-
-    def show(self, title: str, artist: str, history: List[Tuple], duration: float = None) -> None:
-        """Show overlay non-blocking. `history` is list of (timestamp, play_percentage, playback_status, app_name)."""
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.shown = 0
+        self.collapsed = 0  # requests replaced by a newer one before being shown
+
+    def show(self, media_info: MediaInfo, history: List[Tuple], duration: float = None,
+             artwork: Optional[bytes] = None) -> None:
+        """Show overlay non-blocking for the track in `media_info`.
+        `history` is list of (timestamp, play_percentage, playback_status, app_name).
+        `artwork` is the cover image bytes, if any."""
         if tk is None:
             safe_print("[overlay] tkinter unavailable; cannot show overlay")
             return
@@ -30,93 +59,189 @@ class Overlay:
         if duration is None:
             duration = config.get("display.overlay_duration_seconds", 5)
 
-        # Start a thread to run the tkinter window so it won't block async loop
-        t = threading.Thread(target=self._run_window, args=(title, artist, history, duration), daemon=True)
-        t.start()
-        self._thread = t
+        self._ensure_worker()
+        self._queue.put((media_info, history, duration, artwork))
+
+    def close(self) -> None:
+        """Stop the worker thread and destroy the window."""
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(1)
+        self._thread = None
 
-    def _run_window(self, title: str, artist: str, history: List[Tuple], duration: float):
+    def _ensure_worker(self) -> None:
+        # Start the worker once; restart it if it died (e.g. Tk failed to initialise earlier)
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                if self._thread is None:
+                    # Tear Tk down from its own thread before the interpreter exits
+                    atexit.register(self.close)
+                self._thread = threading.Thread(target=self._run, name="overlay", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
         try:
             root = tk.Tk()
-            root.overrideredirect(True)
-            root.attributes("-topmost", True)
+        except Exception as e:
+            safe_print(f"[overlay] 显示叠加层失败: {e}")
+            return
+        window = _OverlayWindow(root)
 
-            # Attempt semi-transparency if supported
-            try:
-                root.attributes("-alpha", 0.85)
-            except Exception:
-                pass
+        def poll():
+            # Drain the queue and keep only the newest request
+            latest = None
+            while True:
+                try:
+                    request = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is _STOP:
+                    root.destroy()
+                    return
+                if latest is not None:
+                    self.collapsed += 1
+                latest = request
+            if latest is not None:
+                try:
+                    window.show(*latest)
+                    self.shown += 1
+                except Exception as e:
+                    safe_print(f"[overlay] 显示叠加层失败: {e}")
+            root.after(POLL_INTERVAL_MS, poll)
 
-            # Build content
-            screen_w = root.winfo_screenwidth()
-            screen_h = root.winfo_screenheight()
+        root.after(0, poll)
+        try:
+            root.mainloop()
+        except Exception as e:
+            safe_print(f"[overlay] 叠加层线程退出: {e}")
 
-            win_w = min(900, int(screen_w * 0.8))
-            win_h = min(300, int(screen_h * 0.25))
 
-            x = (screen_w - win_w) // 2
-            y = int(screen_h * 0.1)
+class _OverlayWindow:
+    """The prebuilt overlay window; only used from the overlay worker thread."""
 
-            root.geometry(f"{win_w}x{win_h}+{x}+{y}")
+    def __init__(self, root):
+        self.root = root
+        self._hide_job = None
+        root.withdraw()
+        root.overrideredirect(True)
+        root.attributes("-topmost", True)
 
-            # Frame with background
-            frame = tk.Frame(root, bg="#111111")
-            frame.pack(fill=tk.BOTH, expand=True)
+        # Attempt semi-transparency if supported
+        try:
+            root.attributes("-alpha", 0.85)
+        except Exception:
+            pass
 
-            # Fonts
-            try:
-                title_font = tkfont.Font(family="Segoe UI", size=24, weight="bold")
-                meta_font = tkfont.Font(family="Segoe UI", size=14)
-                small_font = tkfont.Font(family="Segoe UI", size=12)
-            except Exception:
-                title_font = None
-                meta_font = None
-                small_font = None
-
-            # Title
-            title_text = f"{title}"
-            if artist:
-                title_text += f" — {artist}"
-
-            lbl_title = tk.Label(frame, text=title_text, fg="#ffffff", bg="#111111", wraplength=win_w-40)
-            if title_font:
-                lbl_title.config(font=title_font)
-            lbl_title.pack(pady=(16, 6))
-
-            # History lines
-            if history:
-                # Show up to 5 recent entries
-                history_frame = tk.Frame(frame, bg="#111111")
-                history_frame.pack(padx=20, pady=(0, 12), fill=tk.BOTH, expand=True)
-
-                for ts, pct, status, app in history:
-                    try:
-                        # ts stored as ISO format in DB
-                        dt = datetime.fromisoformat(ts)
-                        ts_str = dt.strftime(config.get_timestamp_format())
-                    except Exception:
-                        ts_str = str(ts)
-
-                    pct_str = f"{pct}%" if pct is not None else "—"
-                    line = f"{ts_str} | {pct_str} | {status or 'Unknown'} | {app or 'Unknown'}"
-                    lbl = tk.Label(history_frame, text=line, fg="#dddddd", bg="#111111")
-                    if small_font:
-                        lbl.config(font=small_font)
-                    lbl.pack(anchor="w")
-
-            # Auto-destroy after duration seconds
-            def close_after():
-                time.sleep(duration)
-                try:
-                    root.destroy()
-                except Exception:
-                    pass
+        screen_w = root.winfo_screenwidth()
+        screen_h = root.winfo_screenheight()
 
-            threading.Thread(target=close_after, daemon=True).start()
-            root.mainloop()
+        self.win_w = min(900, int(screen_w * 0.8))
+        win_h = min(300, int(screen_h * 0.25))
 
-        except Exception as e:
-            safe_print(f"[overlay] 显示叠加层失败: {e}")
+        x = (screen_w - self.win_w) // 2
+        y = int(screen_h * 0.1)
+
+        root.geometry(f"{self.win_w}x{win_h}+{x}+{y}")
+
+        # Frame with background
+        frame = tk.Frame(root, bg=BG)
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        # Fonts
+        try:
+            title_font = tkfont.Font(family="Segoe UI", size=24, weight="bold")
+            self.small_font = tkfont.Font(family="Segoe UI", size=12)
+        except Exception:
+            title_font = None
+            self.small_font = None
+
+        # Cover art on the left, shown only when the track has one
+        self.lbl_cover = tk.Label(frame, bg=BG)
+
+        self.content = tk.Frame(frame, bg=BG)
+        self.content.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
+
+        self.lbl_title = tk.Label(self.content, fg="#ffffff", bg=BG, wraplength=self.win_w - 40)
+        if title_font:
+            self.lbl_title.config(font=title_font)
+        self.lbl_title.pack(pady=(16, 6))
+
+        self.history_frame = tk.Frame(self.content, bg=BG)
+        self.history_frame.pack(padx=20, pady=(0, 12), fill=tk.BOTH, expand=True)
+        self.history_labels = []
+
+    @staticmethod
+    def _load_artwork(artwork: Optional[bytes]):
+        """Decode cover bytes into a Tk image (PIL when available, else PNG/GIF only)."""
+        if not artwork:
+            return None
+        try:
+            if Image is not None:
+                image = Image.open(io.BytesIO(artwork))
+                image.thumbnail((ARTWORK_SIZE, ARTWORK_SIZE))
+                return ImageTk.PhotoImage(image)
+            image = tk.PhotoImage(data=base64.b64encode(artwork))
+            factor = max(1, -(-max(image.width(), image.height()) // ARTWORK_SIZE))
+            return image.subsample(factor) if factor > 1 else image
+        except Exception:
+            return None
+
+    def _history_label(self, index: int):
+        # Reuse labels across shows; create more only when a longer history arrives
+        while len(self.history_labels) <= index:
+            lbl = tk.Label(self.history_frame, fg="#dddddd", bg=BG)
+            if self.small_font:
+                lbl.config(font=self.small_font)
+            self.history_labels.append(lbl)
+        return self.history_labels[index]
+
+    def show(self, media_info: MediaInfo, history: List[Tuple], duration: float,
+             artwork: Optional[bytes] = None) -> None:
+        # Title
+        title_text = f"{media_info.title}"
+        if media_info.artist:
+            title_text += f" — {media_info.artist}"
+        self.lbl_title.config(text=title_text)
+
+        # Keep a reference so Tk does not discard the image
+        cover = self._load_artwork(artwork)
+        self.lbl_cover.image = cover
+        if cover is not None:
+            self.lbl_cover.config(image=cover)
+            self.lbl_cover.pack(side=tk.LEFT, padx=(20, 0), before=self.content)
+        else:
+            self.lbl_cover.config(image="")
+            self.lbl_cover.pack_forget()
+
+        # History lines
+        history = history or []
+        for index, (ts, pct, status, app) in enumerate(history):
+            try:
+                # ts stored as ISO format in DB
+                dt = datetime.fromisoformat(ts)
+                ts_str = dt.strftime(config.get_timestamp_format())
+            except Exception:
+                ts_str = str(ts)
+
+            pct_str = f"{pct}%" if pct is not None else "—"
+            lbl = self._history_label(index)
+            lbl.config(text=f"{ts_str} | {pct_str} | {status or 'Unknown'} | {app or 'Unknown'}")
+            lbl.pack(anchor="w")
+        for lbl in self.history_labels[len(history):]:
+            lbl.pack_forget()
+
+        self.root.deiconify()
+        self.root.lift()
+
+        # Restart the hide timer for the newly shown track
+        if self._hide_job is not None:
+            self.root.after_cancel(self._hide_job)
+        self._hide_job = self.root.after(int(duration * 1000), self.hide)
+
+    def hide(self) -> None:
+        self._hide_job = None
+        self.root.withdraw()
 
 
 # 全局实例
@@ -90,8 +90,8 @@ def setup_signal_handlers(monitor):
     """设置信号处理器，用于优雅退出"""
     def signal_handler(signum, frame):
         safe_print(f"\n接收到退出信号 ({signum})，正在优雅退出...")
-        # 设置停止标志，而不是直接退出
-        monitor.set_stop_flag()
+        # 设置停止标志，而不是直接退出：监控循环结束后写入剩余数据并结束会话
+        monitor.stop_monitoring()
         # 不要在这里调用 sys.exit(0)
     
     signal.signal(signal.SIGINT, signal_handler)
@@ -115,8 +115,17 @@ def is_process_running(pid: int) -> bool:
     except (OSError, subprocess.SubprocessError):
         return False
 
-def terminate_process(pid: int) -> bool:
-    """终止指定PID的进程"""
+def wait_for_process_exit(pid: int, timeout: float) -> bool:
+    """等待进程退出，返回进程是否已在 timeout 秒内退出"""
+    deadline = time.monotonic() + timeout
+    while is_process_running(pid):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.2)
+    return True
+
+def terminate_process(pid: int, timeout: float = 2) -> bool:
+    """终止指定PID的进程：先请求正常退出，最多等待 timeout 秒让进程写完剩余数据，仍未退出再强制终止"""
     try:
         if sys.platform == "win32":
             # 首先尝试正常终止
@@ -126,12 +135,12 @@ def terminate_process(pid: int) -> bool:
                 text=True,
                 creationflags=subprocess.CREATE_NO_WINDOW
             )
-            if result.returncode == 0:
+            if result.returncode == 0 and wait_for_process_exit(pid, timeout):
                 return True
             
-            # 如果正常终止失败，尝试强制终止
+            # 如果正常终止失败或超时，尝试强制终止
             result = subprocess.run(
-                ['taskkill', '/PID', str(pid), '/F'],
+                ['taskkill', '/PID', str(pid), '/F', '/T'],
                 capture_output=True,
                 text=True,
                 creationflags=subprocess.CREATE_NO_WINDOW
@@ -140,13 +149,12 @@ def terminate_process(pid: int) -> bool:
         else:
             # Unix-like系统
             os.kill(pid, signal.SIGTERM)
-            # 等待一下，如果进程还在运行就强制杀死
-            time.sleep(2)
-            try:
-                os.kill(pid, 0)  # 检查进程是否还在
-                os.kill(pid, signal.SIGKILL)  # 强制杀死
-            except OSError:
-                pass  # 进程已经停止
+            # 等待进程正常退出，超时仍在运行就强制杀死
+            if not wait_for_process_exit(pid, timeout):
+                try:
+                    os.kill(pid, signal.SIGKILL)  # 强制杀死
+                except OSError:
+                    pass  # 进程刚好已经停止
             return True
     except Exception as e:
         safe_print(f"终止进程失败: {e}")